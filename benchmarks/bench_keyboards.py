@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк клавиатур: сборка + сериализация в запрос на каждое сообщение.
+Сравнивает сборку клавиатуры с нуля и стандартную сессию aiogram
+с кэшированными клавиатурами и BotSession.
+Запустить: python -m benchmarks.bench_keyboards [--number 20000]
+"""
+
+import argparse
+import os
+import timeit
+
+os.environ.setdefault("BOT_TOKEN", "42:BENCHMARK")
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.methods import SendMessage
+
+from keyboards import (
+    get_main_menu, get_cancel_keyboard, get_publish_keyboard,
+    get_schedule_keyboard, get_delete_timer_keyboard
+)
+from handlers.create_post import get_post_constructor_keyboard
+from handlers.polls import get_poll_settings_keyboard
+from handlers.settings import get_settings_keyboard
+from utils.session import BotSession
+
+CASES = [
+    ("main_menu", get_main_menu, ()),
+    ("cancel", get_cancel_keyboard, ()),
+    ("publish", get_publish_keyboard, ()),
+    ("schedule", get_schedule_keyboard, ()),
+    ("delete_timer", get_delete_timer_keyboard, ()),
+    ("settings", get_settings_keyboard, ()),
+    ("constructor", get_post_constructor_keyboard, (True, True, True, False)),
+    ("poll_settings", get_poll_settings_keyboard, (True, False)),
+]
+
+
+def run_case(bot, session, builder, args, number):
+    def once():
+        method = SendMessage(chat_id=1, text="bench", reply_markup=builder(*args))
+        session.build_form_data(bot, method)
+    return min(timeit.repeat(once, number=number, repeat=3)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    bot = Bot(token=os.environ["BOT_TOKEN"])
+    plain_session = AiohttpSession()
+    cached_session = BotSession()
+
+    print(f"{'keyboard':<15}{'before, us':>12}{'after, us':>12}{'speedup':>10}")
+    for name, builder, call_args in CASES:
+        before = run_case(bot, plain_session, builder.__wrapped__, call_args, args.number)
+        after = run_case(bot, cached_session, builder, call_args, args.number)
+        print(f"{name:<15}{before * 1e6:>12.1f}{after * 1e6:>12.1f}{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Задержка ответов на кнопки во время пачки публикаций.
+
+Планировщик публикует --posts постов сразу (полоса publish), сборщик
+в это время замеряет подписчиков (background), а «пользователь» каждые
+--interval секунд нажимает кнопку - answerCallbackQuery и ответное
+сообщение. Отправки упираются в общий лимит --rate в секунду.
+
+Сравниваются два режима: одна общая очередь, в которой стоят и нажатия
+(как без полос), и полосы с весами из конфига, где интерактивная полоса
+не ждёт. Смотреть на callback_ms: с полосами p95 должен быть порядка
+задержки API, а не длины очереди публикаций.
+
+Запустить: python -m benchmarks.bench_lanes --posts 300 --rate 30
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+TOKEN = "42:BENCHMARK"
+os.environ.setdefault("BOT_TOKEN", TOKEN)
+
+from aiogram import Bot
+
+import database as db
+from config import API_LANE_WEIGHTS
+from utils import scheduler
+from utils.clock import get_moscow_now
+from utils.lanes import LaneScheduler, use_lane, INTERACTIVE, PUBLISH, BACKGROUND
+from utils.session import BotSession
+from benchmarks.common import git_revision, summary
+from benchmarks.fake_api import FakeTelegramServer
+
+# Режим: (веса полос, полоса нажатий)
+MODES = {
+    'single_queue': ({PUBLISH: 1}, PUBLISH),
+    'lanes': (API_LANE_WEIGHTS, INTERACTIVE),
+}
+
+
+async def run_mode(weights: dict, press_lane: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        db.DATABASE_PATH = os.path.join(workdir, "lanes.db")
+        await db.init_db()
+        now = get_moscow_now()
+        for i in range(args.posts):
+            await db.add_scheduled_post(-1000000000000 - i % 20, 1 + i % 50, f"Пост #{i}", None, None, None, now)
+
+        async with FakeTelegramServer(latency=args.latency, seed=args.seed) as server:
+            lanes = LaneScheduler(rate=args.rate, burst=args.rate, weights=weights)
+            bot = Bot(token=TOKEN, session=BotSession(api=server.api, lanes=lanes))
+            callbacks = []
+
+            async def publish():
+                with use_lane(PUBLISH):
+                    return await scheduler.process_due_posts(bot, get_moscow_now())
+
+            async def sample():
+                with use_lane(BACKGROUND):
+                    for i in range(args.posts // 4):
+                        await bot.get_chat_member_count(-1000000000000 - i % 20)
+
+            async def press():
+                with use_lane(press_lane):
+                    while True:
+                        started = time.perf_counter()
+                        await bot.answer_callback_query(f"cb{len(callbacks)}")
+                        await bot.send_message(1, "Готово")
+                        callbacks.append(time.perf_counter() - started)
+                        await asyncio.sleep(args.interval)
+
+            started = time.perf_counter()
+            presser = asyncio.create_task(press())
+            try:
+                published, _ = await asyncio.gather(publish(), sample())
+            finally:
+                elapsed = time.perf_counter() - started
+                presser.cancel()
+                await bot.session.close()
+
+    return {
+        'published': published,
+        'elapsed_s': round(elapsed, 2),
+        'callbacks': len(callbacks),
+        'callback_ms': summary(callbacks, 1000),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=300, help="постов в пачке")
+    parser.add_argument("--rate", type=float, default=30, help="общий лимит, запросов в секунду")
+    parser.add_argument("--interval", type=float, default=0.25, help="секунд между нажатиями")
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка фейкового API, сек")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="файл для JSON (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    modes = {}
+    for name, (weights, press_lane) in MODES.items():
+        modes[name] = result = asyncio.run(run_mode(weights, press_lane, args))
+        print(
+            f"{name:<13} {result['elapsed_s']:>6} s  callbacks {result['callbacks']:>4}  "
+            f"p50 {result['callback_ms']['p50']:>8} ms  p95 {result['callback_ms']['p95']:>8} ms",
+            file=sys.stderr
+        )
+
+    report = {
+        'benchmark': 'api_lanes',
+        'revision': git_revision(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'params': vars(args),
+        'weights': API_LANE_WEIGHTS,
+        'modes': modes,
+    }
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
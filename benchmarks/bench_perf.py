@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Сравнение профиля PERF_PROFILE (uvloop + orjson) со стандартным.
+
+Каждый профиль гоняется в отдельном процессе (цикл событий и JSON
+выбираются при импорте): нагрузочный прогон диспетчера
+(benchmarks/load_dispatcher.py) и публикация отложенных постов
+с альбомами и кнопками против фейкового Bot API.
+
+Запустить: python -m benchmarks.bench_perf --duration 15 --posts 2000
+Без установленных uvloop/orjson оба профиля совпадут - см. поле perf в отчёте.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+TOKEN = "42:BENCHMARK"
+os.environ.setdefault("BOT_TOKEN", TOKEN)
+
+from aiogram import Bot
+
+import database as db
+import perf
+from utils import scheduler
+from utils.session import BotSession
+from benchmarks.common import git_revision, summary
+from benchmarks.fake_api import FakeTelegramServer
+
+PROFILES = {'stdlib': '0', 'perf': '1'}
+BUTTONS = "Канал - https://t.me/example | Сайт - https://example.com\nЧат - https://t.me/example_chat"
+
+
+# ============ ПУБЛИКАЦИЯ (дочерний процесс) ============
+
+async def seed_posts(count: int):
+    now = datetime(2024, 3, 1, 12, 0, 0)
+    for i in range(count):
+        album = None
+        if i % 3 == 0:
+            album = [
+                {'type': 'photo' if j % 2 else 'video', 'file_id': f"file_{i}_{j}"}
+                for j in range(5)
+            ]
+        await db.add_scheduled_post(
+            -1000000000000 - i % 20, 1 + i % 50, f"Пост #{i}: " + "текст " * 40,
+            'photo' if i % 3 == 1 else None, f"photo_{i}" if i % 3 == 1 else None,
+            BUTTONS if i % 2 else None, now, album=album
+        )
+    return await db.get_due_posts(now)
+
+
+async def run_publish(args) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        db.DATABASE_PATH = os.path.join(workdir, "perf.db")
+        await db.init_db()
+        posts = await seed_posts(args.posts)
+
+        async with FakeTelegramServer(latency=0, seed=args.seed) as server:
+            bot = Bot(token=TOKEN, session=BotSession(api=server.api))
+            seconds = []
+            started = time.perf_counter()
+            try:
+                for post in posts:
+                    post_started = time.perf_counter()
+                    await scheduler.publish_scheduled_post(bot, post)
+                    seconds.append(time.perf_counter() - post_started)
+            finally:
+                elapsed = time.perf_counter() - started
+                await bot.session.close()
+
+    return {
+        'posts': len(seconds),
+        'posts_per_s': round(len(seconds) / elapsed, 1) if elapsed else None,
+        'publish_ms': summary(seconds, 1000),
+    }
+
+
+def publish_child(args):
+    perf.install_event_loop()
+    result = asyncio.run(run_publish(args))
+    result['perf'] = perf.profile()
+    print(json.dumps(result))
+
+
+# ============ СРАВНЕНИЕ ============
+
+def run_profile(name: str, args) -> dict:
+    env = {**os.environ, 'PERF_PROFILE': PROFILES[name]}
+
+    with tempfile.NamedTemporaryFile(suffix='.json') as output:
+        subprocess.run(
+            [
+                sys.executable, '-m', 'benchmarks.load_dispatcher',
+                '--users', str(args.users), '--duration', str(args.duration),
+                '--latency', '0', '--jitter', '0', '--seed', str(args.seed),
+                '--output', output.name,
+            ],
+            env=env, check=True, stdout=subprocess.DEVNULL
+        )
+        load = json.load(open(output.name, encoding='utf-8'))
+
+    publish = json.loads(subprocess.run(
+        [
+            sys.executable, '-m', 'benchmarks.bench_perf', '--child',
+            '--posts', str(args.posts), '--seed', str(args.seed),
+        ],
+        env=env, check=True, capture_output=True, text=True
+    ).stdout)
+
+    return {
+        'perf': publish.pop('perf'),
+        'dispatcher': {
+            'updates': load['updates'],
+            'updates_per_s': load['updates_per_s'],
+            'update_latency_ms': load['update_latency_ms'],
+            'errors': sum(load['errors'].values()),
+        },
+        'publish': publish,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100, help="виртуальных пользователей диспетчера")
+    parser.add_argument("--duration", type=float, default=15, help="длительность прогона диспетчера, сек")
+    parser.add_argument("--posts", type=int, default=2000, help="постов на публикацию")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help="файл для JSON (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.child:
+        publish_child(args)
+        return
+
+    profiles = {}
+    for name in PROFILES:
+        profiles[name] = result = run_profile(name, args)
+        print(
+            f"{name:<7} {result['perf']['loop']:<8} {result['perf']['json']:<7} "
+            f"{result['dispatcher']['updates_per_s']:>8} upd/s  "
+            f"p95 {result['dispatcher']['update_latency_ms']['p95']:>7} ms  "
+            f"publish p50 {result['publish']['publish_ms']['p50']:>6} ms  "
+            f"{result['publish']['posts_per_s']:>7} posts/s",
+            file=sys.stderr
+        )
+
+    base, fast = profiles['stdlib'], profiles['perf']
+    report = {
+        'benchmark': 'perf_profile',
+        'revision': git_revision(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'params': {
+            'users': args.users,
+            'duration_s': args.duration,
+            'posts': args.posts,
+            'seed': args.seed,
+        },
+        'profiles': profiles,
+        'speedup': {
+            'updates_per_s': round(fast['dispatcher']['updates_per_s'] / base['dispatcher']['updates_per_s'], 2),
+            'publish_p50': round(base['publish']['publish_ms']['p50'] / fast['publish']['publish_ms']['p50'], 2),
+        },
+    }
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
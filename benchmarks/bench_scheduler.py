@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк планировщика на больших очередях.
+
+Засевает scheduled_posts синтетическими постами (10k / 100k / 1M),
+гоняет проходы планировщика по виртуальным часам против фейкового Bot API
+и пишет JSON с результатами: стоимость прохода, задержка публикации
+(перцентили), время в БД и память.
+
+В каждом прогоне --due постов наступают внутри окна симуляции
+(форма задаётся распределением), остальные лежат в будущем до 30 дней -
+так объём публикаций постоянный, а растёт только размер очереди.
+
+Запустить: python -m benchmarks.bench_scheduler --sizes 10000,100000 --output scheduler.json
+Сравнить коммиты: сохранить JSON с каждого и сравнить tick_ms / lag_s.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+TOKEN = "42:BENCHMARK"
+os.environ.setdefault("BOT_TOKEN", TOKEN)
+
+from aiogram import Bot
+
+import database as db
+from keyboards import compile_url_buttons
+from utils import scheduler
+from utils.session import BotSession
+from benchmarks.common import DbTimer, git_revision, summary
+from benchmarks.fake_api import FakeTelegramServer
+
+DISTRIBUTIONS = ('uniform', 'burst', 'overdue', 'minute_marks')
+START = datetime(2024, 3, 1, 11, 58, 0)
+HORIZON = timedelta(days=30)
+CHANNELS = 50
+USERS = 500
+BUTTONS = "Канал - https://t.me/example | Сайт - https://example.com"
+
+
+# ============ ДАННЫЕ ============
+
+def due_times(distribution: str, count: int, window: timedelta, rng: random.Random):
+    """Времена постов, которые наступают внутри окна симуляции"""
+    if distribution == 'uniform':
+        return [START + window * rng.random() for _ in range(count)]
+    if distribution == 'burst':
+        # Все на одну минуту - типичное «в 12:00 во все каналы»
+        return [START + timedelta(minutes=2)] * count
+    if distribution == 'overdue':
+        # Бот лежал: очередь просрочена на час-сутки
+        return [START - timedelta(seconds=rng.uniform(3600, 86400)) for _ in range(count)]
+    if distribution == 'minute_marks':
+        # Пользователи выбирают круглые минуты
+        marks = max(1, int(window.total_seconds() // 60))
+        return [START + timedelta(minutes=rng.randrange(marks)) for _ in range(count)]
+    raise ValueError(f"Unknown distribution: {distribution}")
+
+
+def seed_posts(path: str, size: int, distribution: str, due: int, window: timedelta, seed: int):
+    """Заполнить очередь: due постов в окне, остальные - в будущем"""
+    rng = random.Random(seed)
+    compiled = compile_url_buttons(BUTTONS).compiled
+    due = min(due, size)
+    times = due_times(distribution, due, window, rng)
+    future_start = START + window
+    times += [future_start + HORIZON * rng.random() for _ in range(size - due)]
+    rng.shuffle(times)
+
+    def rows():
+        for i, scheduled_time in enumerate(times):
+            kind = i % 10
+            yield (
+                -1000000000000 - rng.randrange(CHANNELS),
+                1 + rng.randrange(USERS),
+                f"Пост #{i}: " + "текст " * rng.randint(5, 60),
+                'photo' if kind == 0 else None,
+                f"photo{i}" if kind == 0 else None,
+                BUTTONS if kind == 1 else None,
+                compiled if kind == 1 else None,
+                scheduled_time.strftime("%Y-%m-%d %H:%M:%S"),
+            )
+
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany(
+            """INSERT INTO scheduled_posts
+               (channel_id, user_id, text, media_type, media_file_id, buttons, buttons_compiled, scheduled_time)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            rows()
+        )
+    conn.close()
+    return sum(1 for t in times if t <= START + window)
+
+
+# ============ ПРОГОН ============
+
+async def run_case(bot, server, workdir, size, distribution, args):
+    interval = timedelta(seconds=scheduler.CHECK_INTERVAL)
+    window = interval * (args.ticks - 1)
+
+    db.DATABASE_PATH = os.path.join(workdir, f"sched_{size}_{distribution}.db")
+    await db.init_db()
+    seed_started = time.perf_counter()
+    expected = seed_posts(db.DATABASE_PATH, size, distribution, args.due, window, args.seed)
+    seed_seconds = time.perf_counter() - seed_started
+    server.reset()
+
+    lags = []
+    clock = {}
+    publish = scheduler.publish_scheduled_post
+
+    async def publish_with_lag(bot, post, **kwargs):
+        published = await publish(bot, post, **kwargs)
+        # Виртуальное время = время прохода + сколько реально прошло с его начала
+        published_at = clock['now'] + timedelta(seconds=time.perf_counter() - clock['started'])
+        lags.append((published_at - scheduler.parse_db_time(post['scheduled_time'])).total_seconds())
+        return published
+
+    timer = DbTimer()
+    timer.install()
+    scheduler.publish_scheduled_post = publish_with_lag
+    tick_seconds = []
+    try:
+        for tick in range(args.ticks):
+            clock['now'] = START + interval * tick
+            clock['started'] = time.perf_counter()
+            await scheduler.process_due_posts(bot, clock['now'])
+            tick_seconds.append(time.perf_counter() - clock['started'])
+        db_report = timer.report()
+
+        # Память - отдельным проходом, чтобы tracemalloc не искажал время
+        tracemalloc.start()
+        clock['now'] = START + interval * args.ticks
+        clock['started'] = time.perf_counter()
+        await scheduler.process_due_posts(bot, clock['now'])
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        scheduler.publish_scheduled_post = publish
+        timer.uninstall()
+
+    api_calls = server.counts()
+    os.remove(db.DATABASE_PATH)
+
+    return {
+        'size': size,
+        'distribution': distribution,
+        'ticks': args.ticks,
+        'due': expected,
+        'published': len(lags),
+        'seed_s': round(seed_seconds, 3),
+        'tick_ms': summary(tick_seconds, 1000),
+        'lag_s': summary(lags),
+        'db': db_report,
+        'api_calls': dict(api_calls),
+        'memory': {'tick_peak_kb': round(peak / 1024, 1)},
+    }
+
+
+async def run(args):
+    sizes = [int(s) for s in args.sizes.split(',')]
+    distributions = args.distributions.split(',')
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        async with FakeTelegramServer(latency=args.latency, seed=args.seed) as server:
+            bot = Bot(token=TOKEN, session=BotSession(api=server.api))
+            try:
+                for size in sizes:
+                    for distribution in distributions:
+                        result = await run_case(bot, server, workdir, size, distribution, args)
+                        results.append(result)
+                        tick, lag = result['tick_ms'], result['lag_s'] or {}
+                        print(
+                            f"{size:>9} {distribution:<13} tick p50 {tick['p50']:>9.1f} ms  "
+                            f"max {tick['max']:>9.1f} ms  lag p95 {lag.get('p95', 0):>7.1f} s  "
+                            f"db {result['db']['total_ms']:>9.1f} ms  "
+                            f"mem {result['memory']['tick_peak_kb']:>9.1f} KB",
+                            file=sys.stderr
+                        )
+            finally:
+                await bot.session.close()
+
+    return {
+        'benchmark': 'scheduler',
+        'revision': git_revision(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'params': {
+            'ticks': args.ticks,
+            'interval_s': scheduler.CHECK_INTERVAL,
+            'due': args.due,
+            'latency_s': args.latency,
+            'seed': args.seed,
+        },
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000", help="размеры очереди через запятую (1000000 - долго)")
+    parser.add_argument("--distributions", default=",".join(DISTRIBUTIONS))
+    parser.add_argument("--ticks", type=int, default=10, help="проходов планировщика на прогон")
+    parser.add_argument("--due", type=int, default=200, help="постов, наступающих внутри окна")
+    parser.add_argument("--latency", type=float, default=0.005, help="задержка фейкового API, сек")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="файл для JSON (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    for distribution in args.distributions.split(','):
+        if distribution not in DISTRIBUTIONS:
+            parser.error(f"unknown distribution: {distribution}")
+
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(run(args))
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк поиска /find на больших таблицах.
+
+Засевает scheduled_posts и templates синтетическими текстами (по умолчанию
+100k постов и 20k шаблонов на 500 пользователей, один «тяжёлый» пользователь
+с --heavy постами) и меряет страницу результатов и подсчёт совпадений
+для частых, редких и многословных запросов.
+
+Запустить: python -m benchmarks.bench_search [--posts 100000] [--templates 20000] [--queries 200]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("BOT_TOKEN", "42:BENCHMARK")
+
+import database as db
+from benchmarks.common import git_revision, summary
+
+USERS = 500
+HEAVY_USER = USERS + 1
+START = datetime(2024, 3, 1, 12, 0, 0)
+WORDS = (
+    "скидка акция новости неделя розыгрыш подписчики канал конкурс обзор анонс "
+    "релиз обновление вебинар курс подарок промокод весна лето осень зима "
+    "утро вечер стрим видео подкаст статья интервью итоги рейтинг подборка"
+).split()
+RARE = "уникальныйтокен"
+
+QUERIES = {
+    'common': "скидка",
+    'prefix': "подпис",
+    'two_words': "акция розыгрыш",
+    'rare': RARE,
+    'missing': "несуществующееслово",
+}
+
+
+def text(rng: random.Random, i: int) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(5, 60))]
+    if i % 1000 == 0:
+        words.append(RARE)
+    return f"Пост #{i}: " + " ".join(words)
+
+
+def seed(path: str, posts: int, templates: int, heavy: int, rng: random.Random):
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany(
+            """INSERT INTO scheduled_posts (channel_id, user_id, text, scheduled_time, status)
+               VALUES (?, ?, ?, ?, ?)""",
+            (
+                (
+                    -1000000000000 - i % 50,
+                    HEAVY_USER if i < heavy else 1 + rng.randrange(USERS),
+                    text(rng, i),
+                    (START + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S"),
+                    'published' if i % 3 == 0 else 'pending',
+                )
+                for i in range(posts)
+            )
+        )
+        conn.executemany(
+            "INSERT INTO templates (user_id, name, text) VALUES (?, ?, ?)",
+            (
+                (1 + rng.randrange(USERS), " ".join(rng.sample(WORDS, 2)), text(rng, i))
+                for i in range(templates)
+            )
+        )
+    conn.close()
+
+
+async def measure(user_ids, query: str, repeat: int):
+    search, count = [], []
+    for i in range(repeat):
+        user_id = user_ids[i % len(user_ids)]
+        started = time.perf_counter()
+        await db.search_scheduled_posts(user_id, query)
+        await db.search_templates(user_id, query)
+        search.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        await db.count_search_results(user_id, query)
+        count.append(time.perf_counter() - started)
+    return {'search_ms': summary(search, 1000), 'count_ms': summary(count, 1000)}
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        db.DATABASE_PATH = os.path.join(workdir, "search.db")
+        await db.init_db()
+        started = time.perf_counter()
+        seed(db.DATABASE_PATH, args.posts, args.templates, args.heavy, rng)
+        seed_seconds = time.perf_counter() - started
+
+        users = [1 + rng.randrange(USERS) for _ in range(50)]
+        for name, query in QUERIES.items():
+            results[name] = await measure(users, query, args.queries)
+            results[f"{name}_heavy"] = await measure([HEAVY_USER], query, max(args.queries // 10, 1))
+            for key in (name, f"{name}_heavy"):
+                print(
+                    f"{key:<18} search p50 {results[key]['search_ms']['p50']:>7.2f} ms  "
+                    f"p95 {results[key]['search_ms']['p95']:>7.2f} ms  "
+                    f"count p50 {results[key]['count_ms']['p50']:>7.2f} ms",
+                    file=sys.stderr
+                )
+
+    return {
+        'benchmark': 'search',
+        'revision': git_revision(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'posts': args.posts,
+        'templates': args.templates,
+        'heavy_user_posts': args.heavy,
+        'seed_s': round(seed_seconds, 3),
+        'queries': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=100000)
+    parser.add_argument("--templates", type=int, default=20000)
+    parser.add_argument("--heavy", type=int, default=5000, help="постов у одного пользователя")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="куда записать JSON (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
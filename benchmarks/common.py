@@ -0,0 +1,85 @@
+"""
+Общие измерения для бенчмарков: перцентили, время в БД, ревизия git.
+"""
+
+import functools
+import inspect
+import subprocess
+import time
+from collections import defaultdict
+
+import database as db
+
+
+def percentile(values, q: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def summary(values, scale: float = 1.0, digits: int = 3):
+    if not values:
+        return None
+    return {
+        'p50': round(percentile(values, 0.5) * scale, digits),
+        'p95': round(percentile(values, 0.95) * scale, digits),
+        'p99': round(percentile(values, 0.99) * scale, digits),
+        'max': round(max(values) * scale, digits),
+        'mean': round(sum(values) / len(values) * scale, digits),
+    }
+
+
+class DbTimer:
+    """Время и число вызовов функций database.py"""
+
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self._originals = {}
+
+    def install(self):
+        for name, func in inspect.getmembers(db, inspect.iscoroutinefunction):
+            if func.__module__ != db.__name__:
+                continue
+            self._originals[name] = func
+            setattr(db, name, self._wrap(name, func))
+
+    def uninstall(self):
+        for name, func in self._originals.items():
+            setattr(db, name, func)
+        self._originals.clear()
+
+    def _wrap(self, name, func):
+        @functools.wraps(func)
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.calls[name] += 1
+                self.seconds[name] += time.perf_counter() - started
+        return timed
+
+    def reset(self):
+        self.calls.clear()
+        self.seconds.clear()
+
+    def report(self):
+        return {
+            'calls': sum(self.calls.values()),
+            'total_ms': round(sum(self.seconds.values()) * 1000, 3),
+            'by_function': {
+                name: {'calls': self.calls[name], 'total_ms': round(self.seconds[name] * 1000, 3)}
+                for name in sorted(self.calls)
+            },
+        }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
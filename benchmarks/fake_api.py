@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Локальный фейковый Telegram Bot API для нагрузочных и интеграционных прогонов.
+
+Поддерживает методы, которыми пользуется бот (sendMessage, sendPhoto, sendVideo,
+sendDocument, sendMediaGroup, sendPoll, editMessageText, editMessageCaption,
+deleteMessage, getChat, getChatMember, getChatMemberCount и служебные),
+имитирует задержку сети, отвечает 429 с заданной вероятностью
+и записывает все запросы.
+
+Запустить отдельно: python -m benchmarks.fake_api --port 8081 --latency 0.05
+и затем бота: TELEGRAM_API_URL=http://127.0.0.1:8081 BOT_TOKEN=42:FAKE python bot.py
+
+Из кода:
+    async with FakeTelegramServer(latency=0.01) as server:
+        bot = Bot(token="42:FAKE", session=BotSession(api=server.api))
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter, defaultdict
+from typing import NamedTuple, Optional
+
+from aiohttp import web
+from aiogram.client.telegram import TelegramAPIServer
+
+
+class RecordedRequest(NamedTuple):
+    method: str
+    params: dict
+    received_at: float
+    status: int
+
+
+class FakeTelegramServer:
+    """Фейковый Bot API на aiohttp"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0,
+                 flood_rate: float = 0.0, retry_after: int = 1,
+                 member_count: int = 1000, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.member_count = member_count
+        self.requests = []
+
+        self._random = random.Random(seed)
+        self._message_counters = defaultdict(lambda: itertools.count(1))
+        self._file_ids = itertools.count(1)
+        self._forced_floods = Counter()
+        self._members = {}
+        self._member_counts = {}
+        self._runner = None
+        self.url = None
+
+        self._handlers = {
+            'getMe': self._get_me,
+            'sendMessage': self._send_message,
+            'sendPhoto': self._send_photo,
+            'sendVideo': self._send_video,
+            'sendDocument': self._send_document,
+            'sendMediaGroup': self._send_media_group,
+            'sendPoll': self._send_poll,
+            'editMessageText': self._edit_message_text,
+            'editMessageCaption': self._edit_message_caption,
+            'editMessageReplyMarkup': self._edit_message_reply_markup,
+            'deleteMessage': self._true,
+            'answerCallbackQuery': self._true,
+            'getChat': self._get_chat,
+            'getChatMember': self._get_chat_member,
+            'getChatMemberCount': self._get_chat_member_count,
+        }
+
+    # ============ НАСТРОЙКА ============
+
+    @property
+    def api(self) -> TelegramAPIServer:
+        """Адрес сервера для BotSession(api=...)"""
+        return TelegramAPIServer.from_base(self.url)
+
+    def set_member(self, chat_id: int, user_id: int, status: str):
+        """Статус участника: creator / administrator / member / left"""
+        self._members[(chat_id, user_id)] = status
+
+    def set_member_count(self, chat_id: int, count: int):
+        self._member_counts[chat_id] = count
+
+    def flood_next(self, method: str, times: int = 1):
+        """Ответить 429 на ближайшие вызовы метода"""
+        self._forced_floods[method] += times
+
+    def calls(self, method: str = None):
+        """Записанные запросы (только успешные)"""
+        return [r for r in self.requests if r.status == 200 and (method is None or r.method == method)]
+
+    def counts(self) -> Counter:
+        """Число запросов по методам"""
+        return Counter(r.method for r in self.requests)
+
+    def reset(self):
+        self.requests.clear()
+
+    # ============ ЗАПУСК ============
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    # ============ ОБРАБОТКА ============
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        token = request.match_info['token']
+        params = dict(await request.post())
+        received_at = time.time()
+
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+
+        if self._forced_floods[method] > 0 or (self.flood_rate and self._random.random() < self.flood_rate):
+            if self._forced_floods[method] > 0:
+                self._forced_floods[method] -= 1
+            self.requests.append(RecordedRequest(method, params, received_at, 429))
+            return web.json_response({
+                'ok': False,
+                'error_code': 429,
+                'description': f"Too Many Requests: retry after {self.retry_after}",
+                'parameters': {'retry_after': self.retry_after},
+            }, status=429)
+
+        handler = self._handlers.get(method)
+        if handler is None:
+            self.requests.append(RecordedRequest(method, params, received_at, 404))
+            return web.json_response(
+                {'ok': False, 'error_code': 404, 'description': "Not Found: method not found"},
+                status=404
+            )
+
+        self.requests.append(RecordedRequest(method, params, received_at, 200))
+        result = handler(int(token.split(':')[0]), params)
+        return web.json_response({'ok': True, 'result': result})
+
+    # ============ ОБЪЕКТЫ ============
+
+    @staticmethod
+    def _chat(chat_id) -> dict:
+        chat_id = int(chat_id)
+        if chat_id < 0:
+            return {'id': chat_id, 'type': 'channel', 'title': f"Channel {chat_id}"}
+        return {'id': chat_id, 'type': 'private', 'first_name': f"User {chat_id}"}
+
+    def _message(self, params: dict, **content) -> dict:
+        chat_id = int(params['chat_id'])
+        message = {
+            'message_id': next(self._message_counters[chat_id]),
+            'date': int(time.time()),
+            'chat': self._chat(chat_id),
+        }
+        if params.get('reply_markup'):
+            markup = json.loads(params['reply_markup'])
+            if 'inline_keyboard' in markup:
+                message['reply_markup'] = markup
+        message.update({k: v for k, v in content.items() if v is not None})
+        return message
+
+    def _file(self, prefix: str) -> dict:
+        n = next(self._file_ids)
+        return {'file_id': f"{prefix}{n}", 'file_unique_id': f"u{prefix}{n}"}
+
+    @staticmethod
+    def _user(user_id: int, is_bot: bool = False) -> dict:
+        return {'id': user_id, 'is_bot': is_bot, 'first_name': f"User {user_id}"}
+
+    # ============ МЕТОДЫ ============
+
+    @staticmethod
+    def _true(bot_id: int, params: dict):
+        return True
+
+    @staticmethod
+    def _get_me(bot_id: int, params: dict):
+        return {'id': bot_id, 'is_bot': True, 'first_name': "Fake Bot", 'username': "fake_bot"}
+
+    def _send_message(self, bot_id: int, params: dict):
+        return self._message(params, text=params.get('text', ''))
+
+    def _send_photo(self, bot_id: int, params: dict):
+        photo = {**self._file('photo'), 'width': 1280, 'height': 720}
+        return self._message(params, photo=[photo], caption=params.get('caption'))
+
+    def _send_video(self, bot_id: int, params: dict):
+        video = {**self._file('video'), 'width': 1280, 'height': 720, 'duration': 10}
+        return self._message(params, video=video, caption=params.get('caption'))
+
+    def _send_document(self, bot_id: int, params: dict):
+        return self._message(params, document=self._file('doc'), caption=params.get('caption'))
+
+    def _send_media_group(self, bot_id: int, params: dict):
+        media = json.loads(params['media'])
+        group_id = str(next(self._file_ids))
+        messages = []
+        for item in media:
+            if item['type'] == 'photo':
+                content = {'photo': [{**self._file('photo'), 'width': 1280, 'height': 720}]}
+            else:
+                content = {'video': {**self._file('video'), 'width': 1280, 'height': 720, 'duration': 10}}
+            messages.append(self._message(
+                params, media_group_id=group_id, caption=item.get('caption'), **content
+            ))
+        return messages
+
+    def _send_poll(self, bot_id: int, params: dict):
+        options = json.loads(params['options'])
+        poll = {
+            'id': str(next(self._file_ids)),
+            'question': params['question'],
+            'options': [
+                {'text': o['text'] if isinstance(o, dict) else o, 'voter_count': 0}
+                for o in options
+            ],
+            'total_voter_count': 0,
+            'is_closed': False,
+            'is_anonymous': params.get('is_anonymous', 'true') != 'false',
+            'type': params.get('type', 'regular'),
+            'allows_multiple_answers': params.get('allows_multiple_answers') == 'true',
+        }
+        return self._message(params, poll=poll)
+
+    def _edited(self, params: dict, **content) -> dict:
+        message = self._message(params, **content)
+        message['message_id'] = int(params['message_id'])
+        message['edit_date'] = int(time.time())
+        return message
+
+    def _edit_message_text(self, bot_id: int, params: dict):
+        return self._edited(params, text=params.get('text', ''))
+
+    def _edit_message_caption(self, bot_id: int, params: dict):
+        return self._edited(params, caption=params.get('caption'))
+
+    def _edit_message_reply_markup(self, bot_id: int, params: dict):
+        return self._edited(params, text="")
+
+    def _get_chat(self, bot_id: int, params: dict):
+        chat = self._chat(params['chat_id'])
+        if chat['type'] == 'channel':
+            chat['username'] = f"channel{abs(chat['id'])}"
+        return {**chat, 'accent_color_id': 0, 'max_reaction_count': 11}
+
+    def _get_chat_member(self, bot_id: int, params: dict):
+        chat_id, user_id = int(params['chat_id']), int(params['user_id'])
+        status = self._members.get(
+            (chat_id, user_id), 'administrator' if user_id == bot_id else 'creator'
+        )
+        user = self._user(user_id, is_bot=user_id == bot_id)
+        if status == 'creator':
+            return {'status': 'creator', 'user': user, 'is_anonymous': False}
+        if status == 'administrator':
+            rights = dict.fromkeys((
+                'can_manage_chat', 'can_delete_messages', 'can_manage_video_chats',
+                'can_restrict_members', 'can_promote_members', 'can_change_info',
+                'can_invite_users', 'can_post_stories', 'can_edit_stories',
+                'can_delete_stories', 'can_post_messages', 'can_edit_messages',
+            ), True)
+            return {'status': 'administrator', 'user': user, 'can_be_edited': False,
+                    'is_anonymous': False, **rights}
+        return {'status': status, 'user': user}
+
+    def _get_chat_member_count(self, bot_id: int, params: dict):
+        return self._member_counts.get(int(params['chat_id']), self.member_count)
+
+
+async def serve(args):
+    server = FakeTelegramServer(
+        latency=args.latency, jitter=args.jitter,
+        flood_rate=args.flood_rate, retry_after=args.retry_after
+    )
+    url = await server.start(args.host, args.port)
+    print(f"Fake Bot API: {url}")
+    try:
+        while True:
+            await asyncio.sleep(60)
+            print(f"Requests: {dict(server.counts())}")
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа, сек")
+    parser.add_argument("--jitter", type=float, default=0.0, help="случайная добавка к задержке, сек")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
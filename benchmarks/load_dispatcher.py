@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный генератор апдейтов: прогоняет сценарии пользователей
+(создание и отложка поста, шаблоны, опросы, список отложенных)
+через Dispatcher.feed_update с заданной скоростью.
+
+Всё офлайн: фейковый Bot API (benchmarks/fake_api.py) и временная БД.
+На выходе JSON: апдейтов в секунду, задержка апдейта и каждого хендлера,
+число вызовов БД и API.
+
+Запустить: python -m benchmarks.load_dispatcher --users 200 --rate 500 --duration 30
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+TOKEN = "42:LOADTEST"
+os.environ.setdefault("BOT_TOKEN", TOKEN)
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.enums import ParseMode
+from aiogram.types import Update
+
+import database as db
+import perf
+from bot import create_dispatcher
+from utils.session import BotSession
+from benchmarks.common import DbTimer, git_revision, summary
+from benchmarks.fake_api import FakeTelegramServer
+
+BUTTONS = "Канал - https://t.me/example | Сайт - https://example.com\nЧат - https://t.me/example_chat"
+
+# Шаги сценария: (тип апдейта, текст сообщения или callback_data)
+SCENARIOS = {
+    'schedule_post': [
+        ('message', "✍️ Создать пост"),
+        ('callback', "channel_select_{channel_id}"),
+        ('message', "Пост пользователя {user_id}: <b>новость</b> дня"),
+        ('callback', "next_step"),
+        ('callback', "schedule_post"),
+        ('callback', "schedule_1h"),
+    ],
+    'publish_post': [
+        ('message', "✍️ Создать пост"),
+        ('callback', "channel_select_{channel_id}"),
+        ('message', "Срочный пост пользователя {user_id}"),
+        ('callback', "add_buttons"),
+        ('message', BUTTONS),
+        ('callback', "next_step"),
+        ('callback', "publish_now"),
+        ('callback', "confirm_publish"),
+    ],
+    'use_template': [
+        ('message', "📋 Шаблоны"),
+        ('callback', "use_template_{template_id}"),
+        ('callback', "publish_from_template"),
+    ],
+    'save_template': [
+        ('message', "📋 Шаблоны"),
+        ('callback', "create_template"),
+        ('message', "Текст шаблона пользователя {user_id}"),
+        ('message', "Шаблон {user_id}"),
+    ],
+    'poll': [
+        ('message', "📊 Опрос"),
+        ('message', "Что публикуем завтра?"),
+        ('message', "Новости\nОбзор\nМемы"),
+        ('callback', "toggle_anonymous"),
+        ('callback', "publish_poll"),
+    ],
+    'scheduled_list': [
+        ('message', "📅 Отложенные"),
+        ('callback', "back_to_main"),
+    ],
+}
+DEFAULT_MIX = "schedule_post=3,publish_post=1,use_template=2,save_template=1,poll=1,scheduled_list=2"
+
+
+# ============ АПДЕЙТЫ ============
+
+class VirtualUser:
+    """Пользователь со своим каналом и шаблоном"""
+
+    def __init__(self, user_id: int, channel_id: int, template_id: int):
+        self.user_id = user_id
+        self.channel_id = channel_id
+        self.template_id = template_id
+
+    @property
+    def user(self) -> dict:
+        return {'id': self.user_id, 'is_bot': False, 'first_name': f"User {self.user_id}"}
+
+    @property
+    def chat(self) -> dict:
+        return {'id': self.user_id, 'type': 'private', 'first_name': f"User {self.user_id}"}
+
+    def fill(self, template: str) -> str:
+        return template.format(
+            user_id=self.user_id, channel_id=self.channel_id, template_id=self.template_id
+        )
+
+
+class UpdateFactory:
+    """Сборка Message / CallbackQuery апдейтов, уже привязанных к боту"""
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    def build(self, user: VirtualUser, kind: str, value: str) -> Update:
+        update_id = next(self._update_ids)
+        now = int(time.time())
+        if kind == 'message':
+            payload = {'message': {
+                'message_id': next(self._message_ids),
+                'date': now,
+                'chat': user.chat,
+                'from': user.user,
+                'text': user.fill(value),
+            }}
+        else:
+            payload = {'callback_query': {
+                'id': str(update_id),
+                'from': user.user,
+                'chat_instance': str(user.user_id),
+                'data': user.fill(value),
+                'message': {
+                    # Фейковому API неважно, какое сообщение редактируют
+                    'message_id': 1,
+                    'date': now,
+                    'chat': user.chat,
+                    'from': {'id': self.bot.id, 'is_bot': True, 'first_name': "Bot"},
+                    'text': "…",
+                },
+            }}
+        return Update.model_validate({'update_id': update_id, **payload}, context={'bot': self.bot})
+
+
+# ============ ИЗМЕРЕНИЯ ============
+
+class HandlerTimer(BaseMiddleware):
+    """Время работы каждого хендлера (inner middleware диспетчера)"""
+
+    def __init__(self):
+        self.seconds = defaultdict(list)
+
+    async def __call__(self, handler, event, data):
+        callback = data['handler'].callback
+        name = f"{callback.__module__.rsplit('.', 1)[-1]}.{callback.__name__}"
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.seconds[name].append(time.perf_counter() - started)
+
+
+class Pacer:
+    """Общий темп апдейтов для всех пользователей (0 - без ограничения)"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate else 0
+        self._next = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+# ============ ПРОГОН ============
+
+async def seed_users(count: int):
+    users = []
+    for i in range(count):
+        user_id = 100000 + i
+        channel_id = -1000000000000 - i
+        await db.add_channel(channel_id, f"load_channel_{i}", f"Канал {i}", user_id)
+        template_id = await db.add_template(
+            user_id, f"Шаблон {i}", f"Текст шаблона {i}", None, None, BUTTONS
+        )
+        users.append(VirtualUser(user_id, channel_id, template_id))
+    return users
+
+
+def parse_mix(mix: str):
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario: {name}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+async def run(args):
+    weights = parse_mix(args.mix)
+    names, scenario_weights = list(weights), list(weights.values())
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db.DATABASE_PATH = os.path.join(workdir, "load.db")
+        await db.init_db()
+        users = await seed_users(args.users)
+
+        async with FakeTelegramServer(latency=args.latency, jitter=args.jitter, seed=args.seed) as server:
+            bot = Bot(
+                token=TOKEN,
+                session=BotSession(api=server.api),
+                default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+            )
+            dp = create_dispatcher()
+            handler_timer = HandlerTimer()
+            dp.message.middleware(handler_timer)
+            dp.callback_query.middleware(handler_timer)
+
+            factory = UpdateFactory(bot)
+            pacer = Pacer(args.rate)
+            update_seconds = []
+            scenarios_done = Counter()
+            unhandled = Counter()
+            errors = Counter()
+            db_timer = DbTimer()
+            db_timer.install()
+
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + args.duration
+
+            async def user_loop(user: VirtualUser):
+                while loop.time() < deadline:
+                    name = rng.choices(names, scenario_weights)[0]
+                    for kind, value in SCENARIOS[name]:
+                        await pacer.wait()
+                        if loop.time() >= deadline:
+                            return
+                        update = factory.build(user, kind, value)
+                        started = time.perf_counter()
+                        try:
+                            result = await dp.feed_update(bot, update)
+                            if result is UNHANDLED:
+                                unhandled[f"{name}: {value}"] += 1
+                        except Exception as e:
+                            errors[f"{name}: {type(e).__name__}: {e}"[:200]] += 1
+                        update_seconds.append(time.perf_counter() - started)
+                        if args.think:
+                            await asyncio.sleep(rng.expovariate(1 / args.think))
+                    scenarios_done[name] += 1
+
+            started = time.perf_counter()
+            try:
+                await asyncio.gather(*(user_loop(user) for user in users))
+            finally:
+                elapsed = time.perf_counter() - started
+                db_timer.uninstall()
+                await bot.session.close()
+
+            api_calls = server.counts()
+
+    handlers = {
+        name: {'count': len(values), 'latency_ms': summary(values, 1000)}
+        for name, values in sorted(handler_timer.seconds.items())
+    }
+    db_report = db_timer.report()
+    total = len(update_seconds)
+
+    return {
+        'benchmark': 'dispatcher_load',
+        'revision': git_revision(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'perf': perf.profile(),
+        'params': {
+            'users': args.users,
+            'rate': args.rate,
+            'duration_s': args.duration,
+            'think_s': args.think,
+            'latency_s': args.latency,
+            'jitter_s': args.jitter,
+            'mix': weights,
+            'seed': args.seed,
+        },
+        'updates': total,
+        'elapsed_s': round(elapsed, 3),
+        'updates_per_s': round(total / elapsed, 1) if elapsed else None,
+        'update_latency_ms': summary(update_seconds, 1000),
+        'scenarios': dict(scenarios_done),
+        'handlers': handlers,
+        'db': {**db_report, 'calls_per_update': round(db_report['calls'] / total, 2) if total else None},
+        'api': {
+            'calls': sum(api_calls.values()),
+            'calls_per_update': round(sum(api_calls.values()) / total, 2) if total else None,
+            'by_method': dict(api_calls),
+        },
+        'unhandled': dict(unhandled),
+        'errors': dict(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100, help="виртуальных пользователей")
+    parser.add_argument("--rate", type=float, default=0, help="целевой темп, апдейтов/сек (0 - максимум)")
+    parser.add_argument("--duration", type=float, default=20, help="длительность, сек")
+    parser.add_argument("--think", type=float, default=0, help="средняя пауза пользователя между шагами, сек")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="веса сценариев: имя=вес,...")
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка фейкового API, сек")
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="файл для JSON (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    try:
+        parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # bot.py включает INFO - для нагрузки это слишком шумно
+    logging.getLogger().setLevel(logging.WARNING)
+    perf.install_event_loop()
+    report = asyncio.run(run(args))
+
+    print(
+        f"{report['updates']} updates in {report['elapsed_s']} s = {report['updates_per_s']} upd/s, "
+        f"p95 {report['update_latency_ms']['p95'] if report['update_latency_ms'] else '-'} ms, "
+        f"db {report['db']['calls_per_update']}/upd, api {report['api']['calls_per_update']}/upd, "
+        f"unhandled {sum(report['unhandled'].values())}, errors {sum(report['errors'].values())}",
+        file=sys.stderr
+    )
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
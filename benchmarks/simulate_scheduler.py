@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Симуляция планировщика на виртуальных часах.
+
+Засевает очередь постами на --days дней вперёд (часть с таймером удаления),
+запускает настоящий цикл планировщика с VirtualClock против фейкового
+Bot API и проигрывает всё время за секунды. Проверяет, что опубликовано
+и удалено ровно то, что должно, и пишет JSON с итогами.
+
+Код возврата 1, если что-то не опубликовано или удалено не вовремя, -
+годится для CI.
+
+Запустить: python -m benchmarks.simulate_scheduler --days 7 --posts 3000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+TOKEN = "42:SIMULATION"
+os.environ.setdefault("BOT_TOKEN", TOKEN)
+
+import aiosqlite
+from aiogram import Bot
+
+import database as db
+from utils import clock, scheduler
+from utils.clock import VirtualClock
+from utils.session import BotSession
+from benchmarks.common import git_revision, summary
+from benchmarks.fake_api import FakeTelegramServer
+
+START = datetime(2024, 3, 4, 0, 0, 0)
+CHANNELS = 20
+USERS = 100
+DELETE_AFTER = (3600, 6 * 3600, 24 * 3600)
+
+
+def seed_posts(path: str, count: int, days: int, delete_share: float, rng: random.Random):
+    """Посты на круглые минуты, днём чаще, чем ночью"""
+    rows = []
+    for i in range(count):
+        day = rng.randrange(days)
+        hour = int(rng.triangular(7, 23, 12))
+        scheduled = START + timedelta(days=day, hours=hour, minutes=rng.randrange(0, 60, 5))
+        delete_after = rng.choice(DELETE_AFTER) if rng.random() < delete_share else None
+        rows.append((
+            -1000000000000 - rng.randrange(CHANNELS),
+            1 + rng.randrange(USERS),
+            f"Пост #{i}",
+            scheduled.strftime("%Y-%m-%d %H:%M:%S"),
+            delete_after,
+        ))
+
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany(
+            """INSERT INTO scheduled_posts (channel_id, user_id, text, scheduled_time, delete_after)
+               VALUES (?, ?, ?, ?, ?)""",
+            rows
+        )
+    conn.close()
+    return rows
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    end = START + timedelta(days=args.days)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db.DATABASE_PATH = os.path.join(workdir, "simulation.db")
+        await db.init_db()
+        rows = seed_posts(db.DATABASE_PATH, args.posts, args.days, args.delete_share, rng)
+
+        virtual = VirtualClock(START)
+        clock.set_clock(virtual)
+
+        lags = []
+        publish = scheduler.publish_scheduled_post
+
+        async def publish_with_lag(bot, post, **kwargs):
+            lags.append((virtual.now() - scheduler.parse_db_time(post['scheduled_time'])).total_seconds())
+            return await publish(bot, post, **kwargs)
+
+        scheduler.publish_scheduled_post = publish_with_lag
+        db_calls = {'get_due_posts': 0}
+        get_due_posts = db.get_due_posts
+
+        async def counted_get_due_posts(now):
+            db_calls['get_due_posts'] += 1
+            return await get_due_posts(now)
+
+        db.get_due_posts = counted_get_due_posts
+
+        async with FakeTelegramServer(seed=args.seed) as server:
+            bot = Bot(token=TOKEN, session=BotSession(api=server.api))
+            started = time.perf_counter()
+            task = asyncio.create_task(scheduler.check_scheduled_posts(bot))
+            try:
+                await virtual.run_until(end)
+            finally:
+                wall = time.perf_counter() - started
+                task.cancel()
+                scheduler.publish_scheduled_post = publish
+                db.get_due_posts = get_due_posts
+                clock.set_clock(clock.RealClock())
+                await bot.session.close()
+
+            counts = server.counts()
+
+        async with aiosqlite.connect(db.DATABASE_PATH) as conn:
+            cursor = await conn.execute(
+                "SELECT status, COUNT(*) FROM scheduled_posts GROUP BY status"
+            )
+            statuses = dict(await cursor.fetchall())
+
+    end_str = end.strftime("%Y-%m-%d %H:%M:%S")
+    expected_published = sum(1 for row in rows if row[3] <= end_str)
+    expected_deleted = sum(
+        1 for row in rows
+        if row[4] and datetime.strptime(row[3], "%Y-%m-%d %H:%M:%S") + timedelta(seconds=row[4]) <= end
+    )
+    published = statuses.get('published', 0)
+    deleted = counts.get('deleteMessage', 0)
+
+    return {
+        'benchmark': 'scheduler_simulation',
+        'revision': git_revision(),
+        'params': {
+            'days': args.days,
+            'posts': args.posts,
+            'delete_share': args.delete_share,
+            'seed': args.seed,
+        },
+        'wall_s': round(wall, 3),
+        'virtual_days_per_wall_s': round(args.days / wall, 2) if wall else None,
+        'scheduler_passes': db_calls['get_due_posts'],
+        'published': published,
+        'expected_published': expected_published,
+        'deleted': deleted,
+        'expected_deleted': expected_deleted,
+        'statuses': statuses,
+        'lag_s': summary(lags),
+        'api_calls': dict(counts),
+        'ok': published == expected_published and deleted == expected_deleted and max(lags, default=0) <= 1,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--posts", type=int, default=3000)
+    parser.add_argument("--delete-share", type=float, default=0.1, help="доля постов с таймером удаления")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="файл для JSON (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(run(args))
+
+    print(
+        f"{args.days} days, {report['published']}/{report['expected_published']} published, "
+        f"{report['deleted']}/{report['expected_deleted']} deleted, "
+        f"{report['scheduler_passes']} passes in {report['wall_s']} s",
+        file=sys.stderr
+    )
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    sys.exit(0 if report['ok'] else 1)
+
+
+if __name__ == "__main__":
+    main()
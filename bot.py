@@ -1,14 +1,17 @@
 import asyncio
 import logging
-import sys
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
 from aiogram.fsm.storage.memory import MemoryStorage
 
-from config import BOT_TOKEN
+from config import BOT_TOKEN, TELEGRAM_API_URL
 import database as db
-from utils import start_scheduler
+import perf
+from utils import metrics, start_scheduler, start_collector, start_monitor
+from utils.logs import setup_logging
+from utils.session import BotSession
 
 from handlers import (
     start_router,
@@ -18,17 +21,39 @@ from handlers import (
     settings_router,
     stats_router,
     templates_router,
-    polls_router
+    polls_router,
+    chat_members_router,
+    failed_router,
+    queue_router,
+    bulk_router,
+    search_router
 )
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 
+def create_dispatcher() -> Dispatcher:
+    """Диспетчер со всеми роутерами"""
+    dp = Dispatcher(storage=MemoryStorage())
+    
+    # Регистрация роутеров
+    dp.include_router(start_router)
+    dp.include_router(create_post_router)
+    dp.include_router(scheduled_router)
+    dp.include_router(edit_post_router)
+    dp.include_router(settings_router)
+    dp.include_router(stats_router)
+    dp.include_router(templates_router)
+    dp.include_router(polls_router)
+    dp.include_router(chat_members_router)
+    dp.include_router(failed_router)
+    dp.include_router(queue_router)
+    dp.include_router(bulk_router)
+    dp.include_router(search_router)
+    
+    return dp
+
+
 async def main():
     """Главная функция запуска бота"""
     
@@ -37,28 +62,29 @@ async def main():
     logger.info("Database initialized")
     
     # Создание бота
+    api = TelegramAPIServer.from_base(TELEGRAM_API_URL) if TELEGRAM_API_URL else PRODUCTION
     bot = Bot(
         token=BOT_TOKEN,
+        session=BotSession(api=api),
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
     
     # Создание диспетчера
-    dp = Dispatcher(storage=MemoryStorage())
+    dp = create_dispatcher()
     
-    # Регистрация роутеров
-    dp.include_router(start_router)
-    dp.include_router(create_post_router)
-    dp.include_router(scheduled_router)
-    dp.include_router(edit_post_router)
-    dp.include_router(settings_router)
-    dp.include_router(stats_router)
-    dp.include_router(templates_router)
-    dp.include_router(polls_router)
+    # Метрики Prometheus (отдаются монитором на /metrics)
+    metrics.install(bot, dp)
     
     # Запуск планировщика
     start_scheduler(bot)
     logger.info("Scheduler started")
     
+    # Сбор статистики подписчиков
+    start_collector(bot)
+    
+    # Монитор цикла событий, API, БД и очереди
+    monitor = await start_monitor(bot)
+    
     # Информация о боте
     bot_info = await bot.get_me()
     logger.info(f"Bot started: @{bot_info.username}")
@@ -67,12 +93,18 @@ async def main():
     try:
         await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     finally:
+        await monitor.stop()
         await bot.session.close()
 
 
 if __name__ == "__main__":
+    # Логи пишет фоновый поток, цикл событий только кладёт их в очередь
+    log_listener = setup_logging()
+    perf.install_event_loop()
+    perf.log_profile()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
-        sys.exit(0)
+    finally:
+        log_listener.stop()
@@ -14,8 +14,80 @@ ADMIN_IDS = [int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip()]
 # Database
 # Railway автоматически добавляет DATABASE_URL для PostgreSQL
 DATABASE_URL = os.getenv("DATABASE_URL")
-DATABASE_PATH = "bot_database.db"  # Для локальной разработки (SQLite)
+DATABASE_PATH = os.getenv("DATABASE_PATH", "bot_database.db")  # Для локальной разработки (SQLite)
+
+# Свой адрес Bot API (локальный сервер или фейковый для тестов), по умолчанию api.telegram.org
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
 
 # Default settings
 DEFAULT_TIMEZONE = "Europe/Moscow"
 DEFAULT_FORMATTING = "HTML"
+
+# Логирование: уровень, формат (text / json) и лимит одинаковых INFO-сообщений
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", "20"))  # сообщений за окно (0 - без лимита)
+LOG_RATE_WINDOW = float(os.getenv("LOG_RATE_WINDOW", "60"))  # секунд
+LOG_SAMPLE = int(os.getenv("LOG_SAMPLE", "100"))  # сверх лимита пропускать каждое N-е
+
+# Профиль производительности: uvloop + orjson, если установлены (requirements-perf.txt)
+PERF_PROFILE = os.getenv("PERF_PROFILE", "0").lower() in ("1", "true", "yes")
+
+# Публикация и соединения с Bot API
+PUBLISH_WORKERS = int(os.getenv("PUBLISH_WORKERS", "8"))  # постов публикуется параллельно
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", str(PUBLISH_WORKERS + 12)))  # + polling и хендлеры
+API_KEEPALIVE = float(os.getenv("API_KEEPALIVE", "60"))  # секунд держать простаивающее соединение
+API_DNS_TTL = int(os.getenv("API_DNS_TTL", "300"))  # секунд кэша DNS
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "60"))  # секунд на запрос по умолчанию
+API_MEDIA_TIMEOUT = float(os.getenv("API_MEDIA_TIMEOUT", "180"))
+API_FAST_TIMEOUT = float(os.getenv("API_FAST_TIMEOUT", "10"))
+API_TIMEOUTS = {
+    'sendMediaGroup': API_MEDIA_TIMEOUT,
+    'sendVideo': API_MEDIA_TIMEOUT,
+    'sendDocument': API_MEDIA_TIMEOUT,
+    'answerCallbackQuery': API_FAST_TIMEOUT,
+}
+
+# Общий лимит отправок в Bot API (0 - без лимита) и веса полос приоритета (utils/lanes.py);
+# интерактивная полоса в очереди не стоит, поэтому веса у неё нет
+API_RATE = float(os.getenv("API_RATE", "30"))  # отправок в секунду
+API_BURST = float(os.getenv("API_BURST", "30"))  # отправок подряд без ожидания
+API_LANE_WEIGHTS = {
+    'publish': int(os.getenv("API_WEIGHT_PUBLISH", "8")),
+    'notify': int(os.getenv("API_WEIGHT_NOTIFY", "2")),
+    'background': int(os.getenv("API_WEIGHT_BACKGROUND", "1")),
+}
+
+# Через сколько секунд пост, застрявший в отправке, считается «под сомнением»
+PUBLISH_CLAIM_TIMEOUT = int(os.getenv("PUBLISH_CLAIM_TIMEOUT", str(int(API_MEDIA_TIMEOUT * 2))))
+
+# Сводки авторам о публикации: окно накопления и пауза между сообщениями, сек
+NOTIFY_WINDOW = float(os.getenv("NOTIFY_WINDOW", "30"))
+NOTIFY_GAP = float(os.getenv("NOTIFY_GAP", "0.1"))
+
+# Минимум минут между постами одного канала (0 - не проверять)
+MIN_POST_GAP = int(os.getenv("MIN_POST_GAP", "10"))
+
+# Догоняющий режим после простоя (лимиты Telegram: ~30 сообщений/с на бота, ~20/мин на канал)
+CATCHUP_AFTER = int(os.getenv("CATCHUP_AFTER", "300"))  # включается, если пропущенный за простой пост опоздал на столько секунд
+CATCHUP_RATE = float(os.getenv("CATCHUP_RATE", "10"))  # постов в секунду на всех
+CATCHUP_CHANNEL_INTERVAL = float(os.getenv("CATCHUP_CHANNEL_INTERVAL", "3"))  # секунд между постами канала
+
+# Сбор статистики подписчиков
+STATS_SAMPLE_INTERVAL = int(os.getenv("STATS_SAMPLE_INTERVAL", "300"))  # секунд между замерами
+STATS_SAMPLE_RATE = float(os.getenv("STATS_SAMPLE_RATE", "5"))  # запросов в секунду
+STATS_SAMPLE_CONCURRENCY = int(os.getenv("STATS_SAMPLE_CONCURRENCY", "5"))
+STATS_RETENTION_DAYS = {'minute': 2, 'hour': 90, 'day': 730}
+
+# Монитор работы бота (HTTP /health на MONITOR_HOST:MONITOR_PORT, 0 - без HTTP)
+MONITOR_HOST = os.getenv("MONITOR_HOST", "127.0.0.1")
+MONITOR_PORT = int(os.getenv("MONITOR_PORT", "8089"))
+MONITOR_INTERVAL = int(os.getenv("MONITOR_INTERVAL", "15"))  # секунд между проверками
+MONITOR_ALERT_COOLDOWN = int(os.getenv("MONITOR_ALERT_COOLDOWN", "900"))  # секунд между одинаковыми алертами
+MONITOR_THRESHOLDS = {
+    'loop_lag': float(os.getenv("MONITOR_LAG_ALERT", "1.0")),  # секунд
+    'tasks': int(os.getenv("MONITOR_TASKS_ALERT", "2000")),
+    'api_in_flight': int(os.getenv("MONITOR_API_ALERT", "100")),
+    'db_connections': int(os.getenv("MONITOR_DB_ALERT", "50")),
+    'overdue_age': int(os.getenv("MONITOR_OVERDUE_ALERT", "300")),  # секунд
+}
@@ -1,12 +1,142 @@
 import aiosqlite
-from datetime import datetime
+import re
+import sys
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
 from config import DATABASE_PATH
-import json
+from keyboards.buttons import compile_url_buttons
+from perf import json_dumps
+
+# Размер страницы в списках и предел точного подсчёта
+PAGE_SIZE = 10
+COUNT_CAP = 1000
+
+# Открытые соединения (для монитора): сейчас, максимум, всего
+connection_stats = {'open': 0, 'peak': 0, 'total': 0}
+
+# Наблюдатель за временем запросов (utils.metrics): fn(имя функции, секунды)
+query_observer = None
+
+# Полнотекстовый поиск: сколько слов запроса учитывать и длины префиксов в индексе
+SEARCH_TERMS = 8
+SEARCH_PREFIXES = (3, 4, 5)
+
+# Ошибка поста, который мог уйти в канал: отправку прервали до ответа Telegram
+IN_DOUBT = 'InDoubt'
+IN_DOUBT_ERROR = 'Публикация прервана: проверьте канал перед повтором'
+
+# Кто следит за расписанием (кэш календаря): fn(множество user_id), вызывается
+# после записи, которая добавила, удалила или перенесла посты этих пользователей
+schedule_observers = []
+
+
+def connect():
+    """Соединение с БД с учётом открытых соединений и времени работы функции"""
+    # Имя вызывающей функции - метка для метрик без правки каждого запроса
+    return _connect(sys._getframe(1).f_code.co_name)
+
+
+@asynccontextmanager
+async def _connect(function: str):
+    connection_stats['open'] += 1
+    connection_stats['total'] += 1
+    connection_stats['peak'] = max(connection_stats['peak'], connection_stats['open'])
+    started = time.perf_counter()
+    try:
+        async with aiosqlite.connect(DATABASE_PATH) as db:
+            yield db
+    finally:
+        connection_stats['open'] -= 1
+        if query_observer:
+            query_observer(function, time.perf_counter() - started)
+
+
+def _schedule_changed(user_ids):
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if user_ids:
+        for observer in schedule_observers:
+            observer(user_ids)
+
+
+async def _returned_users(cursor) -> set:
+    """user_id из RETURNING user_id"""
+    return {row[0] for row in await cursor.fetchall()}
+
+
+async def _ensure_columns(db, table: str, columns: dict):
+    """Добавить недостающие колонки в существующую таблицу"""
+    cursor = await db.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in await cursor.fetchall()}
+    for name, definition in columns.items():
+        if name not in existing:
+            await db.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+
+async def _backfill_compiled_buttons(db, table: str, condition: str = "1"):
+    """
+    Скомпилировать кнопки у записей, сохранённых до появления buttons_compiled.
+    Ряды с | перепроверяются: их мог неверно скомпилировать строгий разбор
+    (ряд из 4 кнопок выпадал целиком вместо обрезки до 3)
+    """
+    cursor = await db.execute(
+        f"""SELECT id, buttons, buttons_compiled FROM {table}
+            WHERE buttons IS NOT NULL AND (buttons_compiled IS NULL OR buttons LIKE '%|%') AND {condition}"""
+    )
+    updates = []
+    for row_id, buttons, stored in await cursor.fetchall():
+        compiled = compile_url_buttons(buttons).compiled
+        if compiled != stored:
+            updates.append((compiled, row_id))
+    if updates:
+        await db.executemany(f"UPDATE {table} SET buttons_compiled = ? WHERE id = ?", updates)
+
+
+async def _ensure_search_index(db, table: str, columns: tuple):
+    """
+    FTS5-индекс {table}_fts над колонками columns (первая - user_id) с триггерами.
+    Индекс внешний (content=table): текст не дублируется, а триггеры
+    срабатывают только на изменение этих колонок, не на смену статуса.
+    Префиксные индексы - под слова запроса, обрезанные _match_query
+    """
+    fts = f"{table}_fts"
+    cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,))
+    exists = await cursor.fetchone()
+
+    names = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    old_values = ", ".join(f"old.{column}" for column in columns)
+    prefixes = " ".join(map(str, SEARCH_PREFIXES))
+    await db.execute(
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                {names}, content='{table}', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='{prefixes}'
+            )"""
+    )
+    await db.execute(
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN
+                INSERT INTO {fts} (rowid, {names}) VALUES (new.id, {new_values});
+            END"""
+    )
+    await db.execute(
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN
+                INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values});
+            END"""
+    )
+    await db.execute(
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {names} ON {table} BEGIN
+                INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values});
+                INSERT INTO {fts} (rowid, {names}) VALUES (new.id, {new_values});
+            END"""
+    )
+    if not exists:
+        # БД создана до поиска - проиндексировать то, что уже есть
+        await db.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
 
 
 async def init_db():
     """Инициализация базы данных"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         # Таблица каналов
         await db.execute("""
             CREATE TABLE IF NOT EXISTS channels (
@@ -41,6 +171,7 @@ async def init_db():
                 media_type TEXT,
                 media_file_id TEXT,
                 buttons TEXT,
+                buttons_compiled TEXT,
                 album TEXT,
                 scheduled_time DATETIME NOT NULL,
                 delete_after INTEGER,
@@ -71,11 +202,136 @@ async def init_db():
                 media_type TEXT,
                 media_file_id TEXT,
                 buttons TEXT,
+                buttons_compiled TEXT,
+                album TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # Временной ряд подписчиков каналов: сырые замеры (resolution=60)
+        # и свёртки по часам (3600) и суткам (86400)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS member_stats (
+                channel_id INTEGER NOT NULL,
+                resolution INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                min_members INTEGER NOT NULL,
+                max_members INTEGER NOT NULL,
+                last_members INTEGER NOT NULL,
+                samples INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (channel_id, resolution, ts)
+            ) WITHOUT ROWID
+        """)
+        
+        # История попыток публикации (для постов в статусе error)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS publish_attempts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                post_id INTEGER NOT NULL,
+                attempted_at DATETIME NOT NULL,
+                error_class TEXT,
+                error TEXT
+            )
+        """)
+        
+        # Очереди контента каналов: правило слотов и ближайший слот
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS channel_queues (
+                channel_id INTEGER PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                slot_rule TEXT NOT NULL,
+                slot_tz TEXT,
+                next_slot DATETIME NOT NULL,
+                paused INTEGER DEFAULT 0
+            )
+        """)
+        
+        # Посты в очереди канала, по возрастанию position (ключи с зазором QUEUE_GAP)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS queue_items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                channel_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                text TEXT,
+                media_type TEXT,
+                media_file_id TEXT,
+                buttons TEXT,
+                buttons_compiled TEXT,
                 album TEXT,
+                delete_after INTEGER,
                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP
             )
         """)
         
+        # Миграция существующих БД
+        for table in ('scheduled_posts', 'templates'):
+            await _ensure_columns(db, table, {'buttons_compiled': 'TEXT'})
+        await _backfill_compiled_buttons(db, 'scheduled_posts', "status = 'pending'")
+        await _backfill_compiled_buttons(db, 'templates')
+        await _ensure_columns(db, 'users_settings', {
+            'catchup_limit': 'INTEGER',
+            'catchup_action': "TEXT DEFAULT 'skip'",
+        })
+        await _ensure_columns(db, 'scheduled_posts', {
+            'attempts': 'INTEGER DEFAULT 0',
+            'last_error_class': 'TEXT',
+            'last_error': 'TEXT',
+            'claim_token': 'TEXT',
+            'claimed_at': 'DATETIME',
+            'message_id': 'INTEGER',
+            'recurrence': 'TEXT',
+            'recurrence_tz': 'TEXT',
+        })
+        await _ensure_columns(db, 'queue_items', {'delete_after': 'INTEGER'})
+        
+        # Индексы для постраничных списков
+        await db.execute(
+            """CREATE INDEX IF NOT EXISTS idx_scheduled_posts_user
+               ON scheduled_posts (user_id, status, scheduled_time, id)"""
+        )
+        await db.execute(
+            """CREATE INDEX IF NOT EXISTS idx_templates_user
+               ON templates (user_id, created_at, id)"""
+        )
+        
+        await db.execute(
+            """CREATE INDEX IF NOT EXISTS idx_publish_attempts_post
+               ON publish_attempts (post_id, attempted_at)"""
+        )
+        
+        # Индекс для планировщика: наступившие посты и ближайший срок
+        await db.execute(
+            """CREATE INDEX IF NOT EXISTS idx_scheduled_posts_due
+               ON scheduled_posts (status, scheduled_time)"""
+        )
+        
+        # Расписание канала: соседи по времени и окна удаления (проверка конфликтов)
+        await db.execute(
+            """CREATE INDEX IF NOT EXISTS idx_scheduled_posts_channel
+               ON scheduled_posts (channel_id, status, scheduled_time, delete_after)"""
+        )
+        
+        # Календарь: посты пользователя по дням и каналам за диапазон времени
+        await db.execute(
+            """CREATE INDEX IF NOT EXISTS idx_scheduled_posts_calendar
+               ON scheduled_posts (user_id, scheduled_time, channel_id)"""
+        )
+        
+        # Голова очереди канала и наступившие слоты
+        await db.execute(
+            """CREATE INDEX IF NOT EXISTS idx_queue_items_position
+               ON queue_items (channel_id, position, id)"""
+        )
+        await db.execute(
+            """CREATE INDEX IF NOT EXISTS idx_channel_queues_slot
+               ON channel_queues (paused, next_slot)"""
+        )
+        
+        # Полнотекстовый поиск (/find)
+        await _ensure_search_index(db, 'scheduled_posts', ('user_id', 'text'))
+        await _ensure_search_index(db, 'templates', ('user_id', 'name', 'text'))
+        
         await db.commit()
 
 
@@ -83,7 +339,7 @@ async def init_db():
 
 async def add_channel(channel_id: int, username: str, title: str, added_by: int):
     """Добавить канал в БД"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         await db.execute(
             """INSERT OR REPLACE INTO channels 
                (channel_id, channel_username, channel_title, added_by) 
@@ -95,7 +351,7 @@ async def add_channel(channel_id: int, username: str, title: str, added_by: int)
 
 async def get_channels(user_id: int = None):
     """Получить список каналов"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         db.row_factory = aiosqlite.Row
         if user_id:
             cursor = await db.execute(
@@ -108,7 +364,7 @@ async def get_channels(user_id: int = None):
 
 async def get_channel_by_id(channel_id: int):
     """Получить канал по ID"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT * FROM channels WHERE channel_id = ?", (channel_id,)
@@ -118,7 +374,7 @@ async def get_channel_by_id(channel_id: int):
 
 async def remove_channel(channel_id: int):
     """Удалить канал"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         await db.execute("DELETE FROM channels WHERE channel_id = ?", (channel_id,))
         await db.commit()
 
@@ -127,15 +383,16 @@ async def remove_channel(channel_id: int):
 
 async def get_user_settings(user_id: int):
     """Получить настройки пользователя"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT * FROM users_settings WHERE user_id = ?", (user_id,)
         )
         row = await cursor.fetchone()
         if not row:
+            # OR IGNORE: параллельный запрос мог уже создать строку
             await db.execute(
-                "INSERT INTO users_settings (user_id) VALUES (?)", (user_id,)
+                "INSERT OR IGNORE INTO users_settings (user_id) VALUES (?)", (user_id,)
             )
             await db.commit()
             cursor = await db.execute(
@@ -147,7 +404,7 @@ async def get_user_settings(user_id: int):
 
 async def update_user_setting(user_id: int, setting: str, value):
     """Обновить настройку пользователя"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         await db.execute(
             f"UPDATE users_settings SET {setting} = ? WHERE user_id = ?",
             (value, user_id)
@@ -159,26 +416,29 @@ async def update_user_setting(user_id: int, setting: str, value):
 
 async def add_scheduled_post(channel_id: int, user_id: int, text: str, 
                              media_type: str, media_file_id: str, buttons: str,
-                             scheduled_time: datetime, delete_after: int = None, album: list = None):
-    """Добавить отложенный пост"""
-    album_json = json.dumps(album) if album else None
+                             scheduled_time: datetime, delete_after: int = None, album: list = None,
+                             recurrence: str = None, recurrence_tz: str = None):
+    """Добавить отложенный пост (recurrence - правило повтора, см. utils/recurrence.py)"""
+    album_json = json_dumps(album) if album else None
+    buttons_compiled = compile_url_buttons(buttons).compiled if buttons else None
     
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         cursor = await db.execute(
             """INSERT INTO scheduled_posts 
-               (channel_id, user_id, text, media_type, media_file_id, buttons, album,
-                scheduled_time, delete_after)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-            (channel_id, user_id, text, media_type, media_file_id, buttons,
-             album_json, scheduled_time, delete_after)
+               (channel_id, user_id, text, media_type, media_file_id, buttons, buttons_compiled,
+                album, scheduled_time, delete_after, recurrence, recurrence_tz)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (channel_id, user_id, text, media_type, media_file_id, buttons, buttons_compiled,
+             album_json, scheduled_time, delete_after, recurrence, recurrence_tz)
         )
         await db.commit()
-        return cursor.lastrowid
+    _schedule_changed({user_id})
+    return cursor.lastrowid
 
 
 async def get_pending_posts():
     """Получить посты со статусом pending"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT * FROM scheduled_posts WHERE status = 'pending'"
@@ -186,9 +446,72 @@ async def get_pending_posts():
         return await cursor.fetchall()
 
 
+async def get_due_posts(now: datetime):
+    """Посты, время которых наступило к now (по индексу, в порядке времени)"""
+    async with connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            """SELECT * FROM scheduled_posts
+               WHERE status = 'pending' AND scheduled_time <= ?
+               ORDER BY scheduled_time""",
+            (now,)
+        )
+        return await cursor.fetchall()
+
+
+async def get_next_scheduled_time():
+    """Время ближайшего ожидающего поста или слота непустой очереди (строка из БД) или None"""
+    async with connect() as db:
+        cursor = await db.execute(
+            f"""SELECT MIN(next_time) FROM (
+                    SELECT MIN(scheduled_time) AS next_time FROM scheduled_posts WHERE status = 'pending'
+                    UNION ALL
+                    SELECT MIN(next_slot) FROM channel_queues q WHERE {_QUEUE_ACTIVE}
+                )"""
+        )
+        row = await cursor.fetchone()
+        return row[0]
+
+
+async def get_queue_depth(now: datetime):
+    """Очередь планировщика: (ожидают, просрочены, время самого старого просроченного)"""
+    async with connect() as db:
+        cursor = await db.execute(
+            """SELECT COUNT(*),
+                      COUNT(CASE WHEN scheduled_time <= ? THEN 1 END),
+                      MIN(scheduled_time)
+               FROM scheduled_posts WHERE status = 'pending'""",
+            (now,)
+        )
+        pending, overdue, oldest = await cursor.fetchone()
+        return pending, overdue, oldest if overdue else None
+
+
+async def get_channel_schedule(channel_id: int, start: datetime, end: datetime, exclude_id: int = None):
+    """
+    Ожидающие посты канала, которые могут мешать времени из [start, end]:
+    (id, время, таймер удаления) по индексу канала, в порядке времени.
+    Начало выборки сдвинуто назад на самый длинный таймер удаления в канале
+    """
+    async with connect() as db:
+        cursor = await db.execute(
+            "SELECT MAX(delete_after) FROM scheduled_posts WHERE channel_id = ? AND status = 'pending'",
+            (channel_id,)
+        )
+        longest = (await cursor.fetchone())[0] or 0
+        cursor = await db.execute(
+            """SELECT id, scheduled_time, delete_after FROM scheduled_posts
+               WHERE channel_id = ? AND status = 'pending'
+                 AND scheduled_time >= ? AND scheduled_time <= ? AND id != ?
+               ORDER BY scheduled_time""",
+            (channel_id, start - timedelta(seconds=longest), end, exclude_id or 0)
+        )
+        return await cursor.fetchall()
+
+
 async def get_user_scheduled_posts(user_id: int):
     """Получить отложенные посты пользователя"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             """SELECT sp.*, c.channel_username, c.channel_title 
@@ -201,9 +524,88 @@ async def get_user_scheduled_posts(user_id: int):
         return await cursor.fetchall()
 
 
+async def get_user_scheduled_posts_page(user_id: int, after: tuple = None, before: tuple = None,
+                                        limit: int = PAGE_SIZE):
+    """
+    Страница отложенных постов пользователя по ключу (scheduled_time, id).
+    after - ключ последнего поста предыдущей страницы, before - первого поста следующей.
+    Возвращает (posts, has_more) - есть ли ещё посты в направлении листания
+    """
+    condition, order, params = "", "ASC", (user_id,)
+    if before:
+        condition, order, params = "AND (sp.scheduled_time, sp.id) < (?, ?)", "DESC", (user_id, *before)
+    elif after:
+        condition, params = "AND (sp.scheduled_time, sp.id) > (?, ?)", (user_id, *after)
+    
+    async with connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            f"""SELECT sp.*, c.channel_username, c.channel_title 
+                FROM scheduled_posts sp
+                LEFT JOIN channels c ON sp.channel_id = c.channel_id
+                WHERE sp.user_id = ? AND sp.status = 'pending' {condition}
+                ORDER BY sp.scheduled_time {order}, sp.id {order}
+                LIMIT ?""",
+            (*params, limit + 1)
+        )
+        posts = await cursor.fetchall()
+    
+    has_more = len(posts) > limit
+    posts = posts[:limit]
+    if before:
+        posts.reverse()
+    return posts, has_more
+
+
+async def count_user_scheduled_posts(user_id: int, cap: int = COUNT_CAP):
+    """Количество отложенных постов пользователя (не больше cap)"""
+    async with connect() as db:
+        cursor = await db.execute(
+            """SELECT COUNT(*) FROM (
+                   SELECT 1 FROM scheduled_posts
+                   WHERE user_id = ? AND status = 'pending' LIMIT ?
+               )""",
+            (user_id, cap)
+        )
+        return (await cursor.fetchone())[0]
+
+
+async def get_user_calendar(user_id: int, start: datetime, end: datetime):
+    """
+    Посты пользователя за [start, end) по дням и каналам одним запросом по индексу
+    календаря: [(день 'YYYY-MM-DD', channel_id, количество)]. Учитываются все статусы -
+    прошедшие дни показывают, что вышло
+    """
+    async with connect() as db:
+        cursor = await db.execute(
+            """SELECT date(scheduled_time) AS day, channel_id, COUNT(*)
+               FROM scheduled_posts
+               WHERE user_id = ? AND scheduled_time >= ? AND scheduled_time < ?
+               GROUP BY day, channel_id""",
+            (user_id, start, end)
+        )
+        return await cursor.fetchall()
+
+
+async def get_user_posts_between(user_id: int, start: datetime, end: datetime, limit: int = PAGE_SIZE * 3):
+    """Посты пользователя за [start, end) по времени с названиями каналов (не больше limit)"""
+    async with connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            """SELECT sp.*, c.channel_username, c.channel_title
+               FROM scheduled_posts sp
+               LEFT JOIN channels c ON sp.channel_id = c.channel_id
+               WHERE sp.user_id = ? AND sp.scheduled_time >= ? AND sp.scheduled_time < ?
+               ORDER BY sp.scheduled_time, sp.id
+               LIMIT ?""",
+            (user_id, start, end, limit)
+        )
+        return await cursor.fetchall()
+
+
 async def get_scheduled_post(post_id: int):
     """Получить отложенный пост по ID"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT * FROM scheduled_posts WHERE id = ?", (post_id,)
@@ -213,7 +615,7 @@ async def get_scheduled_post(post_id: int):
 
 async def update_scheduled_post_status(post_id: int, status: str):
     """Обновить статус отложенного поста"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         await db.execute(
             "UPDATE scheduled_posts SET status = ? WHERE id = ?",
             (status, post_id)
@@ -223,17 +625,19 @@ async def update_scheduled_post_status(post_id: int, status: str):
 
 async def update_scheduled_post_time(post_id: int, new_time: datetime):
     """Изменить время отложенного поста"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute(
-            "UPDATE scheduled_posts SET scheduled_time = ? WHERE id = ?",
+    async with connect() as db:
+        cursor = await db.execute(
+            "UPDATE scheduled_posts SET scheduled_time = ? WHERE id = ? RETURNING user_id",
             (new_time, post_id)
         )
+        users = await _returned_users(cursor)
         await db.commit()
+    _schedule_changed(users)
 
 
 async def update_scheduled_post_text(post_id: int, text: str):
     """Обновить текст отложенного поста"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         await db.execute(
             "UPDATE scheduled_posts SET text = ? WHERE id = ?",
             (text, post_id)
@@ -243,26 +647,666 @@ async def update_scheduled_post_text(post_id: int, text: str):
 
 async def update_scheduled_post_buttons(post_id: int, buttons: str):
     """Обновить кнопки отложенного поста"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    buttons_compiled = compile_url_buttons(buttons).compiled if buttons else None
+    
+    async with connect() as db:
         await db.execute(
-            "UPDATE scheduled_posts SET buttons = ? WHERE id = ?",
-            (buttons, post_id)
+            "UPDATE scheduled_posts SET buttons = ?, buttons_compiled = ? WHERE id = ?",
+            (buttons, buttons_compiled, post_id)
+        )
+        await db.commit()
+
+
+async def update_scheduled_post_recurrence(post_id: int, recurrence: str, recurrence_tz: str = None):
+    """Задать или снять (None) правило повтора"""
+    async with connect() as db:
+        await db.execute(
+            "UPDATE scheduled_posts SET recurrence = ?, recurrence_tz = ? WHERE id = ?",
+            (recurrence, recurrence_tz if recurrence else None, post_id)
         )
         await db.commit()
 
 
 async def delete_scheduled_post(post_id: int):
     """Удалить отложенный пост"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("DELETE FROM scheduled_posts WHERE id = ?", (post_id,))
+    async with connect() as db:
+        cursor = await db.execute("DELETE FROM scheduled_posts WHERE id = ? RETURNING user_id", (post_id,))
+        users = await _returned_users(cursor)
+        await db.execute("DELETE FROM publish_attempts WHERE post_id = ?", (post_id,))
+        await db.commit()
+    _schedule_changed(users)
+
+
+# ============ OUTBOX ============
+# pending -> publishing (claim перед отправкой) -> published (вместе с message_id)
+# Пост в publishing дольше таймаута - «под сомнением»: неизвестно, ушёл ли он
+# в канал, поэтому он не переотправляется сам, а попадает в неопубликованные
+#
+# У повторяющегося поста вместе с claim появляется следующий пост серии:
+# правило переходит к нему, поэтому повтор отправки (/failed) серию не двоит
+
+async def _spawn_next(db, post_id: int, next_time: datetime) -> set:
+    """Следующий пост серии - копия post_id на next_time, правило переходит к нему. Возвращает автора"""
+    cursor = await db.execute(
+        """INSERT INTO scheduled_posts
+           (channel_id, user_id, text, media_type, media_file_id, buttons, buttons_compiled,
+            album, scheduled_time, delete_after, recurrence, recurrence_tz)
+           SELECT channel_id, user_id, text, media_type, media_file_id, buttons, buttons_compiled,
+                  album, ?, delete_after, recurrence, recurrence_tz
+           FROM scheduled_posts WHERE id = ? AND recurrence IS NOT NULL
+           RETURNING user_id""",
+        (next_time, post_id)
+    )
+    users = await _returned_users(cursor)
+    await db.execute("UPDATE scheduled_posts SET recurrence = NULL WHERE id = ?", (post_id,))
+    return users
+
+
+async def claim_scheduled_post(post_id: int, token: str, now: datetime, next_time: datetime = None) -> bool:
+    """
+    Занять пост под отправку. False - его уже занял другой проход или процесс.
+    next_time - когда запланировать следующий пост серии
+    """
+    async with connect() as db:
+        cursor = await db.execute(
+            """UPDATE scheduled_posts
+               SET status = 'publishing', claim_token = ?, claimed_at = ?
+               WHERE id = ? AND status = 'pending'""",
+            (token, now, post_id)
+        )
+        claimed = cursor.rowcount == 1
+        users = set()
+        if claimed and next_time:
+            users = await _spawn_next(db, post_id, next_time)
+        await db.commit()
+    _schedule_changed(users)
+    return claimed
+
+
+async def advance_recurring_posts(updates: list):
+    """Продолжить серии пропущенных постов: [(время следующего, id)] одной транзакцией"""
+    users = set()
+    async with connect() as db:
+        for next_time, post_id in updates:
+            users |= await _spawn_next(db, post_id, next_time)
+        await db.commit()
+    _schedule_changed(users)
+
+
+async def complete_scheduled_post(post_id: int, token: str, channel_id: int, message_id: int) -> bool:
+    """Пост отправлен: статус, message_id и статистика - одной транзакцией"""
+    async with connect() as db:
+        cursor = await db.execute(
+            """UPDATE scheduled_posts
+               SET status = 'published', message_id = ?, claim_token = NULL
+               WHERE id = ? AND claim_token = ?""",
+            (message_id, post_id, token)
+        )
+        if cursor.rowcount != 1:
+            return False
+        if message_id:
+            await db.execute(
+                """INSERT INTO posts_stats (channel_id, message_id, posted_at)
+                   VALUES (?, ?, ?)""",
+                (channel_id, message_id, datetime.now())
+            )
+        await db.commit()
+        return True
+
+
+async def release_scheduled_post(post_id: int, token: str):
+    """Отправка точно не состоялась - вернуть пост в очередь"""
+    async with connect() as db:
+        await db.execute(
+            """UPDATE scheduled_posts SET status = 'pending', claim_token = NULL
+               WHERE id = ? AND claim_token = ?""",
+            (post_id, token)
+        )
+        await db.commit()
+
+
+async def fail_in_doubt_posts(claimed_before: datetime, now: datetime) -> int:
+    """Посты, застрявшие в publishing (процесс упал между отправкой и записью), - в неопубликованные"""
+    async with connect() as db:
+        await db.execute(
+            """INSERT INTO publish_attempts (post_id, attempted_at, error_class, error)
+               SELECT id, ?, ?, ?
+               FROM scheduled_posts WHERE status = 'publishing' AND claimed_at <= ?""",
+            (now, IN_DOUBT, IN_DOUBT_ERROR, claimed_before)
+        )
+        cursor = await db.execute(
+            """UPDATE scheduled_posts
+               SET status = 'error', attempts = COALESCE(attempts, 0) + 1,
+                   last_error_class = ?, last_error = ?, claim_token = NULL
+               WHERE status = 'publishing' AND claimed_at <= ?""",
+            (IN_DOUBT, IN_DOUBT_ERROR, claimed_before)
+        )
+        await db.commit()
+        return cursor.rowcount
+
+
+# ============ FAILED POSTS ============
+
+async def record_publish_failure(post_id: int, error_class: str, error: str, attempted_at: datetime):
+    """Пост не опубликован: статус error, счётчик попыток и запись в историю - одной транзакцией"""
+    async with connect() as db:
+        await db.execute(
+            """UPDATE scheduled_posts
+               SET status = 'error', attempts = COALESCE(attempts, 0) + 1,
+                   last_error_class = ?, last_error = ?, claim_token = NULL
+               WHERE id = ?""",
+            (error_class, error, post_id)
+        )
+        await db.execute(
+            """INSERT INTO publish_attempts (post_id, attempted_at, error_class, error)
+               VALUES (?, ?, ?, ?)""",
+            (post_id, attempted_at, error_class, error)
+        )
         await db.commit()
 
 
+async def fail_posts(post_ids: list, error_class: str, error: str, attempted_at: datetime):
+    """Перевести пачку ожидающих постов в неопубликованные одной транзакцией"""
+    placeholders = ",".join("?" * len(post_ids))
+    async with connect() as db:
+        cursor = await db.execute(
+            f"""UPDATE scheduled_posts
+                SET status = 'error', attempts = COALESCE(attempts, 0) + 1,
+                    last_error_class = ?, last_error = ?
+                WHERE status = 'pending' AND id IN ({placeholders})
+                RETURNING id""",
+            (error_class, error, *post_ids)
+        )
+        # История - только по постам, которые ещё ждали (остальные занял другой проход)
+        await db.executemany(
+            """INSERT INTO publish_attempts (post_id, attempted_at, error_class, error)
+               VALUES (?, ?, ?, ?)""",
+            [(row[0], attempted_at, error_class, error) for row in await cursor.fetchall()]
+        )
+        await db.commit()
+
+
+async def retime_posts(updates: list):
+    """Перенести пачку ожидающих постов: [(новое время, id)] одной транзакцией"""
+    users = set()
+    async with connect() as db:
+        for new_time, post_id in updates:
+            cursor = await db.execute(
+                "UPDATE scheduled_posts SET scheduled_time = ? WHERE id = ? AND status = 'pending' RETURNING user_id",
+                (new_time, post_id)
+            )
+            users |= await _returned_users(cursor)
+        await db.commit()
+    _schedule_changed(users)
+
+
+def _failed_filter(user_id: int = None, error_class: str = None, exclude_class: str = None):
+    """
+    Условие и параметры выборки неопубликованных постов (user_id None - все).
+    exclude_class - пропустить посты с этим классом ошибки
+    """
+    condition, params = "sp.status = 'error'", []
+    if user_id is not None:
+        condition += " AND sp.user_id = ?"
+        params.append(user_id)
+    if error_class is not None:
+        condition += " AND sp.last_error_class = ?"
+        params.append(error_class)
+    if exclude_class is not None:
+        condition += " AND sp.last_error_class IS NOT ?"
+        params.append(exclude_class)
+    return condition, params
+
+
+async def get_failed_posts_page(user_id: int = None, after: tuple = None, before: tuple = None,
+                                limit: int = PAGE_SIZE):
+    """
+    Страница неопубликованных постов по ключу (scheduled_time, id), как
+    get_user_scheduled_posts_page. user_id None - посты всех пользователей
+    """
+    condition, params = _failed_filter(user_id)
+    order = "ASC"
+    if before:
+        condition += " AND (sp.scheduled_time, sp.id) < (?, ?)"
+        params += list(before)
+        order = "DESC"
+    elif after:
+        condition += " AND (sp.scheduled_time, sp.id) > (?, ?)"
+        params += list(after)
+    
+    async with connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            f"""SELECT sp.*, c.channel_username, c.channel_title
+                FROM scheduled_posts sp
+                LEFT JOIN channels c ON sp.channel_id = c.channel_id
+                WHERE {condition}
+                ORDER BY sp.scheduled_time {order}, sp.id {order}
+                LIMIT ?""",
+            (*params, limit + 1)
+        )
+        posts = await cursor.fetchall()
+    
+    has_more = len(posts) > limit
+    posts = posts[:limit]
+    if before:
+        posts.reverse()
+    return posts, has_more
+
+
+async def get_failed_summary(user_id: int = None):
+    """Неопубликованные посты по классу ошибки: [(класс, количество, последняя попытка)]"""
+    condition, params = _failed_filter(user_id)
+    async with connect() as db:
+        cursor = await db.execute(
+            f"""SELECT COALESCE(sp.last_error_class, 'Unknown'), COUNT(*), MAX(sp.scheduled_time)
+                FROM scheduled_posts sp
+                WHERE {condition}
+                GROUP BY 1
+                ORDER BY 2 DESC""",
+            params
+        )
+        return await cursor.fetchall()
+
+
+async def get_publish_attempts(post_id: int, limit: int = 10):
+    """Последние попытки публикации поста, новые первыми"""
+    async with connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            """SELECT * FROM publish_attempts WHERE post_id = ?
+               ORDER BY attempted_at DESC, id DESC LIMIT ?""",
+            (post_id, limit)
+        )
+        return await cursor.fetchall()
+
+
+async def requeue_failed_posts(new_time: datetime, user_id: int = None, post_id: int = None,
+                               error_class: str = None, exclude_class: str = None) -> int:
+    """
+    Вернуть неопубликованные посты в очередь одним UPDATE на время new_time
+    (текущее - опубликовать сразу). Возвращает число постов
+    """
+    condition, params = _failed_filter(user_id, error_class, exclude_class)
+    if post_id is not None:
+        condition += " AND sp.id = ?"
+        params.append(post_id)
+    
+    async with connect() as db:
+        cursor = await db.execute(
+            f"""UPDATE scheduled_posts AS sp
+                SET status = 'pending', scheduled_time = ?
+                WHERE {condition}
+                RETURNING user_id""",
+            (new_time, *params)
+        )
+        rows = await cursor.fetchall()
+        await db.commit()
+    _schedule_changed({row[0] for row in rows})
+    return len(rows)
+
+
+# ============ BULK ============
+# Массовые действия над выборкой ожидающих постов пользователя. Выборка -
+# словарь selection: user_id и необязательные channel_id, start/end (время,
+# [start, end)) и text (подстрока текста). Каждое действие - один UPDATE или
+# DELETE по этому условию; посты, которые планировщик уже взял (publishing),
+# в выборку не попадают
+
+def _bulk_filter(user_id: int, channel_id: int = None, start: datetime = None,
+                 end: datetime = None, text: str = None):
+    """Условие и параметры выборки для массовых действий"""
+    condition, params = "sp.user_id = ? AND sp.status = 'pending'", [user_id]
+    if channel_id is not None:
+        condition += " AND sp.channel_id = ?"
+        params.append(channel_id)
+    if start is not None:
+        condition += " AND sp.scheduled_time >= ?"
+        params.append(start)
+    if end is not None:
+        condition += " AND sp.scheduled_time < ?"
+        params.append(end)
+    if text:
+        escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        condition += " AND sp.text LIKE ? ESCAPE '\\'"
+        params.append(f"%{escaped}%")
+    return condition, params
+
+
+async def get_bulk_summary(selection: dict):
+    """(количество, время первого, время последнего) постов выборки"""
+    condition, params = _bulk_filter(**selection)
+    async with connect() as db:
+        cursor = await db.execute(
+            f"""SELECT COUNT(*), MIN(sp.scheduled_time), MAX(sp.scheduled_time)
+                FROM scheduled_posts sp WHERE {condition}""",
+            params
+        )
+        return await cursor.fetchone()
+
+
+async def _bulk_update(selection: dict, assignments: str, values: tuple) -> int:
+    condition, params = _bulk_filter(**selection)
+    async with connect() as db:
+        cursor = await db.execute(
+            f"UPDATE scheduled_posts AS sp SET {assignments} WHERE {condition} RETURNING user_id",
+            (*values, *params)
+        )
+        rows = await cursor.fetchall()
+        await db.commit()
+    _schedule_changed({row[0] for row in rows})
+    return len(rows)
+
+
+async def bulk_shift_posts(selection: dict, offset: timedelta) -> int:
+    """Сдвинуть время постов выборки на offset. Возвращает число постов"""
+    return await _bulk_update(
+        selection, "scheduled_time = datetime(sp.scheduled_time, ?)",
+        (f"{int(offset.total_seconds()):+d} seconds",)
+    )
+
+
+async def bulk_move_posts(selection: dict, channel_id: int) -> int:
+    """Перенести посты выборки в другой канал"""
+    return await _bulk_update(selection, "channel_id = ?", (channel_id,))
+
+
+async def bulk_set_buttons(selection: dict, buttons: str = None) -> int:
+    """Заменить кнопки у постов выборки (None - убрать)"""
+    buttons_compiled = compile_url_buttons(buttons).compiled if buttons else None
+    return await _bulk_update(selection, "buttons = ?, buttons_compiled = ?", (buttons, buttons_compiled))
+
+
+async def bulk_delete_posts(selection: dict) -> int:
+    """Удалить посты выборки вместе с историей попыток одной транзакцией"""
+    condition, params = _bulk_filter(**selection)
+    async with connect() as db:
+        await db.execute(
+            f"""DELETE FROM publish_attempts WHERE post_id IN (
+                    SELECT sp.id FROM scheduled_posts sp WHERE {condition}
+                )""",
+            params
+        )
+        cursor = await db.execute(
+            f"DELETE FROM scheduled_posts AS sp WHERE {condition} RETURNING user_id",
+            params
+        )
+        rows = await cursor.fetchall()
+        await db.commit()
+    _schedule_changed({row[0] for row in rows})
+    return len(rows)
+
+
+# ============ CHANNEL QUEUES ============
+# Очередь канала - упорядоченный список постов, из которого в каждый слот
+# (правило из utils/recurrence.py) головной пост переходит в scheduled_posts.
+# Порядок - целые ключи position с зазором QUEUE_GAP: перенос поста меняет
+# одну строку (ключ посередине между соседями), перенумерация - только когда
+# зазор между соседями кончился
+
+QUEUE_GAP = 1024
+
+# Очередь работает: не на паузе и в ней есть посты
+_QUEUE_ACTIVE = "q.paused = 0 AND EXISTS (SELECT 1 FROM queue_items i WHERE i.channel_id = q.channel_id)"
+
+
+async def get_channel_queue(channel_id: int):
+    """Настройки очереди канала или None"""
+    async with connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            "SELECT * FROM channel_queues WHERE channel_id = ?", (channel_id,)
+        )
+        return await cursor.fetchone()
+
+
+async def set_channel_queue_schedule(channel_id: int, user_id: int, slot_rule: str,
+                                     slot_tz: str, next_slot: datetime):
+    """Задать правило слотов очереди (создаёт очередь, если её не было)"""
+    async with connect() as db:
+        await db.execute(
+            """INSERT INTO channel_queues (channel_id, user_id, slot_rule, slot_tz, next_slot)
+               VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT (channel_id) DO UPDATE SET
+                   user_id = excluded.user_id, slot_rule = excluded.slot_rule,
+                   slot_tz = excluded.slot_tz, next_slot = excluded.next_slot""",
+            (channel_id, user_id, slot_rule, slot_tz, next_slot)
+        )
+        await db.commit()
+
+
+async def set_channel_queue_paused(channel_id: int, paused: bool):
+    """Пауза очереди (пропущенные на паузе слоты не догоняются)"""
+    async with connect() as db:
+        await db.execute(
+            "UPDATE channel_queues SET paused = ? WHERE channel_id = ?", (int(paused), channel_id)
+        )
+        await db.commit()
+
+
+async def get_user_channel_queues(user_id: int):
+    """Каналы пользователя с размером очереди и её настройками"""
+    async with connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            """SELECT c.channel_id, c.channel_username, c.channel_title,
+                      q.slot_rule, q.next_slot, q.paused,
+                      (SELECT COUNT(*) FROM queue_items i WHERE i.channel_id = c.channel_id) AS items
+               FROM channels c
+               LEFT JOIN channel_queues q ON q.channel_id = c.channel_id
+               WHERE c.added_by = ?""",
+            (user_id,)
+        )
+        return await cursor.fetchall()
+
+
+async def add_queue_item(channel_id: int, user_id: int, text: str, media_type: str,
+                         media_file_id: str, buttons: str = None, album: list = None,
+                         delete_after: int = None) -> int:
+    """Добавить пост в конец очереди канала"""
+    album_json = json_dumps(album) if album else None
+    buttons_compiled = compile_url_buttons(buttons).compiled if buttons else None
+    
+    async with connect() as db:
+        cursor = await db.execute(
+            """INSERT INTO queue_items
+               (channel_id, user_id, position, text, media_type, media_file_id,
+                buttons, buttons_compiled, album, delete_after)
+               SELECT ?, ?, COALESCE(MAX(position), 0) + ?, ?, ?, ?, ?, ?, ?, ?
+               FROM queue_items WHERE channel_id = ?""",
+            (channel_id, user_id, QUEUE_GAP, text, media_type, media_file_id,
+             buttons, buttons_compiled, album_json, delete_after, channel_id)
+        )
+        await db.commit()
+        return cursor.lastrowid
+
+
+async def get_queue_item(item_id: int):
+    """Пост очереди по ID"""
+    async with connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            "SELECT * FROM queue_items WHERE id = ?", (item_id,)
+        )
+        return await cursor.fetchone()
+
+
+async def get_queue_items_page(channel_id: int, after: tuple = None, before: tuple = None,
+                               limit: int = PAGE_SIZE):
+    """
+    Страница очереди канала в порядке выхода по ключу (position, id).
+    Возвращает (items, has_more) - есть ли ещё посты в направлении листания
+    """
+    condition, order, params = "", "ASC", (channel_id,)
+    if before:
+        condition, order, params = "AND (position, id) < (?, ?)", "DESC", (channel_id, *before)
+    elif after:
+        condition, params = "AND (position, id) > (?, ?)", (channel_id, *after)
+    
+    async with connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            f"""SELECT * FROM queue_items
+                WHERE channel_id = ? {condition}
+                ORDER BY position {order}, id {order}
+                LIMIT ?""",
+            (*params, limit + 1)
+        )
+        items = await cursor.fetchall()
+    
+    has_more = len(items) > limit
+    items = items[:limit]
+    if before:
+        items.reverse()
+    return items, has_more
+
+
+async def get_queue_item_rank(item_id: int):
+    """Номер поста в очереди (с 1) или None"""
+    async with connect() as db:
+        cursor = await db.execute(
+            """SELECT COUNT(*) FROM queue_items i, queue_items item
+               WHERE item.id = ? AND i.channel_id = item.channel_id
+                 AND (i.position, i.id) <= (item.position, item.id)""",
+            (item_id,)
+        )
+        rank = (await cursor.fetchone())[0]
+        return rank or None
+
+
+async def _renumber_queue(db, channel_id: int):
+    """Разложить ключи очереди заново с шагом QUEUE_GAP (когда зазор кончился)"""
+    await db.execute(
+        """UPDATE queue_items SET position = ranked.n * ?
+           FROM (SELECT id, ROW_NUMBER() OVER (ORDER BY position, id) AS n
+                 FROM queue_items WHERE channel_id = ?) AS ranked
+           WHERE queue_items.id = ranked.id""",
+        (QUEUE_GAP, channel_id)
+    )
+
+
+async def _neighbours(db, item, direction: str) -> list:
+    """Ключи двух ближайших постов перед (up) или после (down) item"""
+    if direction == 'up':
+        condition, order = "(position, id) < (?, ?)", "DESC"
+    else:
+        condition, order = "(position, id) > (?, ?)", "ASC"
+    cursor = await db.execute(
+        f"""SELECT position FROM queue_items
+            WHERE channel_id = ? AND {condition}
+            ORDER BY position {order}, id {order} LIMIT 2""",
+        (item['channel_id'], item['position'], item['id'])
+    )
+    return [row[0] for row in await cursor.fetchall()]
+
+
+async def move_queue_item(item_id: int, direction: str) -> bool:
+    """
+    Сдвинуть пост на одну позицию (up/down) или в начало (top).
+    Меняется ключ одного поста; False - двигать некуда
+    """
+    async with connect() as db:
+        db.row_factory = aiosqlite.Row
+        for _ in range(2):
+            cursor = await db.execute("SELECT * FROM queue_items WHERE id = ?", (item_id,))
+            item = await cursor.fetchone()
+            if not item:
+                return False
+            
+            neighbours = await _neighbours(db, item, 'down' if direction == 'down' else 'up')
+            if not neighbours:
+                return False
+            step = QUEUE_GAP if direction == 'down' else -QUEUE_GAP
+            if direction == 'top':
+                cursor = await db.execute(
+                    "SELECT MIN(position) FROM queue_items WHERE channel_id = ?", (item['channel_id'],)
+                )
+                position = (await cursor.fetchone())[0] - QUEUE_GAP
+            elif len(neighbours) == 1:
+                # Сосед - крайний: встаём за ним
+                position = neighbours[0] + step
+            else:
+                # Посередине между соседом и следующим за ним; зазор кончился - перенумеровать
+                position = (neighbours[0] + neighbours[1]) // 2
+                if position in neighbours:
+                    await _renumber_queue(db, item['channel_id'])
+                    continue
+            
+            await db.execute("UPDATE queue_items SET position = ? WHERE id = ?", (position, item_id))
+            await db.commit()
+            return True
+        return False
+
+
+async def delete_queue_item(item_id: int):
+    """Удалить пост из очереди"""
+    async with connect() as db:
+        await db.execute("DELETE FROM queue_items WHERE id = ?", (item_id,))
+        await db.commit()
+
+
+async def get_due_queues(now: datetime):
+    """Очереди, слот которых наступил к now (только непустые и не на паузе)"""
+    async with connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            f"""SELECT * FROM channel_queues q
+                WHERE {_QUEUE_ACTIVE} AND q.next_slot <= ?
+                ORDER BY q.next_slot""",
+            (now,)
+        )
+        return await cursor.fetchall()
+
+
+async def pop_queue_item(channel_id: int, slot: str, scheduled_time: datetime, next_slot: datetime):
+    """
+    Слот slot наступил: головной пост очереди становится отложенным постом
+    на scheduled_time, очередь переходит к next_slot - одной транзакцией.
+    ID нового поста или None, если слот уже разобран другим проходом.
+    Без scheduled_time слот пропускается (очередь только переходит к next_slot)
+    """
+    async with connect() as db:
+        cursor = await db.execute(
+            "UPDATE channel_queues SET next_slot = ? WHERE channel_id = ? AND next_slot = ? AND paused = 0",
+            (next_slot, channel_id, slot)
+        )
+        if cursor.rowcount != 1:
+            return None
+        if scheduled_time is None:
+            await db.commit()
+            return None
+        
+        cursor = await db.execute(
+            "SELECT id FROM queue_items WHERE channel_id = ? ORDER BY position, id LIMIT 1",
+            (channel_id,)
+        )
+        head = await cursor.fetchone()
+        if not head:
+            await db.commit()
+            return None
+        
+        cursor = await db.execute(
+            """INSERT INTO scheduled_posts
+               (channel_id, user_id, text, media_type, media_file_id, buttons, buttons_compiled,
+                album, delete_after, scheduled_time)
+               SELECT channel_id, user_id, text, media_type, media_file_id, buttons, buttons_compiled,
+                      album, delete_after, ?
+               FROM queue_items WHERE id = ?
+               RETURNING id, user_id""",
+            (scheduled_time, head[0])
+        )
+        post_id, user_id = (await cursor.fetchall())[0]
+        await db.execute("DELETE FROM queue_items WHERE id = ?", (head[0],))
+        await db.commit()
+    _schedule_changed({user_id})
+    return post_id
+
+
 # ============ STATS ============
 
 async def add_post_stats(channel_id: int, message_id: int):
     """Добавить запись о посте для статистики"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         await db.execute(
             """INSERT INTO posts_stats (channel_id, message_id, posted_at)
                VALUES (?, ?, ?)""",
@@ -271,19 +1315,98 @@ async def add_post_stats(channel_id: int, message_id: int):
         await db.commit()
 
 
+# ============ MEMBER STATS ============
+
+MINUTE, HOUR, DAY = 60, 3600, 86400
+
+# Сутки считаем по московскому времени
+DAY_OFFSET = 3 * 3600
+
+
+async def add_member_samples(samples: list):
+    """Сохранить замеры подписчиков: [(channel_id, ts, members), ...]"""
+    async with connect() as db:
+        await db.executemany(
+            """INSERT OR REPLACE INTO member_stats
+               (channel_id, resolution, ts, min_members, max_members, last_members, samples)
+               VALUES (?, ?, ?, ?, ?, ?, 1)""",
+            [(channel_id, MINUTE, ts, members, members, members) for channel_id, ts, members in samples]
+        )
+        await db.commit()
+
+
+async def rollup_member_stats(now_ts: int, retention: dict):
+    """
+    Свернуть замеры: минуты -> часы -> сутки (текущий неполный период
+    пересчитывается каждый раз) и удалить данные старше срока хранения
+    """
+    async with connect() as db:
+        for source, target, offset in ((MINUTE, HOUR, 0), (HOUR, DAY, DAY_OFFSET)):
+            start = now_ts - (now_ts + offset) % target - target
+            await db.execute(
+                """INSERT OR REPLACE INTO member_stats
+                   (channel_id, resolution, ts, min_members, max_members, last_members, samples)
+                   SELECT g.channel_id, ?, g.bucket, g.min_members, g.max_members,
+                          (SELECT m.last_members FROM member_stats m
+                           WHERE m.channel_id = g.channel_id AND m.resolution = ?
+                             AND m.ts >= g.bucket AND m.ts < g.bucket + ?
+                           ORDER BY m.ts DESC LIMIT 1),
+                          g.samples
+                   FROM (
+                       SELECT channel_id, ts - (ts + ?) % ? AS bucket,
+                              MIN(min_members) AS min_members, MAX(max_members) AS max_members,
+                              SUM(samples) AS samples
+                       FROM member_stats
+                       WHERE resolution = ? AND ts >= ?
+                       GROUP BY channel_id, bucket
+                   ) g""",
+                (target, source, target, offset, target, source, start)
+            )
+        for resolution, keep_seconds in retention.items():
+            await db.execute(
+                "DELETE FROM member_stats WHERE resolution = ? AND ts < ?",
+                (resolution, now_ts - keep_seconds)
+            )
+        await db.commit()
+
+
+async def get_member_growth(channel_id: int, now_ts: int):
+    """Последнее число подписчиков и прирост за сутки/неделю/месяц по свёрткам"""
+    async with connect() as db:
+        async def value_at(resolution: int, ts: int):
+            cursor = await db.execute(
+                """SELECT ts, last_members FROM member_stats
+                   WHERE channel_id = ? AND resolution = ? AND ts <= ?
+                   ORDER BY ts DESC LIMIT 1""",
+                (channel_id, resolution, ts)
+            )
+            return await cursor.fetchone()
+        
+        latest = await value_at(MINUTE, now_ts)
+        if not latest:
+            return None
+        
+        growth = {'members': latest[1], 'sampled_at': latest[0]}
+        for name, resolution, period in (('day', HOUR, DAY), ('week', HOUR, 7 * DAY), ('month', DAY, 30 * DAY)):
+            past = await value_at(resolution, now_ts - period)
+            growth[name] = latest[1] - past[1] if past else None
+        return growth
+
+
 # ============ TEMPLATES ============
 
 async def add_template(user_id: int, name: str, text: str, media_type: str,
                        media_file_id: str, buttons: str, album: list = None):
     """Добавить шаблон"""
-    album_json = json.dumps(album) if album else None
+    album_json = json_dumps(album) if album else None
+    buttons_compiled = compile_url_buttons(buttons).compiled if buttons else None
     
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         cursor = await db.execute(
             """INSERT INTO templates 
-               (user_id, name, text, media_type, media_file_id, buttons, album)
-               VALUES (?, ?, ?, ?, ?, ?, ?)""",
-            (user_id, name, text, media_type, media_file_id, buttons, album_json)
+               (user_id, name, text, media_type, media_file_id, buttons, buttons_compiled, album)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (user_id, name, text, media_type, media_file_id, buttons, buttons_compiled, album_json)
         )
         await db.commit()
         return cursor.lastrowid
@@ -291,7 +1414,7 @@ async def add_template(user_id: int, name: str, text: str, media_type: str,
 
 async def get_user_templates(user_id: int):
     """Получить шаблоны пользователя"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT * FROM templates WHERE user_id = ? ORDER BY created_at DESC",
@@ -300,9 +1423,49 @@ async def get_user_templates(user_id: int):
         return await cursor.fetchall()
 
 
+async def get_user_templates_page(user_id: int, after: tuple = None, before: tuple = None,
+                                  limit: int = PAGE_SIZE):
+    """
+    Страница шаблонов пользователя (новые сверху) по ключу (created_at, id).
+    Возвращает (templates, has_more) - есть ли ещё шаблоны в направлении листания
+    """
+    condition, order, params = "", "DESC", (user_id,)
+    if before:
+        condition, order, params = "AND (created_at, id) > (?, ?)", "ASC", (user_id, *before)
+    elif after:
+        condition, params = "AND (created_at, id) < (?, ?)", (user_id, *after)
+    
+    async with connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            f"""SELECT * FROM templates
+                WHERE user_id = ? {condition}
+                ORDER BY created_at {order}, id {order}
+                LIMIT ?""",
+            (*params, limit + 1)
+        )
+        templates = await cursor.fetchall()
+    
+    has_more = len(templates) > limit
+    templates = templates[:limit]
+    if before:
+        templates.reverse()
+    return templates, has_more
+
+
+async def count_user_templates(user_id: int, cap: int = COUNT_CAP):
+    """Количество шаблонов пользователя (не больше cap)"""
+    async with connect() as db:
+        cursor = await db.execute(
+            "SELECT COUNT(*) FROM (SELECT 1 FROM templates WHERE user_id = ? LIMIT ?)",
+            (user_id, cap)
+        )
+        return (await cursor.fetchone())[0]
+
+
 async def get_template(template_id: int):
     """Получить шаблон по ID"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT * FROM templates WHERE id = ?", (template_id,)
@@ -312,6 +1475,105 @@ async def get_template(template_id: int):
 
 async def delete_template(template_id: int):
     """Удалить шаблон"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         await db.execute("DELETE FROM templates WHERE id = ?", (template_id,))
         await db.commit()
+
+
+# ============ SEARCH ============
+# Поиск по FTS5-индексам scheduled_posts_fts и templates_fts (см. _ensure_search_index).
+# user_id проиндексирован как колонка: условие user_id:N сужает поиск до постов
+# пользователя внутри индекса, и bm25 считается только по ним. Страницы - по
+# номеру, а не по ключу: оценка bm25 зависит от всего индекса и меняется между
+# запросами, так что ключ с оценкой не переживает чужие записи.
+# CROSS JOIN фиксирует порядок: сначала индекс, потом строки по rowid - иначе
+# SQLite может пойти по индексу статуса и искать MATCH для каждой строки
+
+def _match_query(user_id: int, text: str):
+    """
+    Ввод пользователя -> выражение MATCH или None, если слов нет. Слово от трёх
+    букв ищется по началу не длиннее SEARCH_PREFIXES: «скидками» -> скидк*, так
+    находятся и другие формы слова, а префикс берётся из индекса, без слияния
+    списков всех подходящих слов
+    """
+    terms = re.findall(r'[^\W_]+', text.lower())
+    # Предлоги и союзы («и», «в») не нужны, если есть слова длиннее
+    shortest = min(SEARCH_PREFIXES)
+    terms = [term for term in terms if len(term) >= shortest or term.isdigit()] or terms
+    terms = terms[:SEARCH_TERMS]
+    if not terms:
+        return None
+    longest = max(SEARCH_PREFIXES)
+    return " AND ".join([
+        f'user_id : "{user_id}"',
+        *(f'"{term[:longest]}"*' if len(term) >= shortest else f'"{term}"' for term in terms)
+    ])
+
+
+async def search_scheduled_posts(user_id: int, text: str, page: int = 0, limit: int = PAGE_SIZE):
+    """
+    Ожидающие посты пользователя по тексту, лучшие совпадения первыми.
+    Возвращает (posts, has_more) - есть ли следующая страница
+    """
+    match = _match_query(user_id, text)
+    if not match:
+        return [], False
+    
+    async with connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            """SELECT sp.*, c.channel_username, c.channel_title
+               FROM scheduled_posts_fts
+               CROSS JOIN scheduled_posts sp ON sp.id = scheduled_posts_fts.rowid
+               LEFT JOIN channels c ON sp.channel_id = c.channel_id
+               WHERE scheduled_posts_fts MATCH ? AND sp.status = 'pending'
+               ORDER BY bm25(scheduled_posts_fts, 0.0, 1.0), sp.id
+               LIMIT ? OFFSET ?""",
+            (match, limit + 1, page * limit)
+        )
+        posts = await cursor.fetchall()
+    return posts[:limit], len(posts) > limit
+
+
+async def search_templates(user_id: int, text: str, page: int = 0, limit: int = PAGE_SIZE):
+    """Шаблоны пользователя по названию и тексту (название весит больше). (templates, has_more)"""
+    match = _match_query(user_id, text)
+    if not match:
+        return [], False
+    
+    async with connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            """SELECT t.*
+               FROM templates_fts
+               CROSS JOIN templates t ON t.id = templates_fts.rowid
+               WHERE templates_fts MATCH ?
+               ORDER BY bm25(templates_fts, 0.0, 10.0, 1.0), t.id DESC
+               LIMIT ? OFFSET ?""",
+            (match, limit + 1, page * limit)
+        )
+        templates = await cursor.fetchall()
+    return templates[:limit], len(templates) > limit
+
+
+async def count_search_results(user_id: int, text: str, cap: int = COUNT_CAP):
+    """(ожидающих постов, шаблонов) по запросу, каждое не больше cap"""
+    match = _match_query(user_id, text)
+    if not match:
+        return 0, 0
+    
+    async with connect() as db:
+        cursor = await db.execute(
+            """SELECT COUNT(*) FROM (
+                   SELECT 1 FROM scheduled_posts_fts
+                   CROSS JOIN scheduled_posts sp ON sp.id = scheduled_posts_fts.rowid
+                   WHERE scheduled_posts_fts MATCH ? AND sp.status = 'pending' LIMIT ?
+               )""",
+            (match, cap)
+        )
+        posts = (await cursor.fetchone())[0]
+        cursor = await db.execute(
+            "SELECT COUNT(*) FROM (SELECT 1 FROM templates_fts WHERE templates_fts MATCH ? LIMIT ?)",
+            (match, cap)
+        )
+        return posts, (await cursor.fetchone())[0]
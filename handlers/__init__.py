@@ -6,6 +6,11 @@ from .settings import router as settings_router
 from .stats import router as stats_router
 from .templates import router as templates_router
 from .polls import router as polls_router
+from .chat_members import router as chat_members_router
+from .failed import router as failed_router
+from .queue import router as queue_router
+from .bulk import router as bulk_router
+from .search import router as search_router
 
 __all__ = [
     'start_router',
@@ -15,5 +20,10 @@ __all__ = [
     'settings_router',
     'stats_router',
     'templates_router',
-    'polls_router'
+    'polls_router',
+    'chat_members_router',
+    'failed_router',
+    'queue_router',
+    'bulk_router',
+    'search_router'
 ]
@@ -0,0 +1,413 @@
+import re
+from datetime import datetime, date, timedelta
+from html import escape
+
+from aiogram import Router, F
+from aiogram.types import Message, CallbackQuery
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+import database as db
+from keyboards.buttons import compile_url_buttons, format_button_errors
+from utils.clock import get_moscow_now
+from utils.recurrence import UNITS
+from utils.scheduler import parse_db_time, wake_scheduler
+
+router = Router()
+
+
+class BulkStates(StatesGroup):
+    dates = State()
+    text = State()
+    offset = State()
+    buttons = State()
+
+
+OFFSET_EXAMPLES = "<code>+2 ч</code>, <code>-30 мин</code>, <code>+1 д</code>, <code>+1д 6ч</code>"
+RESET_WORDS = ('все', 'всё', '-')
+
+BACK_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="⬅️ Назад", callback_data="bk_menu")]
+])
+
+
+# ============ ВЫБОРКА ============
+# Фильтр хранится в FSM под ключом bulk: channel_id, start/end (ISO-даты,
+# end включительно) и text
+
+async def get_filter(state: FSMContext) -> dict:
+    return (await state.get_data()).get('bulk') or {}
+
+
+async def set_filter(state: FSMContext, **changes):
+    bulk = {**await get_filter(state), **changes}
+    await state.update_data(bulk={key: value for key, value in bulk.items() if value is not None})
+
+
+def selection(user_id: int, bulk: dict) -> dict:
+    """Фильтр из FSM -> выборка для db.bulk_*"""
+    result = {'user_id': user_id, 'channel_id': bulk.get('channel_id'), 'text': bulk.get('text')}
+    if 'start' in bulk:
+        result['start'] = datetime.fromisoformat(bulk['start'])
+    if 'end' in bulk:
+        result['end'] = datetime.fromisoformat(bulk['end']) + timedelta(days=1)
+    return result
+
+
+def parse_day(value: str, year: int):
+    """ДД.ММ или ДД.ММ.ГГГГ -> (дата, указан ли год); без года - в году year"""
+    value = value.strip()
+    explicit = not re.fullmatch(r'\d{1,2}\.\d{1,2}', value)
+    try:
+        return datetime.strptime(value if explicit else f"{value}.{year}", "%d.%m.%Y").date(), explicit
+    except ValueError:
+        raise ValueError(f"Непонятная дата: {value}")
+
+
+def next_year(day: date) -> date:
+    # 29 февраля в невисокосный год - 28-е
+    if (day.month, day.day) == (2, 29):
+        day = day.replace(day=28)
+    return day.replace(year=day.year + 1)
+
+
+def parse_period(text: str, today: date):
+    """«25.12» или «25.12-31.12» -> (первый, последний день). Без года - ближайший ещё не прошедший период"""
+    parts = text.split("-")
+    if len(parts) > 2:
+        raise ValueError("Диапазон - две даты через дефис")
+    start, start_explicit = parse_day(parts[0], today.year)
+    end, end_explicit = parse_day(parts[-1], today.year)
+    if not end_explicit and end < start:
+        end = next_year(end)
+    if not start_explicit and not end_explicit and end < today:
+        start, end = next_year(start), next_year(end)
+    if end < start:
+        raise ValueError("Конец диапазона раньше начала")
+    return start, end
+
+
+def parse_offset(text: str) -> timedelta:
+    """«+2 ч», «-30 мин», «+1д 6ч» -> timedelta. ValueError, если не разобрали"""
+    text = text.lower().strip()
+    if not re.fullmatch(r'[+-]?\s*(\d+\s*[a-zа-я]+\s*)+', text):
+        raise ValueError("Не понял сдвиг")
+    minutes = 0
+    for count, unit in re.findall(r'(\d+)\s*([a-zа-я]+)', text):
+        if unit not in UNITS:
+            raise ValueError(f"Непонятная единица: {unit}")
+        minutes += int(count) * UNITS[unit]
+    if not minutes:
+        raise ValueError("Сдвиг не может быть нулевым")
+    return timedelta(minutes=-minutes if text.startswith('-') else minutes)
+
+
+def channel_title(channel) -> str:
+    return channel['channel_title'] or channel['channel_username'] or str(channel['channel_id'])
+
+
+async def own_channel(channel_id: int, user_id: int):
+    channel = await db.get_channel_by_id(channel_id)
+    if not channel or channel['added_by'] != user_id:
+        return None
+    return channel
+
+
+def describe_filter(bulk: dict, channel) -> str:
+    text = f"📢 <b>Канал:</b> {escape(channel_title(channel)) if channel else 'все'}\n"
+    if 'start' in bulk:
+        start = date.fromisoformat(bulk['start']).strftime('%d.%m.%Y')
+        end = date.fromisoformat(bulk['end']).strftime('%d.%m.%Y')
+        text += f"📅 <b>Даты:</b> {start}" + (f" — {end}" if end != start else "") + "\n"
+    else:
+        text += "📅 <b>Даты:</b> все\n"
+    text += f"🔎 <b>Текст:</b> {escape(bulk['text']) if 'text' in bulk else 'любой'}\n"
+    return text
+
+
+async def build_bulk_menu(user_id: int, bulk: dict):
+    """Фильтр, сколько постов под него попало, и действия: (текст, клавиатура)"""
+    channel = await own_channel(bulk['channel_id'], user_id) if 'channel_id' in bulk else None
+    count, first, last = await db.get_bulk_summary(selection(user_id, bulk))
+
+    text = "🧰 <b>Массовые действия</b>\n\n" + describe_filter(bulk, channel) + "\n"
+    if count:
+        text += f"Подходит постов: <b>{count}</b>\n"
+        text += f"⏰ {parse_db_time(first).strftime('%d.%m %H:%M')} — {parse_db_time(last).strftime('%d.%m %H:%M')} МСК"
+    else:
+        text += "Под фильтр не попал ни один отложенный пост."
+
+    buttons = [
+        [
+            InlineKeyboardButton(text="📢 Канал", callback_data="bk_chs"),
+            InlineKeyboardButton(text="📅 Даты", callback_data="bk_dates"),
+            InlineKeyboardButton(text="🔎 Текст", callback_data="bk_text"),
+        ]
+    ]
+    if count:
+        buttons.append([
+            InlineKeyboardButton(text="🕐 Сдвинуть", callback_data="bk_shift"),
+            InlineKeyboardButton(text="📢 В канал", callback_data="bk_mvs"),
+        ])
+        buttons.append([
+            InlineKeyboardButton(text="🔗 Кнопки", callback_data="bk_buttons"),
+            InlineKeyboardButton(text=f"🗑 Удалить ({count})", callback_data="bk_del"),
+        ])
+    if bulk:
+        buttons.append([InlineKeyboardButton(text="♻️ Сбросить фильтр", callback_data="bk_reset")])
+    buttons.append([
+        InlineKeyboardButton(text="📋 Отложенные", callback_data="sched_back_list"),
+        InlineKeyboardButton(text="🏠 Меню", callback_data="back_to_main"),
+    ])
+    return text, InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+async def show_menu(callback: CallbackQuery, state: FSMContext, notice: str = None):
+    text, keyboard = await build_bulk_menu(callback.from_user.id, await get_filter(state))
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
+    if notice:
+        await callback.answer(notice, show_alert=True)
+    else:
+        await callback.answer()
+
+
+async def send_menu(message: Message, state: FSMContext, notice: str = None):
+    await state.set_state(None)
+    text, keyboard = await build_bulk_menu(message.from_user.id, await get_filter(state))
+    if notice:
+        text = f"{notice}\n\n{text}"
+    await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.message(Command("bulk"))
+async def bulk_command(message: Message, state: FSMContext):
+    await send_menu(message, state)
+
+
+@router.callback_query(F.data == "bk_menu")
+async def bulk_menu(callback: CallbackQuery, state: FSMContext):
+    await state.set_state(None)
+    await show_menu(callback, state)
+
+
+@router.callback_query(F.data == "bk_reset")
+async def reset_filter(callback: CallbackQuery, state: FSMContext):
+    await state.update_data(bulk={})
+    await show_menu(callback, state)
+
+
+# ============ ФИЛЬТР ============
+
+def channels_keyboard(channels, prefix: str, extra: list = None):
+    buttons = [
+        [InlineKeyboardButton(text=f"📢 {channel_title(channel)}", callback_data=f"{prefix}{channel['channel_id']}")]
+        for channel in channels
+    ]
+    if extra:
+        buttons.append(extra)
+    buttons.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="bk_menu")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+@router.callback_query(F.data == "bk_chs")
+async def choose_filter_channel(callback: CallbackQuery):
+    channels = await db.get_channels(callback.from_user.id)
+    await callback.message.edit_text(
+        "📢 <b>Посты какого канала?</b>",
+        parse_mode="HTML",
+        reply_markup=channels_keyboard(
+            channels, "bk_ch_", [InlineKeyboardButton(text="Все каналы", callback_data="bk_ch_all")]
+        )
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("bk_ch_"))
+async def set_filter_channel(callback: CallbackQuery, state: FSMContext):
+    value = callback.data.split("_")[2]
+    if value == "all":
+        await set_filter(state, channel_id=None)
+    elif await own_channel(int(value), callback.from_user.id):
+        await set_filter(state, channel_id=int(value))
+    else:
+        await callback.answer("Канал не найден", show_alert=True)
+        return
+    await show_menu(callback, state)
+
+
+@router.callback_query(F.data == "bk_dates")
+async def dates_start(callback: CallbackQuery, state: FSMContext):
+    await state.set_state(BulkStates.dates)
+    await callback.message.edit_text(
+        "📅 <b>За какие дни?</b>\n\n"
+        "Отправьте день <code>25.12</code> или диапазон <code>25.12-31.12</code> "
+        "(можно с годом: <code>25.12.2025</code>).\n"
+        "<code>все</code> — без ограничения по датам",
+        parse_mode="HTML",
+        reply_markup=BACK_KEYBOARD
+    )
+    await callback.answer()
+
+
+@router.message(BulkStates.dates, F.text)
+async def dates_entered(message: Message, state: FSMContext):
+    value = message.text.strip().lower()
+    if value in RESET_WORDS:
+        await set_filter(state, start=None, end=None)
+        await send_menu(message, state)
+        return
+
+    try:
+        start, end = parse_period(value, get_moscow_now().date())
+    except ValueError as e:
+        await message.answer(f"⚠️ {e}\n\nПример: <code>25.12-31.12</code>", parse_mode="HTML")
+        return
+
+    await set_filter(state, start=start.isoformat(), end=end.isoformat())
+    await send_menu(message, state)
+
+
+@router.callback_query(F.data == "bk_text")
+async def text_start(callback: CallbackQuery, state: FSMContext):
+    await state.set_state(BulkStates.text)
+    await callback.message.edit_text(
+        "🔎 <b>Какой текст ищем?</b>\n\n"
+        "Отправьте слово или фразу — попадут посты, в тексте которых она есть "
+        "(регистр латиницы не важен).\n"
+        "<code>все</code> — любой текст",
+        parse_mode="HTML",
+        reply_markup=BACK_KEYBOARD
+    )
+    await callback.answer()
+
+
+@router.message(BulkStates.text, F.text)
+async def text_entered(message: Message, state: FSMContext):
+    value = message.text.strip()
+    await set_filter(state, text=None if value.lower() in RESET_WORDS else value[:100])
+    await send_menu(message, state)
+
+
+# ============ ДЕЙСТВИЯ ============
+
+@router.callback_query(F.data == "bk_shift")
+async def shift_start(callback: CallbackQuery, state: FSMContext):
+    await state.set_state(BulkStates.offset)
+    await callback.message.edit_text(
+        f"🕐 <b>На сколько сдвинуть время?</b>\n\nНапример: {OFFSET_EXAMPLES}",
+        parse_mode="HTML",
+        reply_markup=BACK_KEYBOARD
+    )
+    await callback.answer()
+
+
+@router.message(BulkStates.offset, F.text)
+async def shift_entered(message: Message, state: FSMContext):
+    try:
+        offset = parse_offset(message.text)
+    except ValueError as e:
+        await message.answer(f"⚠️ {e}\n\nНапример: {OFFSET_EXAMPLES}", parse_mode="HTML")
+        return
+
+    chosen = selection(message.from_user.id, await get_filter(state))
+    if offset < timedelta(0):
+        count, first, _ = await db.get_bulk_summary(chosen)
+        if count and parse_db_time(first) + offset <= get_moscow_now():
+            await message.answer(
+                f"⚠️ Первый пост ({parse_db_time(first).strftime('%d.%m %H:%M')}) окажется в прошлом. "
+                f"Сдвиньте меньше или сузьте выборку."
+            )
+            return
+
+    count = await db.bulk_shift_posts(chosen, offset)
+    if count:
+        wake_scheduler()
+    await send_menu(message, state, f"✅ Сдвинуто постов: {count}")
+
+
+@router.callback_query(F.data == "bk_mvs")
+async def move_start(callback: CallbackQuery, state: FSMContext):
+    current = (await get_filter(state)).get('channel_id')
+    channels = [
+        channel for channel in await db.get_channels(callback.from_user.id)
+        if channel['channel_id'] != current
+    ]
+    if not channels:
+        await callback.answer("Нет другого канала", show_alert=True)
+        return
+    await callback.message.edit_text(
+        "📢 <b>В какой канал перенести посты?</b>",
+        parse_mode="HTML",
+        reply_markup=channels_keyboard(channels, "bk_mv_")
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("bk_mv_"))
+async def move_posts(callback: CallbackQuery, state: FSMContext):
+    channel_id = int(callback.data.split("_")[2])
+    channel = await own_channel(channel_id, callback.from_user.id)
+    if not channel:
+        await callback.answer("Канал не найден", show_alert=True)
+        return
+
+    count = await db.bulk_move_posts(selection(callback.from_user.id, await get_filter(state)), channel_id)
+    if count:
+        wake_scheduler()
+    # Перенесённые посты больше не подходят под старый канал - фильтр идёт за ними
+    if 'channel_id' in await get_filter(state):
+        await set_filter(state, channel_id=channel_id)
+    await show_menu(callback, state, f"✅ Перенесено в {channel_title(channel)}: {count}")
+
+
+@router.callback_query(F.data == "bk_buttons")
+async def buttons_start(callback: CallbackQuery, state: FSMContext):
+    await state.set_state(BulkStates.buttons)
+    await callback.message.edit_text(
+        "🔗 <b>Новые кнопки для всех постов выборки</b>\n\n"
+        "Формат: <code>Текст - http://url</code>\n"
+        "Отправьте <code>удалить</code> чтобы убрать кнопки",
+        parse_mode="HTML",
+        reply_markup=BACK_KEYBOARD
+    )
+    await callback.answer()
+
+
+@router.message(BulkStates.buttons, F.text)
+async def buttons_entered(message: Message, state: FSMContext):
+    buttons = None
+    if message.text.lower() != 'удалить':
+        result = compile_url_buttons(message.text)
+        if result.errors or not result.compiled:
+            await message.answer(format_button_errors(result.errors), parse_mode="HTML")
+            return
+        buttons = message.text
+
+    count = await db.bulk_set_buttons(selection(message.from_user.id, await get_filter(state)), buttons)
+    await send_menu(message, state, f"✅ Кнопки {'обновлены' if buttons else 'удалены'}: {count}")
+
+
+@router.callback_query(F.data == "bk_del")
+async def delete_confirm(callback: CallbackQuery, state: FSMContext):
+    count, _, _ = await db.get_bulk_summary(selection(callback.from_user.id, await get_filter(state)))
+    await callback.message.edit_text(
+        f"🗑 <b>Удалить отложенных постов: {count}?</b>\n\nЭто нельзя отменить.",
+        parse_mode="HTML",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [
+                InlineKeyboardButton(text="✅ Да, удалить", callback_data="bk_del_yes"),
+                InlineKeyboardButton(text="❌ Нет", callback_data="bk_menu"),
+            ]
+        ])
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data == "bk_del_yes")
+async def delete_posts(callback: CallbackQuery, state: FSMContext):
+    count = await db.bulk_delete_posts(selection(callback.from_user.id, await get_filter(state)))
+    if count:
+        wake_scheduler()
+    await show_menu(callback, state, f"🗑 Удалено постов: {count}")
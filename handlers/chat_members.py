@@ -0,0 +1,18 @@
+from aiogram import Router
+from aiogram.types import ChatMemberUpdated
+
+from utils.api_cache import invalidate_chat
+
+router = Router()
+
+
+@router.my_chat_member()
+async def bot_member_updated(update: ChatMemberUpdated):
+    """Права бота в чате изменились - сбрасываем кэш чата"""
+    invalidate_chat(update.chat.id)
+
+
+@router.chat_member()
+async def chat_member_updated(update: ChatMemberUpdated):
+    """Изменился участник чата - сбрасываем кэш чата"""
+    invalidate_chat(update.chat.id)
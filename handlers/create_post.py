@@ -5,27 +5,23 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from datetime import datetime, timedelta
 import logging
-import pytz
 
 from keyboards import (
     get_main_menu, get_cancel_keyboard,
     get_publish_keyboard, get_confirm_publish_keyboard, get_schedule_keyboard,
-    get_delete_timer_keyboard, get_view_post_keyboard,
-    parse_url_buttons, get_back_inline_keyboard
+    get_delete_timer_keyboard, get_view_post_keyboard, get_slot_conflict_keyboard,
+    parse_url_buttons, compile_url_buttons, format_button_errors, get_back_inline_keyboard
 )
+from keyboards.cache import cached_keyboard
 import database as db
+from utils.api_cache import get_chat_member
+from utils import metrics, recurrence, slots
+from utils.clock import get_moscow_now
+from utils.scheduler import wake_scheduler
 
 router = Router()
 logger = logging.getLogger(__name__)
 
-MOSCOW_TZ = pytz.timezone('Europe/Moscow')
-
-
-def get_moscow_now():
-    """Московское время без tzinfo"""
-    return datetime.now(MOSCOW_TZ).replace(tzinfo=None)
-
-
 def get_channels_keyboard(channels):
     """Клавиатура выбора канала"""
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
@@ -54,8 +50,10 @@ class CreatePostStates(StatesGroup):
     publish_menu = State()
     schedule_custom = State()
     delete_timer_custom = State()
+    recurrence = State()
 
 
+@cached_keyboard
 def get_post_constructor_keyboard(has_text=False, has_media=False, has_buttons=False, has_album=False):
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
     
@@ -178,8 +176,10 @@ async def publish_post(bot: Bot, channel_id: int, data: dict, user_id: int):
             msg = await bot.send_message(chat_id=channel_id, text=text, reply_markup=keyboard, parse_mode=parse_mode, disable_notification=disable_notification)
         
         await db.add_post_stats(channel_id, msg.message_id)
+        metrics.record_publish(metrics.post_type(media_type, album), 'manual', True)
         return True, msg
     except Exception as e:
+        metrics.record_publish(metrics.post_type(media_type, album), 'manual', False)
         return False, str(e)
 
 
@@ -284,7 +284,7 @@ async def add_channel_from_forward(message: Message, state: FSMContext, bot: Bot
         return
     
     try:
-        bot_member = await bot.get_chat_member(chat.id, bot.id)
+        bot_member = await get_chat_member(bot, chat.id, bot.id)
         if bot_member.status not in ['administrator', 'creator']:
             await message.answer("⚠️ Бот не админ канала. Добавьте бота как администратора.")
             return
@@ -292,7 +292,7 @@ async def add_channel_from_forward(message: Message, state: FSMContext, bot: Bot
             await message.answer("⚠️ Нет прав на публикацию. Дайте боту право публиковать сообщения.")
             return
         
-        user_member = await bot.get_chat_member(chat.id, message.from_user.id)
+        user_member = await get_chat_member(bot, chat.id, message.from_user.id)
         if user_member.status not in ['creator', 'administrator']:
             await message.answer("⚠️ Вы не админ канала")
             return
@@ -538,9 +538,9 @@ async def add_buttons(callback: CallbackQuery, state: FSMContext):
 
 @router.message(CreatePostStates.add_buttons, F.text)
 async def buttons_received(message: Message, state: FSMContext):
-    keyboard = parse_url_buttons(message.text)
-    if not keyboard:
-        await message.answer("⚠️ Формат: <code>Кнопка - http://url</code>", parse_mode="HTML", reply_markup=get_back_inline_keyboard("back_to_constructor"))
+    result = compile_url_buttons(message.text)
+    if result.errors or not result.compiled:
+        await message.answer(format_button_errors(result.errors), parse_mode="HTML", reply_markup=get_back_inline_keyboard("back_to_constructor"))
         return
     await state.update_data(buttons_text=message.text)
     data = await state.get_data()
@@ -657,7 +657,14 @@ async def schedule_preset(callback: CallbackQuery, state: FSMContext):
     preset = callback.data.replace("schedule_", "")
     now = get_moscow_now()
     
-    if preset == "1h":
+    if preset.startswith(("at_", "keep_")):
+        # Ответ на конфликт в расписании канала: свободное время или своё
+        preset, value = preset.split("_", 1)
+        scheduled = slots.decode_time(value)
+        if scheduled <= now:
+            await callback.answer("⚠️ Время уже прошло", show_alert=True)
+            return
+    elif preset == "1h":
         scheduled = now + timedelta(hours=1)
     elif preset == "3h":
         scheduled = now + timedelta(hours=3)
@@ -684,6 +691,10 @@ async def schedule_preset(callback: CallbackQuery, state: FSMContext):
     
     data = await state.get_data()
     
+    if preset != "keep" and await warn_slot_conflict(callback.message, data, scheduled, now, edit=True):
+        await callback.answer()
+        return
+    
     await db.add_scheduled_post(
         channel_id=data.get('channel_id'),
         user_id=callback.from_user.id,
@@ -693,11 +704,14 @@ async def schedule_preset(callback: CallbackQuery, state: FSMContext):
         buttons=data.get('buttons_text'),
         album=data.get('album'),
         scheduled_time=scheduled,
-        delete_after=data.get('delete_after')
+        delete_after=data.get('delete_after'),
+        recurrence=data.get('recurrence'),
+        recurrence_tz=data.get('recurrence_tz')
     )
+    wake_scheduler()
     
     await state.clear()
-    await callback.message.edit_text(f"⏰ <b>Отложено!</b>\n\n📅 {scheduled.strftime('%d.%m в %H:%M')} МСК", parse_mode="HTML")
+    await callback.message.edit_text(f"⏰ <b>Отложено!</b>\n\n📅 {scheduled.strftime('%d.%m в %H:%M')} МСК{repeat_note(data)}", parse_mode="HTML")
     await callback.message.answer("🏠 Меню", reply_markup=get_main_menu())
     await callback.answer()
 
@@ -724,6 +738,10 @@ async def schedule_custom(message: Message, state: FSMContext):
         
         data = await state.get_data()
         
+        if await warn_slot_conflict(message, data, scheduled, now):
+            await state.set_state(CreatePostStates.publish_menu)
+            return
+        
         await db.add_scheduled_post(
             channel_id=data.get('channel_id'),
             user_id=message.from_user.id,
@@ -733,16 +751,138 @@ async def schedule_custom(message: Message, state: FSMContext):
             buttons=data.get('buttons_text'),
             album=data.get('album'),
             scheduled_time=scheduled,
-            delete_after=data.get('delete_after')
+            delete_after=data.get('delete_after'),
+            recurrence=data.get('recurrence'),
+            recurrence_tz=data.get('recurrence_tz')
         )
+        wake_scheduler()
         
         await state.clear()
-        await message.answer(f"⏰ <b>Отложено!</b>\n\n📅 {scheduled.strftime('%d.%m в %H:%M')} МСК", parse_mode="HTML", reply_markup=get_main_menu())
+        await message.answer(f"⏰ <b>Отложено!</b>\n\n📅 {scheduled.strftime('%d.%m в %H:%M')} МСК{repeat_note(data)}", parse_mode="HTML", reply_markup=get_main_menu())
     
     except ValueError:
         await message.answer("⚠️ Формат: <code>ЧЧ ММ ДД ММ</code>", parse_mode="HTML")
 
 
+async def warn_slot_conflict(message: Message, data: dict, scheduled: datetime, now: datetime,
+                             edit: bool = False) -> bool:
+    """Время занято в канале - предупредить и предложить свободное. True, если предупредили"""
+    conflict = await slots.check_slot(data.get('channel_id'), scheduled, now, data.get('delete_after'))
+    if not conflict:
+        return False
+    
+    keyboard = get_slot_conflict_keyboard(
+        conflict.suggestion,
+        use_data=f"schedule_at_{slots.encode_time(conflict.suggestion)}" if conflict.suggestion else None,
+        keep_data=f"schedule_keep_{slots.encode_time(scheduled)}",
+        back_data="back_to_publish_menu"
+    )
+    text = slots.describe_conflict(conflict)
+    if edit:
+        await message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
+    else:
+        await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+    return True
+
+
+def repeat_note(data: dict) -> str:
+    """Строка о повторе для подтверждения отложки"""
+    if not data.get('recurrence'):
+        return ""
+    return f"\n🔁 Повтор: {recurrence.describe(data['recurrence'])}"
+
+
+# ============ ПОВТОР ============
+
+@router.callback_query(CreatePostStates.publish_menu, F.data == "set_recurrence")
+async def recurrence_menu(callback: CallbackQuery, state: FSMContext):
+    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+    
+    data = await state.get_data()
+    buttons = []
+    if data.get('recurrence'):
+        buttons.append([InlineKeyboardButton(text="🚫 Без повтора", callback_data="recurrence_off")])
+    buttons.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="back_to_publish_menu")])
+    
+    current = f"Сейчас: <b>{recurrence.describe(data['recurrence'])}</b>\n\n" if data.get('recurrence') else ""
+    await callback.message.edit_text(
+        f"🔁 <b>Повтор публикации</b>\n\n{current}"
+        f"Отправьте правило, например:\n{recurrence.EXAMPLES}\n\n"
+        f"Первый раз пост выйдет во время, выбранное в «⏰ Отложить», дальше - по правилу.",
+        parse_mode="HTML",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons)
+    )
+    await state.set_state(CreatePostStates.recurrence)
+    await callback.answer()
+
+
+@router.callback_query(CreatePostStates.recurrence, F.data == "recurrence_off")
+async def recurrence_off(callback: CallbackQuery, state: FSMContext):
+    await state.update_data(recurrence=None, recurrence_tz=None)
+    await state.set_state(CreatePostStates.publish_menu)
+    await callback.message.edit_text("✅ Без повтора", reply_markup=get_publish_keyboard())
+    await callback.answer()
+
+
+@router.callback_query(CreatePostStates.recurrence, F.data == "back_to_publish_menu")
+async def recurrence_back(callback: CallbackQuery, state: FSMContext):
+    await state.set_state(CreatePostStates.publish_menu)
+    await callback.message.edit_text("📤 <b>Готово!</b>", parse_mode="HTML", reply_markup=get_publish_keyboard())
+    await callback.answer()
+
+
+@router.message(CreatePostStates.recurrence, F.text)
+async def recurrence_entered(message: Message, state: FSMContext):
+    try:
+        rule = recurrence.parse_rule(message.text)
+    except ValueError as e:
+        await message.answer(f"⚠️ {e}\n\nПримеры:\n{recurrence.EXAMPLES}", parse_mode="HTML")
+        return
+    
+    settings = await db.get_user_settings(message.from_user.id)
+    await state.update_data(recurrence=rule, recurrence_tz=recurrence.user_timezone(settings))
+    await state.set_state(CreatePostStates.publish_menu)
+    await message.answer(
+        f"✅ <b>Повтор:</b> {recurrence.describe(rule)}\n\nТеперь выберите время первой публикации в «⏰ Отложить».",
+        parse_mode="HTML",
+        reply_markup=get_publish_keyboard()
+    )
+
+
+# ============ ОЧЕРЕДЬ КАНАЛА ============
+
+@router.callback_query(CreatePostStates.publish_menu, F.data == "add_to_queue")
+async def add_to_queue(callback: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    channel_id = data.get('channel_id')
+    
+    item_id = await db.add_queue_item(
+        channel_id=channel_id,
+        user_id=callback.from_user.id,
+        text=data.get('post_text', ''),
+        media_type=data.get('media_type'),
+        media_file_id=data.get('media_file_id'),
+        buttons=data.get('buttons_text'),
+        album=data.get('album'),
+        delete_after=data.get('delete_after')
+    )
+    rank = await db.get_queue_item_rank(item_id)
+    queue = await db.get_channel_queue(channel_id)
+    
+    await state.clear()
+    note = ""
+    if data.get('delete_after'):
+        note += f"\n⏱ Таймер удаления: {data['delete_after'] // 60} мин"
+    if data.get('recurrence'):
+        # Пост очереди выходит один раз в свой слот - серия из него не строится
+        note += "\n🔁 Повтор не применён: пост из очереди выходит один раз"
+    if not queue:
+        note += "\n\n⏱ Расписание очереди ещё не задано — /queue"
+    await callback.message.edit_text(f"📥 <b>В очереди канала:</b> №{rank}{note}", parse_mode="HTML")
+    await callback.message.answer("🏠 Меню", reply_markup=get_main_menu())
+    await callback.answer()
+
+
 # ============ ТАЙМЕР УДАЛЕНИЯ ============
 
 @router.callback_query(CreatePostStates.publish_menu, F.data == "set_delete_timer")
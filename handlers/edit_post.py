@@ -7,8 +7,9 @@ from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 from keyboards import (
     get_main_menu, get_cancel_keyboard, get_channels_keyboard,
-    parse_url_buttons, get_back_inline_keyboard
+    parse_url_buttons, compile_url_buttons, format_button_errors, get_back_inline_keyboard
 )
+from keyboards.cache import cached_keyboard
 import database as db
 
 router = Router()
@@ -24,6 +25,7 @@ class EditPostStates(StatesGroup):
     edit_media = State()
 
 
+@cached_keyboard
 def get_edit_keyboard(has_media: bool = False, has_buttons: bool = False):
     """Клавиатура редактирования поста"""
     buttons = [
@@ -216,14 +218,10 @@ async def edit_buttons_start(callback: CallbackQuery, state: FSMContext):
 @router.message(EditPostStates.edit_buttons, F.text)
 async def new_buttons_received(message: Message, state: FSMContext):
     """Получены новые кнопки"""
-    keyboard = parse_url_buttons(message.text)
+    result = compile_url_buttons(message.text)
     
-    if not keyboard:
-        await message.answer(
-            "⚠️ <b>Не удалось распознать кнопки</b>\n\n"
-            "Проверьте формат: <code>Кнопка - http://url</code>",
-            parse_mode="HTML"
-        )
+    if result.errors or not result.compiled:
+        await message.answer(format_button_errors(result.errors), parse_mode="HTML")
         return
     
     await state.update_data(new_buttons=message.text)
@@ -0,0 +1,235 @@
+from html import escape
+
+from aiogram import Router, F
+from aiogram.types import Message, CallbackQuery
+from aiogram.filters import Command
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from datetime import timedelta
+
+import database as db
+from config import ADMIN_IDS
+from utils.clock import get_moscow_now
+from utils.scheduler import parse_db_time, wake_scheduler
+
+router = Router()
+
+# Насколько переносить посты кнопкой «Перенести»
+RESCHEDULE_DELAY = timedelta(hours=1)
+
+# Области просмотра в callback_data: u - свои посты, a - все (только админы)
+USER, ALL = 'u', 'a'
+
+# Повтор поста «под сомнением» после того, как автор проверил канал
+CHECKED = 'checked'
+
+
+def scope_user(scope: str, user_id: int):
+    """user_id для выборки: свой для u, None (все) для a; False - нет доступа"""
+    if scope == ALL:
+        return None if user_id in ADMIN_IDS else False
+    return user_id
+
+
+async def build_failed_list(scope: str, user_id: int, after: tuple = None, before: tuple = None):
+    """Страница неопубликованных постов: (текст, клавиатура) или None, если их нет"""
+    posts, has_more = await db.get_failed_posts_page(user_id, after=after, before=before)
+
+    if not posts and (after or before):
+        posts, has_more = await db.get_failed_posts_page(user_id)
+        after = before = None
+
+    if not posts:
+        return None
+
+    summary = await db.get_failed_summary(user_id)
+    total = sum(count for _, count, _ in summary)
+    # Посты «под сомнением» могли уже выйти - их повторяют по одному, проверив канал
+    in_doubt = sum(count for error_class, count, _ in summary if error_class == db.IN_DOUBT)
+
+    title = "Неопубликованные посты всех пользователей" if scope == ALL else "Неопубликованные посты"
+    text = f"⚠️ <b>{title} ({total})</b>\n\n"
+    for error_class, count, _ in summary:
+        text += f"• <code>{escape(error_class)}</code>: {count}\n"
+    if in_doubt:
+        text += (
+            f"\n⚠️ <code>{db.IN_DOUBT}</code> ({in_doubt}) могли уже выйти в канал. "
+            "В «Повторить все» они не входят: откройте пост, проверьте канал и повторите его отдельно\n"
+        )
+    text += "\n"
+
+    buttons = []
+    for post in posts:
+        time_str = parse_db_time(post['scheduled_time']).strftime("%d.%m %H:%M")
+        preview = (post['text'] or '[Медиа]')[:25]
+        text += f"❌ {time_str} — {escape(preview)}… (попыток: {post['attempts'] or 1})\n"
+        buttons.append([InlineKeyboardButton(
+            text=f"📝 {time_str} — {preview[:15]}",
+            callback_data=f"fl_view_{scope}_{post['id']}"
+        )])
+
+    has_prev = has_more if before else after is not None
+    has_next = True if before else has_more
+
+    nav = []
+    if has_prev:
+        first = posts[0]
+        nav.append(InlineKeyboardButton(
+            text="⬅️", callback_data=f"fl_pg_{scope}_p_{first['id']}_{first['scheduled_time']}"
+        ))
+    if has_next:
+        last = posts[-1]
+        nav.append(InlineKeyboardButton(
+            text="➡️", callback_data=f"fl_pg_{scope}_n_{last['id']}_{last['scheduled_time']}"
+        ))
+    if nav:
+        buttons.append(nav)
+
+    if total > in_doubt:
+        buttons.append([
+            InlineKeyboardButton(text=f"🔁 Повторить все ({total - in_doubt})", callback_data=f"fl_all_{scope}_retry"),
+            InlineKeyboardButton(text="🕐 Все на +1 ч", callback_data=f"fl_all_{scope}_later"),
+        ])
+    buttons.append([InlineKeyboardButton(text="🏠 Меню", callback_data="back_to_main")])
+
+    return text, InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+EMPTY_TEXT = "✅ <b>Неопубликованных постов нет</b>"
+MENU_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="🏠 Меню", callback_data="back_to_main")]
+])
+
+
+async def show_list(message: Message, scope: str):
+    page = await build_failed_list(scope, scope_user(scope, message.from_user.id))
+    if not page:
+        await message.answer(EMPTY_TEXT, parse_mode="HTML")
+        return
+    text, keyboard = page
+    await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.message(Command("failed"))
+async def show_failed_posts(message: Message):
+    await show_list(message, USER)
+
+
+@router.message(Command("failed_all"), F.from_user.id.in_(ADMIN_IDS))
+async def show_all_failed_posts(message: Message):
+    await show_list(message, ALL)
+
+
+async def refresh_list(callback: CallbackQuery, scope: str, after: tuple = None, before: tuple = None):
+    page = await build_failed_list(scope, scope_user(scope, callback.from_user.id), after=after, before=before)
+    if not page:
+        await callback.message.edit_text(EMPTY_TEXT, parse_mode="HTML", reply_markup=MENU_KEYBOARD)
+        return
+    text, keyboard = page
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.callback_query(F.data.startswith("fl_pg_"))
+async def failed_page(callback: CallbackQuery):
+    _, _, scope, direction, post_id, scheduled_time = callback.data.split("_", 5)
+    if scope_user(scope, callback.from_user.id) is False:
+        await callback.answer("Нет доступа", show_alert=True)
+        return
+
+    key = (scheduled_time, int(post_id))
+    if direction == "n":
+        await refresh_list(callback, scope, after=key)
+    else:
+        await refresh_list(callback, scope, before=key)
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("fl_list_"))
+async def back_to_failed_list(callback: CallbackQuery):
+    scope = callback.data.split("_")[-1]
+    if scope_user(scope, callback.from_user.id) is False:
+        await callback.answer("Нет доступа", show_alert=True)
+        return
+    await refresh_list(callback, scope)
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("fl_view_"))
+async def view_failed_post(callback: CallbackQuery):
+    _, _, scope, post_id = callback.data.split("_")
+    post_id = int(post_id)
+    user_id = scope_user(scope, callback.from_user.id)
+    post = await db.get_scheduled_post(post_id)
+
+    if user_id is False or not post or post['status'] != 'error' or (user_id and post['user_id'] != user_id):
+        await callback.answer("Пост не найден", show_alert=True)
+        return
+
+    scheduled = parse_db_time(post['scheduled_time'])
+    text = "⚠️ <b>Пост не опубликован</b>\n\n"
+    text += f"⏰ <b>Время:</b> {scheduled.strftime('%d.%m.%Y в %H:%M')} МСК\n"
+    text += f"📢 <b>Канал:</b> <code>{post['channel_id']}</code>\n"
+    if scope == ALL:
+        text += f"👤 <b>Автор:</b> <code>{post['user_id']}</code>\n"
+    if post['text']:
+        text += f"\n📝 <i>{escape(post['text'][:200])}{'...' if len(post['text']) > 200 else ''}</i>\n"
+
+    attempts = await db.get_publish_attempts(post_id)
+    text += f"\n🔁 <b>Попыток:</b> {post['attempts'] or len(attempts)}\n"
+    for attempt in attempts:
+        attempted = parse_db_time(attempt['attempted_at']).strftime('%d.%m %H:%M')
+        error = escape((attempt['error'] or '')[:150])
+        text += f"• {attempted} <code>{escape(attempt['error_class'] or '?')}</code> {error}\n"
+
+    if post['last_error_class'] == db.IN_DOUBT:
+        text += "\n⚠️ Публикация прервалась после отправки: пост мог уже выйти. Проверьте канал — повтор может его задублировать."
+        actions = [InlineKeyboardButton(
+            text="✅ Проверил канал, отправить снова", callback_data=f"fl_one_{scope}_{CHECKED}_{post_id}"
+        )]
+    else:
+        actions = [
+            InlineKeyboardButton(text="🔁 Повторить", callback_data=f"fl_one_{scope}_retry_{post_id}"),
+            InlineKeyboardButton(text="🕐 +1 ч", callback_data=f"fl_one_{scope}_later_{post_id}"),
+        ]
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        actions,
+        [InlineKeyboardButton(text="⬅️ К списку", callback_data=f"fl_list_{scope}")]
+    ])
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
+    await callback.answer()
+
+
+async def requeue(callback: CallbackQuery, scope: str, action: str, post_id: int = None):
+    """
+    Вернуть посты в очередь планировщика: сразу (retry) или через час (later).
+    Посты «под сомнением» - только по одному и после проверки канала (checked)
+    """
+    user_id = scope_user(scope, callback.from_user.id)
+    if user_id is False:
+        await callback.answer("Нет доступа", show_alert=True)
+        return
+
+    new_time = get_moscow_now()
+    if action == "later":
+        new_time += RESCHEDULE_DELAY
+    exclude_class = None if action == CHECKED and post_id is not None else db.IN_DOUBT
+    count = await db.requeue_failed_posts(new_time, user_id, post_id=post_id, exclude_class=exclude_class)
+    if count:
+        wake_scheduler()
+
+    if action == "later":
+        await callback.answer(f"🕐 Перенесено на {new_time.strftime('%H:%M')}: {count}", show_alert=True)
+    else:
+        await callback.answer(f"🔁 Возвращено в очередь: {count}", show_alert=True)
+    await refresh_list(callback, scope)
+
+
+@router.callback_query(F.data.startswith("fl_all_"))
+async def requeue_all(callback: CallbackQuery):
+    _, _, scope, action = callback.data.split("_")
+    await requeue(callback, scope, action)
+
+
+@router.callback_query(F.data.startswith("fl_one_"))
+async def requeue_one(callback: CallbackQuery):
+    _, _, scope, action, post_id = callback.data.split("_")
+    await requeue(callback, scope, action, int(post_id))
@@ -5,7 +5,9 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 from keyboards import get_main_menu, get_cancel_keyboard, get_channels_keyboard
+from keyboards.cache import cached_keyboard
 import database as db
+from utils import metrics
 
 router = Router()
 
@@ -144,6 +146,7 @@ async def poll_options_received(message: Message, state: FSMContext):
     await state.set_state(PollStates.settings)
 
 
+@cached_keyboard
 def get_poll_settings_keyboard(is_anonymous: bool, allows_multiple: bool):
     """Клавиатура настроек опроса"""
     anon_text = "👤 Анонимный: ✅" if is_anonymous else "👤 Анонимный: ❌"
@@ -204,6 +207,7 @@ async def publish_poll(callback: CallbackQuery, state: FSMContext, bot: Bot):
             allows_multiple_answers=data.get('allows_multiple', False)
         )
         
+        metrics.record_publish('poll', 'manual', True)
         await state.clear()
         
         channel = await db.get_channel_by_id(channel_id)
@@ -226,6 +230,7 @@ async def publish_poll(callback: CallbackQuery, state: FSMContext, bot: Bot):
         )
     
     except Exception as e:
+        metrics.record_publish('poll', 'manual', False)
         await callback.message.edit_text(
             f"❌ <b>Ошибка публикации:</b>\n{e}",
             parse_mode="HTML",
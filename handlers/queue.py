@@ -0,0 +1,332 @@
+from html import escape
+
+from aiogram import Router, F
+from aiogram.types import Message, CallbackQuery
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+import database as db
+from utils import recurrence
+from utils.clock import get_moscow_now
+from utils.scheduler import parse_db_time, wake_scheduler
+
+router = Router()
+
+
+class QueueStates(StatesGroup):
+    adding = State()
+    slot_rule = State()
+
+
+def channel_name(channel) -> str:
+    return escape(channel['channel_title'] or channel['channel_username'] or str(channel['channel_id']))
+
+
+MEDIA_NAMES = {'photo': '[Фото]', 'video': '[Видео]', 'document': '[Документ]'}
+
+
+def item_preview(item, length: int = 30) -> str:
+    if item['text']:
+        return item['text'][:length]
+    return MEDIA_NAMES.get(item['media_type'], '[Медиа]')
+
+
+async def own_channel(channel_id: int, user_id: int):
+    """Канал пользователя или None"""
+    channel = await db.get_channel_by_id(channel_id)
+    if not channel or channel['added_by'] != user_id:
+        return None
+    return channel
+
+
+def slot_line(queue) -> str:
+    if not queue:
+        return "⏱ <b>Расписание не задано</b> — посты ждут, пока его не задать"
+    line = f"⏱ <b>Слоты:</b> {recurrence.describe(queue['slot_rule'])}\n"
+    if queue['paused']:
+        return line + "⏸ <b>Очередь на паузе</b>"
+    return line + f"⏭ <b>Следующий:</b> {parse_db_time(queue['next_slot']).strftime('%d.%m в %H:%M')} МСК"
+
+
+async def build_queue_view(channel, after: tuple = None, before: tuple = None):
+    """Страница очереди канала: (текст, клавиатура)"""
+    channel_id = channel['channel_id']
+    items, has_more = await db.get_queue_items_page(channel_id, after=after, before=before)
+    if not items and (after or before):
+        items, has_more = await db.get_queue_items_page(channel_id)
+        after = before = None
+
+    queue = await db.get_channel_queue(channel_id)
+    text = f"📥 <b>Очередь: {channel_name(channel)}</b>\n\n{slot_line(queue)}\n\n"
+    if not items:
+        text += "В очереди пусто — добавьте посты, они будут выходить по одному в каждый слот."
+
+    buttons = []
+    for item in items:
+        buttons.append([InlineKeyboardButton(
+            text=f"📝 {item_preview(item)}", callback_data=f"q_item_{item['id']}"
+        )])
+
+    has_prev = has_more if before else after is not None
+    has_next = True if before else has_more
+    nav = []
+    if has_prev:
+        first = items[0]
+        nav.append(InlineKeyboardButton(
+            text="⬅️", callback_data=f"q_pg_{channel_id}_p_{first['id']}_{first['position']}"
+        ))
+    if has_next:
+        last = items[-1]
+        nav.append(InlineKeyboardButton(
+            text="➡️", callback_data=f"q_pg_{channel_id}_n_{last['id']}_{last['position']}"
+        ))
+    if nav:
+        buttons.append(nav)
+
+    controls = [
+        InlineKeyboardButton(text="➕ Добавить", callback_data=f"q_add_{channel_id}"),
+        InlineKeyboardButton(text="⏱ Расписание", callback_data=f"q_rule_{channel_id}"),
+    ]
+    if queue:
+        controls.append(InlineKeyboardButton(
+            text="▶️ Продолжить" if queue['paused'] else "⏸ Пауза", callback_data=f"q_pause_{channel_id}"
+        ))
+    buttons.append(controls)
+    buttons.append([InlineKeyboardButton(text="⬅️ К каналам", callback_data="q_list")])
+
+    return text, InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+async def build_channels_list(user_id: int):
+    """Каналы пользователя с размером очереди: (текст, клавиатура) или None, если каналов нет"""
+    queues = await db.get_user_channel_queues(user_id)
+    if not queues:
+        return None
+
+    text = "📥 <b>Очереди каналов</b>\n\nЗагрузите пачку постов в очередь — они будут выходить по одному по расписанию.\n"
+    buttons = []
+    for queue in queues:
+        mark = "⏸ " if queue['paused'] else ""
+        buttons.append([InlineKeyboardButton(
+            text=f"{mark}📢 {queue['channel_title'] or queue['channel_username'] or queue['channel_id']} ({queue['items']})",
+            callback_data=f"q_ch_{queue['channel_id']}"
+        )])
+    buttons.append([InlineKeyboardButton(text="🏠 Меню", callback_data="back_to_main")])
+    return text, InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+@router.message(Command("queue"))
+async def show_queues(message: Message, state: FSMContext):
+    await state.clear()
+    page = await build_channels_list(message.from_user.id)
+    if not page:
+        await message.answer("📭 Сначала добавьте канал через «✍️ Создать пост»")
+        return
+    text, keyboard = page
+    await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.callback_query(F.data == "q_list")
+async def back_to_queues(callback: CallbackQuery, state: FSMContext):
+    await state.clear()
+    page = await build_channels_list(callback.from_user.id)
+    if not page:
+        await callback.answer("Каналов нет", show_alert=True)
+        return
+    text, keyboard = page
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
+    await callback.answer()
+
+
+async def show_queue(callback: CallbackQuery, channel_id: int, after: tuple = None, before: tuple = None,
+                     notice: str = None):
+    channel = await own_channel(channel_id, callback.from_user.id)
+    if not channel:
+        await callback.answer("Канал не найден", show_alert=True)
+        return
+    text, keyboard = await build_queue_view(channel, after=after, before=before)
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
+    await callback.answer(notice)
+
+
+@router.callback_query(F.data.startswith("q_ch_"))
+async def queue_selected(callback: CallbackQuery, state: FSMContext):
+    await state.clear()
+    await show_queue(callback, int(callback.data.split("_")[2]))
+
+
+@router.callback_query(F.data.startswith("q_pg_"))
+async def queue_page(callback: CallbackQuery):
+    _, _, channel_id, direction, item_id, position = callback.data.split("_")
+    key = (int(position), int(item_id))
+    if direction == "n":
+        await show_queue(callback, int(channel_id), after=key)
+    else:
+        await show_queue(callback, int(channel_id), before=key)
+
+
+# ============ ПОСТЫ ОЧЕРЕДИ ============
+
+async def own_item(callback: CallbackQuery, item_id: int):
+    item = await db.get_queue_item(item_id)
+    if not item or not await own_channel(item['channel_id'], callback.from_user.id):
+        await callback.answer("Пост не найден", show_alert=True)
+        return None
+    return item
+
+
+@router.callback_query(F.data.startswith("q_item_"))
+async def view_queue_item(callback: CallbackQuery):
+    item = await own_item(callback, int(callback.data.split("_")[2]))
+    if not item:
+        return
+
+    rank = await db.get_queue_item_rank(item['id'])
+    text = f"📝 <b>Пост в очереди — №{rank}</b>\n\n"
+    if item['media_type'] or item['album']:
+        text += f"🖼 {'[Альбом]' if item['album'] else MEDIA_NAMES.get(item['media_type'], '[Медиа]')}\n"
+    if item['buttons']:
+        text += "🔗 С кнопками\n"
+    if item['text']:
+        text += f"\n<i>{escape(item['text'][:300])}{'...' if len(item['text']) > 300 else ''}</i>\n"
+
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text="⏫ Первым", callback_data=f"q_mv_top_{item['id']}"),
+            InlineKeyboardButton(text="⬆️", callback_data=f"q_mv_up_{item['id']}"),
+            InlineKeyboardButton(text="⬇️", callback_data=f"q_mv_down_{item['id']}"),
+        ],
+        [InlineKeyboardButton(text="🗑 Удалить", callback_data=f"q_del_{item['id']}")],
+        [InlineKeyboardButton(text="⬅️ К очереди", callback_data=f"q_ch_{item['channel_id']}")]
+    ])
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("q_mv_"))
+async def move_queue_item(callback: CallbackQuery):
+    _, _, direction, item_id = callback.data.split("_")
+    item = await own_item(callback, int(item_id))
+    if not item:
+        return
+
+    if not await db.move_queue_item(item['id'], direction):
+        await callback.answer("Дальше некуда")
+        return
+    rank = await db.get_queue_item_rank(item['id'])
+    await show_queue(callback, item['channel_id'], notice=f"Теперь №{rank}")
+
+
+@router.callback_query(F.data.startswith("q_del_"))
+async def delete_queue_item(callback: CallbackQuery):
+    item = await own_item(callback, int(callback.data.split("_")[2]))
+    if not item:
+        return
+    await db.delete_queue_item(item['id'])
+    await show_queue(callback, item['channel_id'], notice="🗑 Удалено")
+
+
+# ============ ДОБАВЛЕНИЕ ============
+
+def adding_keyboard(channel_id: int):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="✅ Готово", callback_data=f"q_ch_{channel_id}")]
+    ])
+
+
+@router.callback_query(F.data.startswith("q_add_"))
+async def add_items_start(callback: CallbackQuery, state: FSMContext):
+    channel_id = int(callback.data.split("_")[2])
+    if not await own_channel(channel_id, callback.from_user.id):
+        await callback.answer("Канал не найден", show_alert=True)
+        return
+
+    await state.set_state(QueueStates.adding)
+    await state.update_data(queue_channel=channel_id)
+    await callback.message.edit_text(
+        "➕ <b>Добавление в очередь</b>\n\n"
+        "Отправляйте или пересылайте посты — каждое сообщение (текст, фото, видео, документ) "
+        "станет отдельным постом в конце очереди.",
+        parse_mode="HTML",
+        reply_markup=adding_keyboard(channel_id)
+    )
+    await callback.answer()
+
+
+@router.message(QueueStates.adding, F.text | F.photo | F.video | F.document)
+async def item_received(message: Message, state: FSMContext):
+    channel_id = (await state.get_data())['queue_channel']
+    if message.photo:
+        media_type, media_file_id = 'photo', message.photo[-1].file_id
+    elif message.video:
+        media_type, media_file_id = 'video', message.video.file_id
+    elif message.document:
+        media_type, media_file_id = 'document', message.document.file_id
+    else:
+        media_type = media_file_id = None
+
+    # Пересланный пост - с его форматированием, свой - как есть (теги пишут прямо в тексте)
+    if message.entities or message.caption_entities:
+        text = message.html_text
+    else:
+        text = message.text or message.caption or ''
+    await db.add_queue_item(channel_id, message.from_user.id, text, media_type, media_file_id)
+    await message.answer("📥 В очереди", reply_markup=adding_keyboard(channel_id))
+
+
+# ============ РАСПИСАНИЕ ============
+
+@router.callback_query(F.data.startswith("q_rule_"))
+async def slot_rule_start(callback: CallbackQuery, state: FSMContext):
+    channel_id = int(callback.data.split("_")[2])
+    if not await own_channel(channel_id, callback.from_user.id):
+        await callback.answer("Канал не найден", show_alert=True)
+        return
+
+    await state.set_state(QueueStates.slot_rule)
+    await state.update_data(queue_channel=channel_id)
+    await callback.message.edit_text(
+        f"⏱ <b>Расписание очереди</b>\n\n"
+        f"В каждый слот выходит один пост из начала очереди. Отправьте правило, например:\n{recurrence.EXAMPLES}",
+        parse_mode="HTML",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="⬅️ Назад", callback_data=f"q_ch_{channel_id}")]
+        ])
+    )
+    await callback.answer()
+
+
+@router.message(QueueStates.slot_rule, F.text)
+async def slot_rule_entered(message: Message, state: FSMContext):
+    try:
+        rule = recurrence.parse_rule(message.text)
+    except ValueError as e:
+        await message.answer(f"⚠️ {e}\n\nПримеры:\n{recurrence.EXAMPLES}", parse_mode="HTML")
+        return
+
+    channel_id = (await state.get_data())['queue_channel']
+    tz_name = recurrence.user_timezone(await db.get_user_settings(message.from_user.id))
+    now = get_moscow_now()
+    next_slot = recurrence.next_fire(rule, tz_name, now, now)
+    await db.set_channel_queue_schedule(channel_id, message.from_user.id, rule, tz_name, next_slot)
+    wake_scheduler()
+
+    await state.clear()
+    channel = await db.get_channel_by_id(channel_id)
+    text, keyboard = await build_queue_view(channel)
+    await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.callback_query(F.data.startswith("q_pause_"))
+async def toggle_pause(callback: CallbackQuery):
+    channel_id = int(callback.data.split("_")[2])
+    queue = await db.get_channel_queue(channel_id)
+    if not queue or not await own_channel(channel_id, callback.from_user.id):
+        await callback.answer("Очередь не найдена", show_alert=True)
+        return
+
+    await db.set_channel_queue_paused(channel_id, not queue['paused'])
+    wake_scheduler()
+    await show_queue(callback, channel_id)
@@ -1,26 +1,27 @@
+from html import escape
+
 from aiogram import Router, F, Bot
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.exceptions import TelegramNetworkError
 from datetime import datetime, timedelta
-import pytz
-import json
+import uuid
 
-from keyboards import get_main_menu, parse_url_buttons
+from keyboards import (
+    get_main_menu, compile_url_buttons, stored_buttons_markup, format_button_errors, get_slot_conflict_keyboard
+)
 import database as db
+from perf import json_loads
+from utils.helpers import format_count
+from utils import metrics, recurrence, slots, schedule_calendar
+from utils.clock import get_moscow_now
+from utils.scheduler import wake_scheduler, next_in_series
 
 router = Router()
 
-MOSCOW_TZ = pytz.timezone('Europe/Moscow')
-
-
-def get_moscow_now():
-    """Московское время без tzinfo"""
-    return datetime.now(MOSCOW_TZ).replace(tzinfo=None)
-
-
 def parse_db_time(time_str) -> datetime:
     """Парсинг времени из БД"""
     if isinstance(time_str, datetime):
@@ -30,7 +31,7 @@ def parse_db_time(time_str) -> datetime:
             return datetime.strptime(time_str, fmt)
         except ValueError:
             continue
-    return datetime.now()
+    return get_moscow_now()
 
 
 class ScheduledStates(StatesGroup):
@@ -38,34 +39,34 @@ class ScheduledStates(StatesGroup):
     reschedule = State()
     edit_text = State()
     edit_buttons = State()
+    edit_recurrence = State()
 
 
-@router.message(F.text == "📅 Отложенные")
-@router.message(Command("scheduled"))
-async def show_scheduled_posts(message: Message, state: FSMContext):
-    await state.clear()
+async def build_scheduled_list(user_id: int, after: tuple = None, before: tuple = None):
+    """Страница списка отложенных постов: (текст, клавиатура) или None, если постов нет"""
+    posts, has_more = await db.get_user_scheduled_posts_page(user_id, after=after, before=before)
     
-    posts = await db.get_user_scheduled_posts(message.from_user.id)
+    if not posts and (after or before):
+        # Пост-ключ успели опубликовать или удалить - начинаем сначала
+        posts, has_more = await db.get_user_scheduled_posts_page(user_id)
+        after = before = None
     
     if not posts:
-        await message.answer(
-            "📅 <b>Отложенные посты</b>\n\nУ вас нет запланированных публикаций.",
-            parse_mode="HTML",
-            reply_markup=get_main_menu()
-        )
-        return
+        return None
     
+    total = await db.count_user_scheduled_posts(user_id)
     now = get_moscow_now()
-    text = f"📅 <b>Отложенные посты ({len(posts)})</b>\n"
+    text = f"📅 <b>Отложенные посты ({format_count(total, db.COUNT_CAP)})</b>\n"
     text += f"🕐 Сейчас: {now.strftime('%H:%M')} МСК\n\n"
     
     buttons = []
-    for post in posts[:10]:
+    for post in posts:
         scheduled = parse_db_time(post['scheduled_time'])
         time_str = scheduled.strftime("%d.%m %H:%M")
         preview = (post['text'] or '[Медиа]')[:25] + "..."
+        mark = "🔁" if post['recurrence'] else "📌"
         
-        text += f"📌 {time_str} — {preview}\n"
+        text += f"{mark} {time_str} — {preview}\n"
         
         buttons.append([
             InlineKeyboardButton(
@@ -74,12 +75,143 @@ async def show_scheduled_posts(message: Message, state: FSMContext):
             )
         ])
     
+    has_prev = has_more if before else after is not None
+    has_next = True if before else has_more
+    
+    nav = []
+    if has_prev:
+        first = posts[0]
+        nav.append(InlineKeyboardButton(
+            text="⬅️", callback_data=f"sched_pg_p_{first['id']}_{first['scheduled_time']}"
+        ))
+    if has_next:
+        last = posts[-1]
+        nav.append(InlineKeyboardButton(
+            text="➡️", callback_data=f"sched_pg_n_{last['id']}_{last['scheduled_time']}"
+        ))
+    if nav:
+        buttons.append(nav)
+    
+    buttons.append([
+        InlineKeyboardButton(text="🗓 Календарь", callback_data=f"cal_m_{schedule_calendar.month_key(now)}"),
+        InlineKeyboardButton(text="🧰 Массово", callback_data="bk_menu"),
+        InlineKeyboardButton(text="🔎 Поиск", callback_data="find")
+    ])
     buttons.append([InlineKeyboardButton(text="🏠 Меню", callback_data="back_to_main")])
     
-    await message.answer(text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons))
+    return text, InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+@router.message(F.text == "📅 Отложенные")
+@router.message(Command("scheduled"))
+async def show_scheduled_posts(message: Message, state: FSMContext):
+    await state.clear()
+    
+    page = await build_scheduled_list(message.from_user.id)
+    
+    if not page:
+        await message.answer(
+            "📅 <b>Отложенные посты</b>\n\nУ вас нет запланированных публикаций.",
+            parse_mode="HTML",
+            reply_markup=get_main_menu()
+        )
+        return
+    
+    text, keyboard = page
+    await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
     await state.set_state(ScheduledStates.viewing)
 
 
+# ============ КАЛЕНДАРЬ ============
+
+STATUS_MARKS = {'pending': '⏳', 'publishing': '⏳', 'published': '✅', 'error': '❌'}
+
+
+@router.message(Command("calendar"))
+async def show_calendar(message: Message, state: FSMContext):
+    await state.clear()
+    today = get_moscow_now().date()
+    text, keyboard = await schedule_calendar.month_view(message.from_user.id, today, today)
+    await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.callback_query(F.data == schedule_calendar.NOOP)
+async def calendar_noop(callback: CallbackQuery):
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("cal_m_"))
+async def calendar_month(callback: CallbackQuery):
+    month = schedule_calendar.parse_month(callback.data.split("_")[2])
+    text, keyboard = await schedule_calendar.month_view(callback.from_user.id, month, get_moscow_now().date())
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("cal_w_"))
+async def calendar_week(callback: CallbackQuery):
+    monday = schedule_calendar.parse_day(callback.data.split("_")[2])
+    text, keyboard = await schedule_calendar.week_view(callback.from_user.id, monday, get_moscow_now().date())
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("cal_d_"))
+async def calendar_day(callback: CallbackQuery):
+    """Посты дня: ожидающие открываются как обычно, вышедшие и ошибки - для справки"""
+    day = schedule_calendar.parse_day(callback.data.split("_")[2])
+    start = datetime.combine(day, datetime.min.time())
+    posts = await db.get_user_posts_between(callback.from_user.id, start, start + timedelta(days=1))
+    
+    weekday = schedule_calendar.WEEKDAYS[day.weekday()]
+    text = f"📅 <b>{weekday}, {day.strftime('%d.%m.%Y')}</b>\n\n"
+    if not posts:
+        text += "Постов нет."
+    buttons = []
+    for post in posts:
+        time_str = parse_db_time(post['scheduled_time']).strftime("%H:%M")
+        channel = escape(post['channel_title'] or post['channel_username'] or str(post['channel_id']))
+        preview = (post['text'] or '[Медиа]')[:25]
+        text += f"{STATUS_MARKS.get(post['status'], '•')} {time_str} {channel} — {escape(preview)}\n"
+        if post['status'] == 'pending':
+            buttons.append([InlineKeyboardButton(
+                text=f"📝 {time_str} — {preview[:15]}", callback_data=f"sched_view_{post['id']}"
+            )])
+    if len(posts) == db.PAGE_SIZE * 3:
+        text += "…показаны первые посты дня\n"
+    
+    buttons.append([
+        InlineKeyboardButton(text="🗓 Месяц", callback_data=f"cal_m_{schedule_calendar.month_key(day)}"),
+        InlineKeyboardButton(
+            text="📆 Неделя", callback_data=f"cal_w_{schedule_calendar.day_key(schedule_calendar.week_start(day))}"
+        ),
+    ])
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons))
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("sched_pg_"))
+async def scheduled_page(callback: CallbackQuery):
+    _, _, direction, post_id, scheduled_time = callback.data.split("_", 4)
+    key = (scheduled_time, int(post_id))
+    
+    if direction == "n":
+        page = await build_scheduled_list(callback.from_user.id, after=key)
+    else:
+        page = await build_scheduled_list(callback.from_user.id, before=key)
+    
+    if not page:
+        await callback.message.edit_text(
+            "📅 <b>Отложенные посты</b>\n\nПусто",
+            parse_mode="HTML",
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="🏠 Меню", callback_data="back_to_main")]])
+        )
+    else:
+        text, keyboard = page
+        await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
+    await callback.answer()
+
+
 @router.callback_query(F.data.startswith("sched_view_"))
 async def view_scheduled_post(callback: CallbackQuery, state: FSMContext):
     post_id = int(callback.data.split("_")[-1])
@@ -97,6 +229,8 @@ async def view_scheduled_post(callback: CallbackQuery, state: FSMContext):
     text = f"📅 <b>Отложенный пост</b>\n\n"
     text += f"⏰ <b>Публикация:</b> {scheduled.strftime('%d.%m.%Y в %H:%M')} МСК\n"
     text += f"🕐 <b>Сейчас:</b> {now.strftime('%H:%M')} МСК\n"
+    if post['recurrence']:
+        text += f"🔁 <b>Повтор:</b> {recurrence.describe(post['recurrence'])}\n"
     
     if post['text']:
         text += f"\n📝 <b>Текст:</b>\n<i>{post['text'][:200]}{'...' if len(post['text']) > 200 else ''}</i>\n"
@@ -105,7 +239,7 @@ async def view_scheduled_post(callback: CallbackQuery, state: FSMContext):
     album = None
     if post['album']:
         try:
-            album = json.loads(post['album'])
+            album = json_loads(post['album'])
         except:
             album = None
     
@@ -120,7 +254,10 @@ async def view_scheduled_post(callback: CallbackQuery, state: FSMContext):
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="📤 Опубликовать сейчас", callback_data=f"sched_publish_{post_id}")],
-        [InlineKeyboardButton(text="⏰ Изменить время", callback_data=f"sched_time_{post_id}")],
+        [
+            InlineKeyboardButton(text="⏰ Изменить время", callback_data=f"sched_time_{post_id}"),
+            InlineKeyboardButton(text="🔁 Повтор", callback_data=f"sched_repeat_{post_id}")
+        ],
         [
             InlineKeyboardButton(text="✏️ Текст", callback_data=f"sched_edit_text_{post_id}"),
             InlineKeyboardButton(text="🔗 Кнопки", callback_data=f"sched_edit_btns_{post_id}")
@@ -220,9 +357,9 @@ async def save_buttons(message: Message, state: FSMContext):
         await db.update_scheduled_post_buttons(post_id, None)
         await message.answer("✅ Кнопки удалены!")
     else:
-        keyboard = parse_url_buttons(message.text)
-        if not keyboard:
-            await message.answer("⚠️ Формат: <code>Текст - http://url</code>", parse_mode="HTML")
+        result = compile_url_buttons(message.text)
+        if result.errors or not result.compiled:
+            await message.answer(format_button_errors(result.errors), parse_mode="HTML")
             return
         await db.update_scheduled_post_buttons(post_id, message.text)
         await message.answer("✅ Кнопки обновлены!")
@@ -237,6 +374,84 @@ async def save_buttons(message: Message, state: FSMContext):
     await state.set_state(ScheduledStates.viewing)
 
 
+# ============ ПОВТОР ============
+
+@router.callback_query(F.data.startswith("sched_repeat_"))
+async def edit_recurrence_start(callback: CallbackQuery, state: FSMContext):
+    post_id = int(callback.data.split("_")[-1])
+    post = await db.get_scheduled_post(post_id)
+    
+    if not post or post['status'] != 'pending':
+        await callback.answer("Пост не найден", show_alert=True)
+        return
+    
+    await state.update_data(edit_post_id=post_id)
+    
+    buttons = []
+    current = ""
+    if post['recurrence']:
+        current = f"Сейчас: <b>{recurrence.describe(post['recurrence'])}</b>\n\n"
+        buttons.append([InlineKeyboardButton(text="🚫 Без повтора", callback_data=f"sched_norepeat_{post_id}")])
+    buttons.append([InlineKeyboardButton(text="⬅️ Отмена", callback_data=f"sched_view_{post_id}")])
+    
+    await callback.message.edit_text(
+        f"🔁 <b>Повтор публикации</b>\n\n{current}"
+        f"Отправьте правило, например:\n{recurrence.EXAMPLES}\n\n"
+        f"Ближайшая публикация остаётся в своё время, следующие - по правилу.",
+        parse_mode="HTML",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons)
+    )
+    await state.set_state(ScheduledStates.edit_recurrence)
+    await callback.answer()
+
+
+@router.message(ScheduledStates.edit_recurrence, F.text)
+async def save_recurrence(message: Message, state: FSMContext):
+    data = await state.get_data()
+    post_id = data.get('edit_post_id')
+    
+    if not post_id:
+        await message.answer("Ошибка", reply_markup=get_main_menu())
+        await state.clear()
+        return
+    
+    try:
+        rule = recurrence.parse_rule(message.text)
+    except ValueError as e:
+        await message.answer(f"⚠️ {e}\n\nПримеры:\n{recurrence.EXAMPLES}", parse_mode="HTML")
+        return
+    
+    settings = await db.get_user_settings(message.from_user.id)
+    await db.update_scheduled_post_recurrence(post_id, rule, recurrence.user_timezone(settings))
+    
+    await message.answer(
+        f"✅ <b>Повтор:</b> {recurrence.describe(rule)}",
+        parse_mode="HTML",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="📅 К посту", callback_data=f"sched_view_{post_id}")],
+            [InlineKeyboardButton(text="🏠 Меню", callback_data="back_to_main")]
+        ])
+    )
+    await state.set_state(ScheduledStates.viewing)
+
+
+@router.callback_query(F.data.startswith("sched_norepeat_"))
+async def remove_recurrence(callback: CallbackQuery, state: FSMContext):
+    post_id = int(callback.data.split("_")[-1])
+    await db.update_scheduled_post_recurrence(post_id, None)
+    await state.set_state(ScheduledStates.viewing)
+    
+    await callback.message.edit_text(
+        "🚫 <b>Повтор снят</b>\n\nПост выйдет один раз.",
+        parse_mode="HTML",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="📅 К посту", callback_data=f"sched_view_{post_id}")],
+            [InlineKeyboardButton(text="🏠 Меню", callback_data="back_to_main")]
+        ])
+    )
+    await callback.answer()
+
+
 # ============ ИЗМЕНЕНИЕ ВРЕМЕНИ ============
 
 @router.callback_query(F.data.startswith("sched_time_"))
@@ -263,6 +478,30 @@ async def change_time_menu(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
+async def warn_slot_conflict(message: Message, post_id: int, new_time: datetime, now: datetime,
+                             edit: bool = False) -> bool:
+    """Новое время занято в канале - предупредить и предложить свободное. True, если предупредили"""
+    post = await db.get_scheduled_post(post_id)
+    if not post:
+        return False
+    conflict = await slots.check_slot(post['channel_id'], new_time, now, post['delete_after'], post_id=post_id)
+    if not conflict:
+        return False
+    
+    keyboard = get_slot_conflict_keyboard(
+        conflict.suggestion,
+        use_data=f"resched_at_{post_id}_{slots.encode_time(conflict.suggestion)}" if conflict.suggestion else None,
+        keep_data=f"resched_keep_{post_id}_{slots.encode_time(new_time)}",
+        back_data=f"sched_time_{post_id}"
+    )
+    text = slots.describe_conflict(conflict)
+    if edit:
+        await message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
+    else:
+        await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+    return True
+
+
 @router.callback_query(F.data.startswith("resched_"))
 async def reschedule_action(callback: CallbackQuery, state: FSMContext):
     parts = callback.data.split("_")
@@ -271,7 +510,13 @@ async def reschedule_action(callback: CallbackQuery, state: FSMContext):
     
     now = get_moscow_now()
     
-    if action == "1h":
+    if action in ("at", "keep"):
+        # Ответ на конфликт в расписании канала
+        new_time = slots.decode_time(parts[3])
+        if new_time <= now:
+            await callback.answer("⚠️ Время уже прошло", show_alert=True)
+            return
+    elif action == "1h":
         new_time = now + timedelta(hours=1)
     elif action == "3h":
         new_time = now + timedelta(hours=3)
@@ -299,7 +544,12 @@ async def reschedule_action(callback: CallbackQuery, state: FSMContext):
         await callback.answer("Ошибка")
         return
     
+    if action != "keep" and await warn_slot_conflict(callback.message, post_id, new_time, now, edit=True):
+        await callback.answer()
+        return
+    
     await db.update_scheduled_post_time(post_id, new_time)
+    wake_scheduler()
     
     await callback.message.edit_text(
         f"✅ <b>Время изменено!</b>\n\n📅 {new_time.strftime('%d.%m в %H:%M')} МСК",
@@ -340,7 +590,12 @@ async def reschedule_custom(message: Message, state: FSMContext):
             await message.answer("⚠️ Время в будущем!")
             return
         
+        if await warn_slot_conflict(message, post_id, new_time, now):
+            await state.set_state(ScheduledStates.viewing)
+            return
+        
         await db.update_scheduled_post_time(post_id, new_time)
+        wake_scheduler()
         
         await message.answer(
             f"✅ <b>Время изменено!</b>\n\n📅 {new_time.strftime('%d.%m в %H:%M')} МСК",
@@ -370,14 +625,23 @@ async def publish_now(callback: CallbackQuery, state: FSMContext, bot: Bot):
     settings = await db.get_user_settings(callback.from_user.id)
     parse_mode = settings['formatting'] if settings else 'HTML'
     
-    keyboard = parse_url_buttons(post['buttons']) if post['buttons'] else None
+    keyboard = stored_buttons_markup(post['buttons'], post['buttons_compiled'])
+    kind = metrics.post_type(post['media_type'], post['album'])
+    
+    # Занимаем пост, чтобы планировщик не опубликовал его параллельно
+    token = uuid.uuid4().hex
+    now = get_moscow_now()
+    if not await db.claim_scheduled_post(post_id, token, now, next_in_series(post, now)):
+        await callback.answer("Пост уже публикуется или опубликован", show_alert=True)
+        return
     
+    msg = None
     try:
         # Парсим альбом из JSON если есть
         album = None
         if post['album']:
             try:
-                album = json.loads(post['album'])
+                album = json_loads(post['album'])
             except:
                 album = None
         
@@ -416,8 +680,11 @@ async def publish_now(callback: CallbackQuery, state: FSMContext, bot: Bot):
         else:
             msg = await bot.send_message(post['channel_id'], post['text'], reply_markup=keyboard, parse_mode=parse_mode)
         
-        await db.update_scheduled_post_status(post_id, 'published')
-        await db.add_post_stats(post['channel_id'], msg.message_id)
+        await db.complete_scheduled_post(post_id, token, post['channel_id'], msg.message_id)
+        metrics.record_publish(kind, 'manual', True)
+        if post['recurrence']:
+            # Следующий пост серии мог встать раньше, чем спит планировщик
+            wake_scheduler()
         
         channel = await db.get_channel_by_id(post['channel_id'])
         username = channel['channel_username'] if channel else None
@@ -433,6 +700,15 @@ async def publish_now(callback: CallbackQuery, state: FSMContext, bot: Bot):
         await callback.message.edit_text("✅ Опубликовано!", reply_markup=kb)
     
     except Exception as e:
+        metrics.record_publish(kind, 'manual', False)
+        if msg is not None:
+            # Пост уже в канале, не записан только результат - остаётся «под сомнением»
+            pass
+        elif isinstance(e, TelegramNetworkError):
+            # Таймаут или обрыв: пост мог уйти в канал - в неопубликованные, без автоповтора
+            await db.record_publish_failure(post_id, db.IN_DOUBT, db.IN_DOUBT_ERROR, get_moscow_now())
+        else:
+            await db.release_scheduled_post(post_id, token)
         await callback.message.edit_text(f"❌ Ошибка: {e}", reply_markup=InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="⬅️", callback_data=f"sched_view_{post_id}")]]))
     
     await callback.answer()
@@ -475,9 +751,9 @@ async def delete_post(callback: CallbackQuery):
 
 @router.callback_query(F.data == "sched_back_list")
 async def back_to_list(callback: CallbackQuery, state: FSMContext):
-    posts = await db.get_user_scheduled_posts(callback.from_user.id)
+    page = await build_scheduled_list(callback.from_user.id)
     
-    if not posts:
+    if not page:
         await callback.message.edit_text(
             "📅 <b>Отложенные посты</b>\n\nПусто",
             parse_mode="HTML",
@@ -485,14 +761,6 @@ async def back_to_list(callback: CallbackQuery, state: FSMContext):
         )
         return
     
-    buttons = []
-    for post in posts[:10]:
-        scheduled = parse_db_time(post['scheduled_time'])
-        time_str = scheduled.strftime("%d.%m %H:%M")
-        preview = (post['text'] or '[Медиа]')[:15]
-        buttons.append([InlineKeyboardButton(text=f"📝 {time_str} — {preview}", callback_data=f"sched_view_{post['id']}")])
-    
-    buttons.append([InlineKeyboardButton(text="🏠 Меню", callback_data="back_to_main")])
-    
-    await callback.message.edit_text(f"📅 <b>Отложенные ({len(posts)})</b>", parse_mode="HTML", reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons))
+    text, keyboard = page
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
     await callback.answer()
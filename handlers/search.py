@@ -0,0 +1,137 @@
+from html import escape
+
+from aiogram import Router, F
+from aiogram.types import Message, CallbackQuery
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+import database as db
+from utils.helpers import format_count
+from utils.scheduler import parse_db_time
+
+router = Router()
+
+
+class SearchStates(StatesGroup):
+    query = State()
+
+
+# Области поиска в callback_data: s - отложенные посты, t - шаблоны
+POSTS, TEMPLATES = 's', 't'
+
+PROMPT_TEXT = (
+    "🔎 <b>Поиск</b>\n\n"
+    "Отправьте слова из текста поста или названия шаблона. "
+    "Слова ищутся по началу: «скидки» найдёт и «скидка», и «скидку»."
+)
+PROMPT_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="🏠 Меню", callback_data="back_to_main")]
+])
+EXPIRED_TEXT = "Поиск устарел — начните заново: /find"
+
+
+async def build_results(user_id: int, query: str, scope: str = None, page: int = 0):
+    """Страница результатов: (текст, клавиатура). scope None - где есть совпадения, сначала посты"""
+    posts_total, templates_total = await db.count_search_results(user_id, query)
+    if scope is None:
+        scope = TEMPLATES if templates_total and not posts_total else POSTS
+
+    text = f"🔎 <b>«{escape(query)}»</b>\n\n"
+    if not posts_total and not templates_total:
+        text += "Ничего не нашлось. Попробуйте другие слова или начало слова."
+        return text, InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="🔎 Искать ещё", callback_data="find")],
+            [InlineKeyboardButton(text="🏠 Меню", callback_data="back_to_main")]
+        ])
+
+    buttons = [[
+        InlineKeyboardButton(
+            text=f"{'• ' if scope == POSTS else ''}📅 Посты ({format_count(posts_total, db.COUNT_CAP)})",
+            callback_data=f"fd_{POSTS}_0"
+        ),
+        InlineKeyboardButton(
+            text=f"{'• ' if scope == TEMPLATES else ''}📋 Шаблоны ({format_count(templates_total, db.COUNT_CAP)})",
+            callback_data=f"fd_{TEMPLATES}_0"
+        ),
+    ]]
+
+    if scope == POSTS:
+        posts, has_more = await db.search_scheduled_posts(user_id, query, page)
+        if not posts:
+            text += "Среди отложенных постов совпадений нет."
+        for post in posts:
+            time_str = parse_db_time(post['scheduled_time']).strftime("%d.%m %H:%M")
+            preview = (post['text'] or '[Медиа]')[:25]
+            channel = post['channel_title'] or post['channel_username'] or post['channel_id']
+            text += f"📌 {time_str} — {escape(preview)}… ({escape(str(channel))})\n"
+            buttons.append([InlineKeyboardButton(
+                text=f"📝 {time_str} — {preview[:15]}", callback_data=f"sched_view_{post['id']}"
+            )])
+    else:
+        templates, has_more = await db.search_templates(user_id, query, page)
+        if not templates:
+            text += "Среди шаблонов совпадений нет."
+        for template in templates:
+            preview = (template['text'] or '[Медиа]')[:25]
+            text += f"📋 <b>{escape(template['name'][:30])}</b> — {escape(preview)}…\n"
+            buttons.append([InlineKeyboardButton(
+                text=f"📋 {template['name'][:30]}", callback_data=f"use_template_{template['id']}"
+            )])
+
+    nav = []
+    if page:
+        nav.append(InlineKeyboardButton(text="⬅️", callback_data=f"fd_{scope}_{page - 1}"))
+    if has_more:
+        nav.append(InlineKeyboardButton(text="➡️", callback_data=f"fd_{scope}_{page + 1}"))
+    if nav:
+        buttons.append(nav)
+
+    buttons.append([
+        InlineKeyboardButton(text="🔎 Искать ещё", callback_data="find"),
+        InlineKeyboardButton(text="🏠 Меню", callback_data="back_to_main")
+    ])
+    return text, InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+async def send_results(message: Message, state: FSMContext, query: str):
+    query = query.strip()[:100]
+    await state.set_state(None)
+    await state.update_data(find_query=query)
+    text, keyboard = await build_results(message.from_user.id, query)
+    await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.message(Command("find"))
+async def find_command(message: Message, state: FSMContext, command: CommandObject):
+    if command.args:
+        await send_results(message, state, command.args)
+        return
+    await state.set_state(SearchStates.query)
+    await message.answer(PROMPT_TEXT, parse_mode="HTML", reply_markup=PROMPT_KEYBOARD)
+
+
+@router.callback_query(F.data == "find")
+async def find_prompt(callback: CallbackQuery, state: FSMContext):
+    await state.set_state(SearchStates.query)
+    await callback.message.edit_text(PROMPT_TEXT, parse_mode="HTML", reply_markup=PROMPT_KEYBOARD)
+    await callback.answer()
+
+
+@router.message(SearchStates.query, F.text)
+async def query_entered(message: Message, state: FSMContext):
+    await send_results(message, state, message.text)
+
+
+@router.callback_query(F.data.startswith("fd_"))
+async def results_page(callback: CallbackQuery, state: FSMContext):
+    _, scope, page = callback.data.split("_")
+    query = (await state.get_data()).get('find_query')
+    if not query:
+        await callback.answer(EXPIRED_TEXT, show_alert=True)
+        return
+
+    text, keyboard = await build_results(callback.from_user.id, query, scope, int(page))
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
+    await callback.answer()
@@ -6,7 +6,9 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 from keyboards import get_main_menu, get_cancel_keyboard
+from keyboards.cache import cached_keyboard
 import database as db
+from utils.api_cache import get_chat_member
 
 router = Router()
 
@@ -16,12 +18,14 @@ class SettingsStates(StatesGroup):
     add_channel = State()
 
 
+@cached_keyboard
 def get_settings_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="📢 Управление каналами", callback_data="settings_channels")],
         [InlineKeyboardButton(text="📝 Форматирование", callback_data="settings_formatting")],
         [InlineKeyboardButton(text="🔔 Уведомления", callback_data="settings_notifications")],
         [InlineKeyboardButton(text="🔗 Превью ссылок", callback_data="settings_link_preview")],
+        [InlineKeyboardButton(text="⏳ Просроченные посты", callback_data="settings_catchup")],
         [InlineKeyboardButton(text="🏠 Главное меню", callback_data="back_to_main")]
     ])
 
@@ -119,7 +123,7 @@ async def process_channel_forward(message: Message, state: FSMContext, bot: Bot)
     
     try:
         # Проверяем права бота
-        bot_member = await bot.get_chat_member(chat.id, bot.id)
+        bot_member = await get_chat_member(bot, chat.id, bot.id)
         if bot_member.status not in ['administrator', 'creator']:
             await message.answer(
                 "⚠️ Бот не является администратором канала.\n\n"
@@ -143,7 +147,7 @@ async def process_channel_forward(message: Message, state: FSMContext, bot: Bot)
             return
         
         # Проверяем права пользователя
-        user_member = await bot.get_chat_member(chat.id, message.from_user.id)
+        user_member = await get_chat_member(bot, chat.id, message.from_user.id)
         if user_member.status not in ['creator', 'administrator']:
             await message.answer(
                 "⚠️ Вы не являетесь администратором этого канала.",
@@ -335,3 +339,63 @@ async def toggle_link_preview(callback: CallbackQuery):
     await db.update_user_setting(callback.from_user.id, 'link_preview', value)
     await callback.answer("✅ Сохранено!")
     await link_preview_settings(callback)
+
+
+# ============ ПРОСРОЧЕННЫЕ ПОСТЫ ============
+
+CATCHUP_LIMITS = [(0, "Без лимита"), (60, "1 ч"), (360, "6 ч"), (1440, "24 ч")]
+
+
+@router.callback_query(F.data == "settings_catchup")
+async def catchup_settings(callback: CallbackQuery):
+    settings = await db.get_user_settings(callback.from_user.id)
+    limit = settings['catchup_limit'] or 0
+    action = settings['catchup_action'] or 'skip'
+    limit_name = dict(CATCHUP_LIMITS).get(limit, f"{limit} мин")
+    action_name = "перенести на то же время завтра" if action == 'retime' else "пропустить (в /failed)"
+    
+    await callback.message.edit_text(
+        f"⏳ <b>Просроченные посты</b>\n\n"
+        f"Если бот был недоступен, пропущенные посты публикуются после запуска.\n\n"
+        f"Лимит опоздания: <b>{limit_name}</b>\n"
+        f"Опоздавшие больше лимита: <b>{action_name}</b>",
+        parse_mode="HTML",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [
+                InlineKeyboardButton(
+                    text=f"{'✅ ' if minutes == limit else ''}{name}",
+                    callback_data=f"catchup_limit_{minutes}"
+                )
+                for minutes, name in CATCHUP_LIMITS
+            ],
+            [
+                InlineKeyboardButton(
+                    text=f"{'✅ ' if action == 'skip' else ''}⏭ Пропускать", callback_data="catchup_action_skip"
+                ),
+                InlineKeyboardButton(
+                    text=f"{'✅ ' if action == 'retime' else ''}🕐 Переносить", callback_data="catchup_action_retime"
+                ),
+            ],
+            [InlineKeyboardButton(text="⬅️ Назад", callback_data="settings_back")]
+        ])
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("catchup_limit_"))
+async def set_catchup_limit(callback: CallbackQuery):
+    value = int(callback.data.replace("catchup_limit_", ""))
+    await db.update_user_setting(callback.from_user.id, 'catchup_limit', value or None)
+    await callback.answer("✅ Сохранено!")
+    await catchup_settings(callback)
+
+
+@router.callback_query(F.data.startswith("catchup_action_"))
+async def set_catchup_action(callback: CallbackQuery):
+    value = callback.data.replace("catchup_action_", "")
+    if value not in ('skip', 'retime'):
+        await callback.answer()
+        return
+    await db.update_user_setting(callback.from_user.id, 'catchup_action', value)
+    await callback.answer("✅ Сохранено!")
+    await catchup_settings(callback)
@@ -81,6 +81,11 @@ async def cmd_help(message: Message):
 /start - Главное меню
 /newpost - Создать пост
 /scheduled - Отложенные посты
+/calendar - Календарь постов
+/bulk - Массовые действия с отложенными
+/find - Поиск по постам и шаблонам
+/failed - Неопубликованные посты
+/queue - Очереди постов каналов
 /settings - Настройки
 /help - Эта справка
 
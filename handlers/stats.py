@@ -3,13 +3,17 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.exceptions import TelegramBadRequest
+from datetime import datetime
+import time
 
 from keyboards import get_main_menu, get_channels_keyboard
 import database as db
+from utils import api_cache
+from utils.clock import MOSCOW_TZ
 
 router = Router()
 
-
 @router.message(F.text.in_(["📊 Статистика", "📈 Статистика"]))
 @router.message(Command("stats"))
 async def show_stats(message: Message, state: FSMContext, bot: Bot):
@@ -50,34 +54,66 @@ async def show_stats(message: Message, state: FSMContext, bot: Bot):
         )
 
 
-async def show_channel_stats(message: Message, channel_id: int, bot: Bot):
-    """Показать статистику канала"""
-    try:
-        chat = await bot.get_chat(channel_id)
-        member_count = await bot.get_chat_member_count(channel_id)
-        
-        channel = await db.get_channel_by_id(channel_id)
-        title = channel['channel_title'] if channel else chat.title
+def format_delta(value) -> str:
+    """Прирост со знаком"""
+    if value is None:
+        return "—"
+    return f"{value:+,}"
+
+
+async def render_channel_stats(bot: Bot, channel_id: int, footer: str = ""):
+    """Текст и клавиатура статистики канала (по данным сборщика, без живых запросов)"""
+    channel = await db.get_channel_by_id(channel_id)
+    if channel:
+        title = channel['channel_title'] or channel['channel_username'] or str(channel_id)
+        username = f"@{channel['channel_username']}" if channel['channel_username'] else f"ID: {channel_id}"
+    else:
+        chat = await api_cache.get_chat(bot, channel_id)
+        title = chat.title
         username = f"@{chat.username}" if chat.username else f"ID: {channel_id}"
-        
-        # Базовая статистика
-        text = f"""📊 <b>Статистика канала</b>
+    
+    growth = await db.get_member_growth(channel_id, int(time.time()))
+    
+    if growth:
+        member_count = growth['members']
+    else:
+        # Сборщик ещё не успел сделать замер
+        member_count = await api_cache.get_chat_member_count(bot, channel_id)
+    
+    text = f"""📊 <b>Статистика канала</b>
 
 📢 <b>{title}</b>
 {username}
 
-👥 <b>Подписчиков:</b> {member_count:,}
+👥 <b>Подписчиков:</b> {member_count:,}"""
+    
+    if growth:
+        sampled_at = datetime.fromtimestamp(growth['sampled_at'], MOSCOW_TZ)
+        text += (
+            f"\n\n📈 <b>Прирост:</b>\n"
+            f"• за сутки: {format_delta(growth['day'])}\n"
+            f"• за неделю: {format_delta(growth['week'])}\n"
+            f"• за месяц: {format_delta(growth['month'])}\n\n"
+            f"🕐 Данные на {sampled_at.strftime('%H:%M')} МСК"
+        )
+    
+    if footer:
+        text += f"\n\n<i>{footer}</i>"
+    
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🔄 Обновить", callback_data=f"refresh_stats_{channel_id}")],
+        [InlineKeyboardButton(text="⬅️ Назад", callback_data="back_to_main")]
+    ])
+    return text, keyboard
 
-<i>📈 Для полной статистики используйте @TGStat_Bot</i>"""
-        
-        await message.answer(
-            text,
-            parse_mode="HTML",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="🔄 Обновить", callback_data=f"refresh_stats_{channel_id}")],
-                [InlineKeyboardButton(text="⬅️ Назад", callback_data="back_to_main")]
-            ])
+
+async def show_channel_stats(message: Message, channel_id: int, bot: Bot):
+    """Показать статистику канала"""
+    try:
+        text, keyboard = await render_channel_stats(
+            bot, channel_id, footer="📈 Для полной статистики используйте @TGStat_Bot"
         )
+        await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
     
     except Exception as e:
         await message.answer(
@@ -93,28 +129,8 @@ async def stats_channel_selected(callback: CallbackQuery, bot: Bot):
     channel_id = int(callback.data.split("_")[-1])
     
     try:
-        chat = await bot.get_chat(channel_id)
-        member_count = await bot.get_chat_member_count(channel_id)
-        
-        channel = await db.get_channel_by_id(channel_id)
-        title = channel['channel_title'] if channel else chat.title
-        username = f"@{chat.username}" if chat.username else f"ID: {channel_id}"
-        
-        text = f"""📊 <b>Статистика канала</b>
-
-📢 <b>{title}</b>
-{username}
-
-👥 <b>Подписчиков:</b> {member_count:,}"""
-        
-        await callback.message.edit_text(
-            text,
-            parse_mode="HTML",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="🔄 Обновить", callback_data=f"refresh_stats_{channel_id}")],
-                [InlineKeyboardButton(text="⬅️ Назад", callback_data="back_to_main")]
-            ])
-        )
+        text, keyboard = await render_channel_stats(bot, channel_id)
+        await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
     
     except Exception as e:
         await callback.answer(f"Ошибка: {e}", show_alert=True)
@@ -126,31 +142,15 @@ async def refresh_stats(callback: CallbackQuery, bot: Bot):
     channel_id = int(callback.data.split("_")[-1])
     
     try:
-        chat = await bot.get_chat(channel_id)
-        member_count = await bot.get_chat_member_count(channel_id)
-        
-        channel = await db.get_channel_by_id(channel_id)
-        title = channel['channel_title'] if channel else chat.title
-        username = f"@{chat.username}" if chat.username else f"ID: {channel_id}"
-        
-        text = f"""📊 <b>Статистика канала</b>
-
-📢 <b>{title}</b>
-{username}
-
-👥 <b>Подписчиков:</b> {member_count:,}
-
-<i>🔄 Обновлено</i>"""
-        
-        await callback.message.edit_text(
-            text,
-            parse_mode="HTML",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="🔄 Обновить", callback_data=f"refresh_stats_{channel_id}")],
-                [InlineKeyboardButton(text="⬅️ Назад", callback_data="back_to_main")]
-            ])
-        )
+        text, keyboard = await render_channel_stats(bot, channel_id, footer="🔄 Обновлено")
+        await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
         await callback.answer("Статистика обновлена!")
     
+    except TelegramBadRequest as e:
+        if "message is not modified" in str(e):
+            await callback.answer("Статистика актуальна")
+        else:
+            await callback.answer(f"Ошибка: {e}", show_alert=True)
+    
     except Exception as e:
         await callback.answer(f"Ошибка: {e}", show_alert=True)
@@ -6,6 +6,8 @@ from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 from keyboards import get_main_menu, get_cancel_keyboard, parse_url_buttons
 import database as db
+from utils import metrics
+from utils.helpers import format_count
 
 router = Router()
 
@@ -16,40 +18,83 @@ class TemplateStates(StatesGroup):
     viewing = State()
 
 
-@router.message(F.text == "📋 Шаблоны")
-async def show_templates(message: Message, state: FSMContext):
-    """Показать шаблоны"""
-    await state.clear()
+async def build_templates_list(user_id: int, after: tuple = None, before: tuple = None):
+    """Страница списка шаблонов: (текст, клавиатура)"""
+    templates, has_more = await db.get_user_templates_page(user_id, after=after, before=before)
     
-    templates = await db.get_user_templates(message.from_user.id)
+    if not templates and (after or before):
+        # Шаблон-ключ удалён - начинаем сначала
+        templates, has_more = await db.get_user_templates_page(user_id)
+        after = before = None
+    
+    total = await db.count_user_templates(user_id) if templates else 0
     
     buttons = [
-        [InlineKeyboardButton(text="➕ Создать шаблон", callback_data="create_template")]
+        [
+            InlineKeyboardButton(text="➕ Создать шаблон", callback_data="create_template"),
+            InlineKeyboardButton(text="🔎 Поиск", callback_data="find")
+        ]
     ]
     
-    if templates:
-        for tpl in templates:
-            name = tpl['name'][:30]
-            buttons.append([
-                InlineKeyboardButton(text=f"📋 {name}", callback_data=f"use_template_{tpl['id']}"),
-                InlineKeyboardButton(text="🗑", callback_data=f"delete_template_{tpl['id']}")
-            ])
+    for tpl in templates:
+        name = tpl['name'][:30]
+        buttons.append([
+            InlineKeyboardButton(text=f"📋 {name}", callback_data=f"use_template_{tpl['id']}"),
+            InlineKeyboardButton(text="🗑", callback_data=f"delete_template_{tpl['id']}")
+        ])
+    
+    has_prev = has_more if before else after is not None
+    has_next = True if before else has_more
+    
+    nav = []
+    if templates and has_prev:
+        first = templates[0]
+        nav.append(InlineKeyboardButton(
+            text="⬅️", callback_data=f"tpl_pg_p_{first['id']}_{first['created_at']}"
+        ))
+    if templates and has_next:
+        last = templates[-1]
+        nav.append(InlineKeyboardButton(
+            text="➡️", callback_data=f"tpl_pg_n_{last['id']}_{last['created_at']}"
+        ))
+    if nav:
+        buttons.append(nav)
     
     buttons.append([
         InlineKeyboardButton(text="⬅️ Назад", callback_data="back_to_main")
     ])
     
-    text = f"📋 <b>Шаблоны постов ({len(templates)})</b>\n\n"
+    text = f"📋 <b>Шаблоны постов ({format_count(total, db.COUNT_CAP)})</b>\n\n"
     if templates:
         text += "Выберите шаблон для использования или создайте новый:"
     else:
         text += "У вас пока нет шаблонов.\nСоздайте первый шаблон!"
     
-    await message.answer(
-        text,
-        parse_mode="HTML",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons)
-    )
+    return text, InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+@router.message(F.text == "📋 Шаблоны")
+async def show_templates(message: Message, state: FSMContext):
+    """Показать шаблоны"""
+    await state.clear()
+    
+    text, keyboard = await build_templates_list(message.from_user.id)
+    await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.callback_query(F.data.startswith("tpl_pg_"))
+async def templates_page(callback: CallbackQuery):
+    """Листание списка шаблонов"""
+    _, _, direction, template_id, created_at = callback.data.split("_", 4)
+    key = (created_at, int(template_id))
+    
+    if direction == "n":
+        text, keyboard = await build_templates_list(callback.from_user.id, after=key)
+    else:
+        text, keyboard = await build_templates_list(callback.from_user.id, before=key)
+    
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
+    await callback.answer()
 
 
 @router.callback_query(F.data == "create_template")
@@ -277,6 +322,7 @@ async def publish_from_template(callback: CallbackQuery, state: FSMContext, bot:
             )
         
         await db.add_post_stats(channel_id, msg.message_id)
+        metrics.record_publish(metrics.post_type(media_type, None), 'template', True)
         await state.clear()
         
         channel = await db.get_channel_by_id(channel_id)
@@ -300,6 +346,7 @@ async def publish_from_template(callback: CallbackQuery, state: FSMContext, bot:
         )
     
     except Exception as e:
+        metrics.record_publish(metrics.post_type(media_type, None), 'template', False)
         await callback.message.edit_text(
             f"❌ <b>Ошибка публикации:</b>\n{e}",
             parse_mode="HTML"
@@ -359,26 +406,8 @@ async def confirm_delete_template(callback: CallbackQuery):
     await callback.answer("Шаблон удалён!")
     
     # Показываем обновлённый список
-    templates = await db.get_user_templates(callback.from_user.id)
-    
-    buttons = [
-        [InlineKeyboardButton(text="➕ Создать шаблон", callback_data="create_template")]
-    ]
-    
-    for tpl in templates:
-        name = tpl['name'][:30]
-        buttons.append([
-            InlineKeyboardButton(text=f"📋 {name}", callback_data=f"use_template_{tpl['id']}"),
-            InlineKeyboardButton(text="🗑", callback_data=f"delete_template_{tpl['id']}")
-        ])
-    
-    buttons.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="back_to_main")])
-    
-    await callback.message.edit_text(
-        f"📋 <b>Шаблоны ({len(templates)})</b>",
-        parse_mode="HTML",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons)
-    )
+    text, keyboard = await build_templates_list(callback.from_user.id)
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
 
 
 @router.callback_query(F.data == "back_to_templates")
@@ -386,24 +415,6 @@ async def back_to_templates(callback: CallbackQuery, state: FSMContext):
     """Вернуться к списку шаблонов"""
     await state.clear()
     
-    templates = await db.get_user_templates(callback.from_user.id)
-    
-    buttons = [
-        [InlineKeyboardButton(text="➕ Создать шаблон", callback_data="create_template")]
-    ]
-    
-    for tpl in templates:
-        name = tpl['name'][:30]
-        buttons.append([
-            InlineKeyboardButton(text=f"📋 {name}", callback_data=f"use_template_{tpl['id']}"),
-            InlineKeyboardButton(text="🗑", callback_data=f"delete_template_{tpl['id']}")
-        ])
-    
-    buttons.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="back_to_main")])
-    
-    await callback.message.edit_text(
-        f"📋 <b>Шаблоны ({len(templates)})</b>",
-        parse_mode="HTML",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons)
-    )
+    text, keyboard = await build_templates_list(callback.from_user.id)
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
     await callback.answer()
@@ -9,6 +9,13 @@ from .inline import (
     get_view_post_keyboard,
     get_settings_keyboard,
     get_scheduled_post_keyboard,
-    parse_url_buttons,
+    get_slot_conflict_keyboard,
     get_back_inline_keyboard
 )
+from .buttons import (
+    compile_url_buttons,
+    buttons_markup,
+    stored_buttons_markup,
+    parse_url_buttons,
+    format_button_errors
+)
@@ -0,0 +1,120 @@
+"""
+Компилятор URL-кнопок.
+
+Текст кнопок разбирается один раз при вводе в компактную JSON-форму
+[[["Текст", "url"], ...], ...], которая хранится в БД рядом с текстом.
+Публикация строит клавиатуру прямо из неё через LRU-кэш.
+"""
+import html
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from perf import json_dumps, json_loads
+from .cache import freeze
+
+MAX_BUTTONS_IN_ROW = 3
+ALLOWED_SCHEMES = ('http://', 'https://', 'tg://')
+
+
+class ButtonError(NamedTuple):
+    line: int
+    text: str
+    reason: str
+
+
+class CompiledButtons(NamedTuple):
+    compiled: Optional[str]
+    errors: Tuple[ButtonError, ...]
+
+
+@lru_cache(maxsize=512)
+def compile_url_buttons(text: str) -> CompiledButtons:
+    """
+    Разобрать текст кнопок
+    Формат: Кнопка - http://url
+    Разделитель | для горизонтального размещения
+
+    compiled собирается по старым правилам разбора: в ряду первые
+    MAX_BUTTONS_IN_ROW кнопок, некорректные кнопки пропускаются - так
+    сохранённые раньше посты публикуются с теми же кнопками. errors - строгая
+    проверка для редактора: там такой ввод не принимается
+    """
+    if not text or not text.strip():
+        return CompiledButtons(None, ())
+
+    rows = []
+    errors = []
+
+    for line_no, line in enumerate(text.strip().split('\n'), start=1):
+        if not line.strip():
+            continue
+
+        parts = line.split('|')
+        reason = None
+        if len(parts) > MAX_BUTTONS_IN_ROW:
+            reason = f"больше {MAX_BUTTONS_IN_ROW} кнопок в ряду"
+
+        row = []
+        for part in parts[:MAX_BUTTONS_IN_ROW]:
+            part = part.strip()
+            if ' - ' not in part:
+                reason = reason or "нет разделителя « - »"
+                continue
+
+            btn_text, btn_url = (p.strip() for p in part.split(' - ', 1))
+            if not btn_text:
+                reason = reason or "пустое название кнопки"
+                continue
+            if not btn_url.startswith(ALLOWED_SCHEMES):
+                reason = reason or "ссылка должна начинаться с http://, https:// или tg://"
+                continue
+
+            row.append([btn_text, btn_url])
+
+        if reason:
+            errors.append(ButtonError(line_no, line, reason))
+        if row:
+            rows.append(row)
+
+    compiled = json_dumps(rows) if rows else None
+    return CompiledButtons(compiled, tuple(errors))
+
+
+@lru_cache(maxsize=512)
+def buttons_markup(compiled: str) -> Optional[InlineKeyboardMarkup]:
+    """Клавиатура из скомпилированной формы (кэш по содержимому)"""
+    rows = json_loads(compiled)
+    if not rows:
+        return None
+    return freeze(InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=btn_text, url=btn_url) for btn_text, btn_url in row]
+        for row in rows
+    ]))
+
+
+def stored_buttons_markup(buttons: Optional[str], compiled: Optional[str] = None) -> Optional[InlineKeyboardMarkup]:
+    """Клавиатура для сохранённого поста: без разбора текста, если есть скомпилированная форма"""
+    if compiled:
+        return buttons_markup(compiled)
+    if buttons:
+        return parse_url_buttons(buttons)
+    return None
+
+
+def parse_url_buttons(text: str) -> Optional[InlineKeyboardMarkup]:
+    """Парсинг URL-кнопок из текста (некорректные строки пропускаются)"""
+    if not text:
+        return None
+    compiled = compile_url_buttons(text).compiled
+    return buttons_markup(compiled) if compiled else None
+
+
+def format_button_errors(errors) -> str:
+    """Сообщение об ошибках в кнопках для пользователя"""
+    lines = ["⚠️ <b>Ошибки в кнопках:</b>\n"]
+    for error in errors[:10]:
+        lines.append(f"Строка {error.line}: {error.reason}\n<code>{html.escape(error.text.strip()[:60])}</code>")
+    lines.append("\nФормат: <code>Кнопка - http://url</code>\nРазделитель <code>|</code> для ряда (до 3 кнопок)")
+    return "\n".join(lines)
@@ -0,0 +1,81 @@
+"""
+Кэш клавиатур.
+
+Статичные клавиатуры собираются один раз при импорте, параметризованные -
+один раз на каждую комбинацию аргументов. Готовая клавиатура хранится
+вместе со своим JSON, поэтому сессия бота (utils/session.py) не сериализует
+её заново при каждой отправке.
+"""
+import functools
+import inspect
+
+from aiogram.types import InlineKeyboardMarkup, ReplyKeyboardMarkup
+
+from perf import json_dumps
+
+
+class FrozenMarkup:
+    """Неизменяемая клавиатура с заранее сериализованным JSON"""
+
+    __slots__ = ()
+
+    @property
+    def serialized(self) -> str:
+        return self.__dict__['_serialized']
+
+
+class FrozenInlineKeyboardMarkup(FrozenMarkup, InlineKeyboardMarkup):
+    model_config = {**InlineKeyboardMarkup.model_config, 'frozen': True}
+
+
+class FrozenReplyKeyboardMarkup(FrozenMarkup, ReplyKeyboardMarkup):
+    model_config = {**ReplyKeyboardMarkup.model_config, 'frozen': True}
+
+
+_FROZEN_TYPES = {
+    InlineKeyboardMarkup: FrozenInlineKeyboardMarkup,
+    ReplyKeyboardMarkup: FrozenReplyKeyboardMarkup,
+}
+
+
+def _strip_none(value):
+    """Убрать пустые поля так же, как это делает сессия aiogram"""
+    if isinstance(value, dict):
+        return {k: _strip_none(v) for k, v in value.items() if v is not None}
+    if isinstance(value, list):
+        return [_strip_none(v) for v in value if v is not None]
+    return value
+
+
+def freeze(markup):
+    """Заморозить клавиатуру и сохранить её JSON"""
+    if markup is None or isinstance(markup, FrozenMarkup):
+        return markup
+    frozen_cls = _FROZEN_TYPES[type(markup)]
+    frozen = frozen_cls.model_validate(markup.model_dump(warnings=False))
+    payload = _strip_none(frozen.model_dump(mode='json', warnings=False))
+    # Модель заморожена, поэтому пишем в __dict__ напрямую
+    frozen.__dict__['_serialized'] = json_dumps(payload)
+    return frozen
+
+
+def cached_keyboard(func):
+    """
+    Мемоизация функции, возвращающей клавиатуру.
+    Функции без аргументов вызываются сразу - клавиатура готова к импорту.
+    """
+    @functools.lru_cache(maxsize=None)
+    def build(*args, **kwargs):
+        return freeze(func(*args, **kwargs))
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return build(*args, **kwargs)
+
+    wrapper.cache_info = build.cache_info
+    wrapper.cache_clear = build.cache_clear
+
+    if not inspect.signature(func).parameters:
+        build()
+
+    return wrapper
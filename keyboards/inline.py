@@ -1,6 +1,8 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from typing import List, Optional
 
+from .cache import cached_keyboard
+
 
 def get_channels_keyboard(channels: list, action: str = "select"):
     """Клавиатура выбора канала"""
@@ -22,6 +24,7 @@ def get_channels_keyboard(channels: list, action: str = "select"):
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@cached_keyboard
 def get_post_constructor_keyboard(has_text: bool = False, has_media: bool = False, 
                                    has_buttons: bool = False):
     """Клавиатура конструктора поста"""
@@ -67,6 +70,7 @@ def get_post_constructor_keyboard(has_text: bool = False, has_media: bool = Fals
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@cached_keyboard
 def get_publish_keyboard():
     """Клавиатура публикации"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -76,6 +80,12 @@ def get_publish_keyboard():
         [
             InlineKeyboardButton(text="⏰ Отложить", callback_data="schedule_post")
         ],
+        [
+            InlineKeyboardButton(text="🔁 Повтор", callback_data="set_recurrence")
+        ],
+        [
+            InlineKeyboardButton(text="📥 В очередь канала", callback_data="add_to_queue")
+        ],
         [
             InlineKeyboardButton(text="⏱ Таймер удаления", callback_data="set_delete_timer")
         ],
@@ -88,6 +98,7 @@ def get_publish_keyboard():
     ])
 
 
+@cached_keyboard
 def get_confirm_publish_keyboard():
     """Подтверждение публикации"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -100,6 +111,7 @@ def get_confirm_publish_keyboard():
     ])
 
 
+@cached_keyboard
 def get_schedule_keyboard():
     """Клавиатура выбора времени отложенной публикации"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -120,6 +132,7 @@ def get_schedule_keyboard():
     ])
 
 
+@cached_keyboard
 def get_delete_timer_keyboard():
     """Клавиатура выбора таймера удаления"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -216,45 +229,19 @@ def get_scheduled_post_keyboard(post_id: int):
     ])
 
 
-def parse_url_buttons(text: str) -> Optional[InlineKeyboardMarkup]:
-    """
-    Парсинг URL-кнопок из текста
-    Формат: Кнопка - http://url
-    Разделитель | для горизонтального размещения
-    """
-    if not text or not text.strip():
-        return None
-    
-    keyboard = []
-    lines = text.strip().split('\n')
-    
-    for line in lines:
-        if not line.strip():
-            continue
-        
-        row = []
-        parts = line.split('|')
-        
-        for part in parts[:3]:  # Максимум 3 кнопки в ряд
-            part = part.strip()
-            if ' - ' in part:
-                btn_parts = part.split(' - ', 1)
-                if len(btn_parts) == 2:
-                    btn_text = btn_parts[0].strip()
-                    btn_url = btn_parts[1].strip()
-                    if btn_text and btn_url:
-                        # Проверяем URL
-                        if btn_url.startswith(('http://', 'https://', 'tg://')):
-                            row.append(InlineKeyboardButton(text=btn_text, url=btn_url))
-        
-        if row:
-            keyboard.append(row)
-    
-    if keyboard:
-        return InlineKeyboardMarkup(inline_keyboard=keyboard)
-    return None
+def get_slot_conflict_keyboard(suggestion, use_data: str, keep_data: str, back_data: str):
+    """Конфликт в расписании канала: взять свободное время, оставить своё или назад"""
+    buttons = []
+    if suggestion:
+        buttons.append([
+            InlineKeyboardButton(text=f"🕐 Взять {suggestion.strftime('%d.%m %H:%M')}", callback_data=use_data)
+        ])
+    buttons.append([InlineKeyboardButton(text="✅ Оставить моё время", callback_data=keep_data)])
+    buttons.append([InlineKeyboardButton(text="⬅️ Назад", callback_data=back_data)])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@cached_keyboard
 def get_back_inline_keyboard(callback_data: str = "back_to_main"):
     """Простая кнопка назад"""
     return InlineKeyboardMarkup(inline_keyboard=[
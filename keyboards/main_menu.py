@@ -1,6 +1,9 @@
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 
+from .cache import cached_keyboard
 
+
+@cached_keyboard
 def get_main_menu():
     """Главное меню"""
     keyboard = ReplyKeyboardMarkup(
@@ -24,6 +27,7 @@ def get_main_menu():
     return keyboard
 
 
+@cached_keyboard
 def get_cancel_keyboard():
     """Клавиатура с кнопкой отмены"""
     keyboard = ReplyKeyboardMarkup(
@@ -35,6 +39,7 @@ def get_cancel_keyboard():
     return keyboard
 
 
+@cached_keyboard
 def get_back_keyboard():
     """Клавиатура с кнопкой назад"""
     keyboard = ReplyKeyboardMarkup(
@@ -0,0 +1,73 @@
+"""
+Профиль производительности (PERF_PROFILE=1).
+
+uvloop вместо стандартного цикла событий и orjson для JSON сессии бота,
+альбомов и кнопок. Оба пакета необязательные (requirements-perf.txt):
+если профиль выключен или пакета нет, всё работает на стандартной
+библиотеке.
+"""
+import asyncio
+import json
+import logging
+
+from config import PERF_PROFILE
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+logger = logging.getLogger(__name__)
+
+FAST_JSON = PERF_PROFILE and orjson is not None
+
+
+if FAST_JSON:
+    def json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+
+    json_loads = orjson.loads
+else:
+    def json_dumps(obj) -> str:
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+    json_loads = json.loads
+
+
+def install_event_loop() -> str:
+    """
+    Выбрать цикл событий до asyncio.run(): uvloop, если профиль включён
+    и пакет есть, иначе стандартный (aiogram сам ставит uvloop при импорте,
+    если тот установлен, - без профиля возвращаем обычный цикл)
+    """
+    if PERF_PROFILE and uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        return 'uvloop'
+    asyncio.set_event_loop_policy(None)
+    return 'asyncio'
+
+
+def profile() -> dict:
+    """Что реально включено - для логов и отчётов бенчмарков"""
+    loop = 'uvloop' if uvloop is not None and isinstance(
+        asyncio.get_event_loop_policy(), uvloop.EventLoopPolicy
+    ) else 'asyncio'
+    return {
+        'enabled': PERF_PROFILE,
+        'loop': loop,
+        'json': 'orjson' if FAST_JSON else 'json',
+    }
+
+
+def log_profile():
+    if not PERF_PROFILE:
+        return
+    missing = [name for name, module in (('uvloop', uvloop), ('orjson', orjson)) if module is None]
+    if missing:
+        logger.warning(f"PERF_PROFILE: not installed {', '.join(missing)}, using stdlib (pip install -r requirements-perf.txt)")
+    logger.info(f"Performance profile: {profile()}")
@@ -1,3 +1,5 @@
 from .scheduler import start_scheduler
+from .collector import start_collector
+from .monitor import start_monitor
 
-__all__ = ['start_scheduler']
+__all__ = ['start_scheduler', 'start_collector', 'start_monitor']
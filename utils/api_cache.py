@@ -0,0 +1,107 @@
+"""
+Кэш ответов Bot API для методов только на чтение:
+get_chat, get_chat_member_count, get_chat_member.
+
+Одинаковые параллельные запросы объединяются в один, ответы живут TTL
+секунд и сбрасываются по обновлениям my_chat_member / chat_member.
+Записей не больше MAX_ENTRIES: давно не читавшиеся вытесняются первыми.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+
+from aiogram import Bot
+
+CHAT_TTL = 300
+MEMBER_COUNT_TTL = 60
+CHAT_MEMBER_TTL = 120
+MAX_ENTRIES = 10000
+
+
+class TTLCache:
+    """TTL-кэш с объединением одновременных запросов"""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._values = OrderedDict()
+        self._inflight = {}
+        # Счётчики сбросов - только для чатов, по которым идёт запрос
+        self._generations = {}
+
+    async def get(self, key, ttl: float, fetch):
+        entry = self._values.get(key)
+        if entry:
+            if entry[0] > time.monotonic():
+                self._values.move_to_end(key)
+                return entry[1]
+            del self._values[key]
+
+        task = self._inflight.get(key)
+        if task is None:
+            generation = self._generations.get(key[1], 0)
+            task = asyncio.ensure_future(self._fetch(key, ttl, fetch, generation))
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key, ttl: float, fetch, generation: int):
+        try:
+            value = await fetch()
+            # Если канал сбросили во время запроса - ответ уже устарел
+            if self._generations.get(key[1], 0) == generation:
+                self._store(key, (time.monotonic() + ttl, value))
+            return value
+        finally:
+            self._inflight.pop(key, None)
+            if not self._has_inflight(key[1]):
+                self._generations.pop(key[1], None)
+
+    def _store(self, key, entry):
+        self._values[key] = entry
+        self._values.move_to_end(key)
+        while len(self._values) > self.max_entries:
+            self._values.popitem(last=False)
+
+    def _has_inflight(self, chat_id: int) -> bool:
+        return any(key[1] == chat_id for key in self._inflight)
+
+    def invalidate_chat(self, chat_id: int):
+        """Сбросить всё, что закэшировано по чату"""
+        # Счётчик нужен только запросам в полёте: их ответ не попадёт в кэш
+        if self._has_inflight(chat_id):
+            self._generations[chat_id] = self._generations.get(chat_id, 0) + 1
+        for key in [key for key in self._values if key[1] == chat_id]:
+            del self._values[key]
+
+    def clear(self):
+        self._values.clear()
+
+
+api_cache = TTLCache()
+
+
+async def get_chat(bot: Bot, chat_id: int):
+    """bot.get_chat через кэш"""
+    return await api_cache.get(
+        ('chat', chat_id), CHAT_TTL,
+        lambda: bot.get_chat(chat_id)
+    )
+
+
+async def get_chat_member_count(bot: Bot, chat_id: int) -> int:
+    """bot.get_chat_member_count через кэш"""
+    return await api_cache.get(
+        ('member_count', chat_id), MEMBER_COUNT_TTL,
+        lambda: bot.get_chat_member_count(chat_id)
+    )
+
+
+async def get_chat_member(bot: Bot, chat_id: int, user_id: int):
+    """bot.get_chat_member через кэш"""
+    return await api_cache.get(
+        ('chat_member', chat_id, user_id), CHAT_MEMBER_TTL,
+        lambda: bot.get_chat_member(chat_id, user_id)
+    )
+
+
+def invalidate_chat(chat_id: int):
+    api_cache.invalidate_chat(chat_id)
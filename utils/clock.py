@@ -0,0 +1,159 @@
+"""
+Часы бота.
+
+Всё, что зависит от текущего времени (планировщик, таймеры удаления,
+пресеты отложки), берёт его отсюда. По умолчанию это реальное московское
+время; в симуляциях подставляется VirtualClock, и неделя публикаций
+проигрывается за секунды.
+"""
+import asyncio
+import heapq
+import itertools
+from datetime import datetime, timedelta
+from typing import Optional
+
+import pytz
+
+# Московский часовой пояс
+MOSCOW_TZ = pytz.timezone('Europe/Moscow')
+
+
+class RealClock:
+    """Реальное время"""
+
+    def now(self) -> datetime:
+        """Московское время без tzinfo (как хранится в БД)"""
+        return datetime.now(MOSCOW_TZ).replace(tzinfo=None)
+
+    async def wait(self, event: Optional[asyncio.Event], timeout: float) -> bool:
+        """Ждать событие не дольше timeout секунд. True - если событие наступило"""
+        if event is None:
+            await asyncio.sleep(timeout)
+            return False
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class VirtualClock:
+    """
+    Виртуальное время для симуляций.
+    Время стоит, пока кто-то из ждущих часов задач работает, и прыгает
+    к ближайшему дедлайну, когда все они уснули (run_until).
+    """
+
+    def __init__(self, start: datetime):
+        self._now = start
+        self._waiters = []
+        self._seq = itertools.count()
+        self._running = set()
+        self._tracked = set()
+
+    def now(self) -> datetime:
+        return self._now
+
+    async def wait(self, event: Optional[asyncio.Event], timeout: float) -> bool:
+        task = asyncio.current_task()
+        self._track(task)
+        if event is not None and event.is_set():
+            return True
+
+        future = asyncio.get_running_loop().create_future()
+        deadline = self._now + timedelta(seconds=max(timeout, 0))
+        heapq.heappush(self._waiters, (deadline, next(self._seq), future, task))
+        self._running.discard(task)
+
+        watcher = None
+        if event is not None:
+            watcher = asyncio.ensure_future(event.wait())
+            watcher.add_done_callback(lambda _: self._resolve(future, task, True))
+        try:
+            return await future
+        finally:
+            if watcher:
+                watcher.cancel()
+            self._running.add(task)
+
+    def _track(self, task: asyncio.Task):
+        if task not in self._tracked:
+            self._tracked.add(task)
+            task.add_done_callback(self._forget)
+
+    def _forget(self, task: asyncio.Task):
+        self._tracked.discard(task)
+        self._running.discard(task)
+
+    def _resolve(self, future: asyncio.Future, task: asyncio.Task, value: bool):
+        if not future.done():
+            future.set_result(value)
+            self._running.add(task)
+
+    def _next_deadline(self) -> Optional[datetime]:
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+        return self._waiters[0][0] if self._waiters else None
+
+    def advance(self, moment: datetime):
+        """Перевести время и разбудить всех, чей дедлайн наступил"""
+        while self._waiters and self._waiters[0][0] <= moment:
+            _, _, future, task = heapq.heappop(self._waiters)
+            self._resolve(future, task, False)
+        self._now = max(self._now, moment)
+
+    async def settle(self, poll: float = 0.0005, idle_yields: int = 5, timeout: float = 10.0):
+        """
+        Дождаться, пока все разбуженные задачи доработают и снова уснут.
+        Если ждать часы некому дольше timeout реальных секунд - выходим.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        while True:
+            for _ in range(idle_yields):
+                await asyncio.sleep(0)
+            if not self._running:
+                if self._next_deadline() is not None or loop.time() - started > timeout:
+                    return
+            # Задачи ещё ходят в БД или API - ждём в реальном времени
+            await asyncio.sleep(poll)
+
+    async def run_until(self, moment: datetime):
+        """Проиграть время до moment"""
+        while True:
+            await self.settle()
+            deadline = self._next_deadline()
+            if deadline is None or deadline > moment:
+                break
+            self.advance(deadline)
+        self.advance(moment)
+
+    async def run_for(self, seconds: float):
+        await self.run_until(self._now + timedelta(seconds=seconds))
+
+
+_clock = RealClock()
+
+
+def get_clock():
+    return _clock
+
+
+def set_clock(clock):
+    """Подменить часы (VirtualClock в симуляциях)"""
+    global _clock
+    _clock = clock
+
+
+def get_moscow_now() -> datetime:
+    """Получить текущее московское время (без tzinfo для сравнения с БД)"""
+    return _clock.now()
+
+
+async def sleep(seconds: float):
+    await _clock.wait(None, seconds)
+
+
+async def wait(event: Optional[asyncio.Event], timeout: float) -> bool:
+    """Ждать событие не дольше timeout секунд по текущим часам"""
+    return await _clock.wait(event, timeout)
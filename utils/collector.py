@@ -0,0 +1,68 @@
+import asyncio
+import logging
+import time
+
+from aiogram import Bot
+
+import database as db
+from config import (
+    STATS_SAMPLE_INTERVAL, STATS_SAMPLE_RATE, STATS_SAMPLE_CONCURRENCY,
+    STATS_RETENTION_DAYS
+)
+from utils.lanes import set_lane, BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+RETENTION = {
+    db.MINUTE: STATS_RETENTION_DAYS['minute'] * db.DAY,
+    db.HOUR: STATS_RETENTION_DAYS['hour'] * db.DAY,
+    db.DAY: STATS_RETENTION_DAYS['day'] * db.DAY,
+}
+
+
+async def sample_member_counts(bot: Bot, now_ts: int):
+    """Один проход: замер подписчиков всех каналов и свёртка ряда"""
+    channels = await db.get_channels()
+    ts = now_ts - now_ts % db.MINUTE
+    semaphore = asyncio.Semaphore(STATS_SAMPLE_CONCURRENCY)
+    samples = []
+
+    async def sample(channel_id: int):
+        async with semaphore:
+            try:
+                members = await bot.get_chat_member_count(channel_id)
+                samples.append((channel_id, ts, members))
+            except Exception as e:
+                logger.warning(f"Member count failed for {channel_id}: {e}")
+
+    tasks = []
+    for channel in channels:
+        tasks.append(asyncio.create_task(sample(channel['channel_id'])))
+        # Разносим запросы во времени, чтобы не выйти за лимит API
+        await asyncio.sleep(1 / STATS_SAMPLE_RATE)
+    await asyncio.gather(*tasks)
+
+    if samples:
+        await db.add_member_samples(samples)
+    await db.rollup_member_stats(now_ts, RETENTION)
+    return len(samples)
+
+
+async def collect_member_stats(bot: Bot):
+    """Фоновый сбор числа подписчиков"""
+    logger.info("Member stats collector started")
+    set_lane(BACKGROUND)
+
+    while True:
+        started = time.time()
+        try:
+            count = await sample_member_counts(bot, int(started))
+            logger.debug(f"Member stats: {count} channels sampled")
+        except Exception as e:
+            logger.error(f"Collector error: {e}")
+
+        await asyncio.sleep(max(0, STATS_SAMPLE_INTERVAL - (time.time() - started)))
+
+
+def start_collector(bot: Bot):
+    asyncio.create_task(collect_member_stats(bot))
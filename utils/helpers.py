@@ -1,11 +1,13 @@
 from aiogram import Bot
 from aiogram.types import ChatMember
 
+from .api_cache import get_chat_member
+
 
 async def check_admin_rights(bot: Bot, chat_id: int, user_id: int) -> bool:
     """Проверить, является ли пользователь администратором канала"""
     try:
-        member = await bot.get_chat_member(chat_id, user_id)
+        member = await get_chat_member(bot, chat_id, user_id)
         return member.status in ['creator', 'administrator']
     except Exception:
         return False
@@ -14,7 +16,7 @@ async def check_admin_rights(bot: Bot, chat_id: int, user_id: int) -> bool:
 async def check_bot_rights(bot: Bot, chat_id: int) -> dict:
     """Проверить права бота в канале"""
     try:
-        member = await bot.get_chat_member(chat_id, bot.id)
+        member = await get_chat_member(bot, chat_id, bot.id)
         return {
             'is_admin': member.status in ['administrator', 'creator'],
             'can_post': getattr(member, 'can_post_messages', False) or member.status == 'creator'
@@ -28,6 +30,11 @@ def format_number(num: int) -> str:
     return f"{num:,}".replace(",", " ")
 
 
+def format_count(count: int, cap: int) -> str:
+    """Счётчик, посчитанный с пределом: при достижении предела - «999+»"""
+    return f"{cap - 1}+" if count >= cap else str(count)
+
+
 def truncate_text(text: str, max_length: int = 50) -> str:
     """Обрезать текст с многоточием"""
     if len(text) <= max_length:
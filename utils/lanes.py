@@ -0,0 +1,142 @@
+"""
+Полосы приоритета для запросов к Bot API.
+
+У бота один общий лимит Telegram на отправку сообщений (API_RATE в секунду),
+и во время пачки публикаций ответы на кнопки вставали в конец очереди.
+Каждый запрос теперь относится к полосе - по contextvar, который задача
+выставляет себе при старте (хендлеры по умолчанию интерактивные):
+
+    interactive - ответы пользователю: хендлеры, кнопки, превью
+    publish     - публикация в каналы (планировщик)
+    notify      - сводки авторам и алерты админам
+    background  - фоновые замеры (сборщик подписчиков)
+
+Лимит расходуют только отправки (SEND_METHODS): ответы на кнопки, правка
+сообщений и чтение (getChat, getChatMember) идут мимо бакета в любой полосе.
+Интерактивные отправки тоже не ждут - берут токен, при необходимости в долг,
+и этот долг дожидаются остальные полосы. Пока лимит не исчерпан, отправки
+идут сразу. Когда исчерпан, новые слоты раздаются по весам API_LANE_WEIGHTS
+(stride scheduling): полоса с весом 8 получает в 8 раз больше слотов,
+чем полоса с весом 1.
+"""
+import asyncio
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from config import API_RATE, API_BURST, API_LANE_WEIGHTS
+from utils import clock, metrics
+
+INTERACTIVE = 'interactive'
+PUBLISH = 'publish'
+NOTIFY = 'notify'
+BACKGROUND = 'background'
+
+current_lane = ContextVar('api_lane', default=INTERACTIVE)
+
+# Методы, которые расходуют лимит Telegram на отправку сообщений
+SEND_METHODS = frozenset({
+    'sendMessage', 'sendPhoto', 'sendVideo', 'sendDocument', 'sendMediaGroup',
+    'sendAnimation', 'sendAudio', 'sendVoice', 'sendVideoNote', 'sendSticker',
+    'sendPoll', 'sendDice', 'sendLocation', 'sendVenue', 'sendContact',
+    'copyMessage', 'copyMessages', 'forwardMessage', 'forwardMessages',
+})
+
+
+def set_lane(lane: str):
+    """Полоса для текущей задачи и задач, которые она создаст"""
+    current_lane.set(lane)
+
+
+@contextmanager
+def use_lane(lane: str):
+    """Полоса на время блока"""
+    token = current_lane.set(lane)
+    try:
+        yield
+    finally:
+        current_lane.reset(token)
+
+
+class LaneScheduler:
+    """Взвешенная очередь перед сессией: токен-бакет на rate отправок в секунду"""
+
+    def __init__(self, rate: float = API_RATE, burst: float = API_BURST, weights: dict = None):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.weights = API_LANE_WEIGHTS if weights is None else weights
+        self._queues = {lane: deque() for lane in self.weights}
+        # Виртуальное время полос: меньше - раньше в очереди
+        self._pass = dict.fromkeys(self.weights, 0.0)
+        self._vtime = 0.0
+        self._waiting = 0
+        self._tokens = self.burst
+        self._updated = None
+        self._pump = None
+
+    def _refill(self) -> float:
+        """Пополнить бакет; сколько секунд ждать следующего токена"""
+        now = clock.get_moscow_now()
+        if self._updated is not None:
+            elapsed = max((now - self._updated).total_seconds(), 0)
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+        self._updated = now
+        return 0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    async def acquire(self, lane: str, method: str):
+        if not self.rate or method not in SEND_METHODS:
+            return
+
+        # Ответ пользователю не ждёт: токен в долг, его дождутся остальные полосы
+        if lane == INTERACTIVE:
+            self._refill()
+            self._tokens -= 1
+            return
+        if lane not in self._queues:
+            # Полоса без веса - в первую очередь (при одной очереди - в неё)
+            lane = next(iter(self._queues))
+
+        # Без очереди и с токеном - сразу
+        if not self._waiting and not self._refill():
+            self._tokens -= 1
+            return
+
+        queue = self._queues[lane]
+        if not queue:
+            # Простаивавшая полоса не копит кредит за время простоя
+            self._pass[lane] = max(self._pass[lane], self._vtime)
+        waiter = asyncio.Event()
+        queue.append(waiter)
+        self._waiting += 1
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run())
+
+        started = clock.get_moscow_now()
+        try:
+            # Через часы, а не waiter.wait(): иначе VirtualClock считает задачу работающей
+            while not await clock.wait(waiter, 60):
+                pass
+        except BaseException:
+            if not waiter.is_set():
+                queue.remove(waiter)
+                self._waiting -= 1
+            raise
+        finally:
+            metrics.api_lane_wait.observe((clock.get_moscow_now() - started).total_seconds(), lane)
+
+    async def _run(self):
+        while self._waiting:
+            delay = self._refill()
+            if delay:
+                await clock.sleep(delay)
+                continue
+
+            lane = min((lane for lane, queue in self._queues.items() if queue), key=self._pass.get)
+            self._queues[lane].popleft().set()
+            self._waiting -= 1
+            self._tokens -= 1
+            self._vtime = self._pass[lane]
+            self._pass[lane] += 1 / self.weights[lane]
+
+    def queued(self) -> dict:
+        return {lane: len(queue) for lane, queue in self._queues.items()}
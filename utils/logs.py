@@ -0,0 +1,131 @@
+"""
+Логирование без блокировок цикла событий.
+
+Хендлеры, планировщик и сборщик живут в одном цикле, и синхронная запись
+в stdout на каждом сообщении тормозит их всех. Здесь корень логгеров пишет
+только в очередь (QueueHandler), а форматирует и выводит фоновый поток
+(QueueListener). Болтливые INFO-сообщения ограничиваются RateLimitFilter
+ещё до очереди: сверх лимита за окно пропускается каждое sample-е, остальные
+только считаются.
+
+Ключ лимита - логгер и шаблон сообщения, поэтому частые сообщения пишем
+в %-стиле: logger.info("Post %s published", post_id).
+"""
+import json
+import logging
+import queue
+import sys
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from config import LOG_LEVEL, LOG_FORMAT, LOG_RATE_LIMIT, LOG_RATE_WINDOW, LOG_SAMPLE
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Стандартные поля LogRecord - всё остальное в JSON уходит как extra
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна строка JSON на запись"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Не больше limit одинаковых сообщений уровня ниже WARNING за window секунд,
+    сверх лимита - каждое sample-е (0 - ни одного). В пропущенную запись
+    добавляется suppressed - сколько таких же было отброшено перед ней.
+    """
+
+    def __init__(self, limit: int = LOG_RATE_LIMIT, window: float = LOG_RATE_WINDOW, sample: int = LOG_SAMPLE):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.sample = sample
+        # ключ -> [начало окна, записей в окне, отброшено с последней пропущенной]
+        self._keys = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.limit:
+            return True
+
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        state = self._keys.get(key)
+        if state is None or now - state[0] >= self.window:
+            suppressed = state[2] if state else 0
+            self._keys[key] = [now, 1, 0]
+            if len(self._keys) > 10000:
+                self._forget(now)
+            if suppressed:
+                record.suppressed = suppressed
+            return True
+
+        state[1] += 1
+        over = state[1] - self.limit
+        if over <= 0 or (self.sample and over % self.sample == 0):
+            if state[2]:
+                record.suppressed = state[2]
+                state[2] = 0
+            return True
+
+        state[2] += 1
+        return False
+
+    def _forget(self, now: float):
+        """Выкинуть ключи с истёкшим окном (шаблоны с f-строк копятся бесконечно)"""
+        self._keys = {
+            key: state for key, state in self._keys.items() if now - state[0] < self.window
+        }
+
+
+class _LoopQueueHandler(QueueHandler):
+    """
+    QueueHandler без форматирования в вызывающем потоке: в очередь уходит
+    запись с уже подставленными аргументами, форматирует её слушатель
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT) -> QueueListener:
+    """
+    Настроить корневой логгер: очередь + фоновый поток вывода в stderr.
+    Вернуть слушателя; listener.stop() дописывает очередь до конца.
+    """
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+
+    records = queue.SimpleQueue()
+    handler = _LoopQueueHandler(records)
+    handler.addFilter(RateLimitFilter())
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    listener = QueueListener(records, output, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,240 @@
+"""
+Метрики в текстовом формате Prometheus (GET /metrics на сервере монитора).
+
+Свой маленький реестр вместо prometheus_client: счётчик - это словарь
+по кортежу меток, гистограмма - bisect по границам корзин. Этого хватает,
+чтобы держать метрики включёнными в горячем пути.
+"""
+import time
+from bisect import bisect_left
+from collections import Counter as _Counter
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+import database as db
+
+_registry = []
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+LAG_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        _registry.append(self)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._values = _Counter()
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] += amount
+
+    def render(self):
+        lines = self._header()
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            # [счётчики по корзинам (последняя - +Inf), сумма, количество]
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = self._header()
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Текущее значение: set() или collect() -> {кортеж меток: число} при выдаче"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labels=(), collect=None):
+        super().__init__(name, documentation, labels)
+        self.collect = collect
+        self._values = {}
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+    def render(self):
+        lines = self._header()
+        values = self.collect() if self.collect else self._values
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}")
+        return lines
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# ============ МЕТРИКИ БОТА ============
+
+posts_published = Counter(
+    'bot_posts_published_total', 'Опубликованные посты', ('type', 'source')
+)
+posts_failed = Counter(
+    'bot_posts_failed_total', 'Посты, которые не удалось опубликовать', ('type', 'source')
+)
+publish_lag = Histogram(
+    'bot_publish_lag_seconds', 'Задержка публикации отложенного поста', buckets=LAG_BUCKETS
+)
+api_latency = Histogram(
+    'bot_api_request_duration_seconds', 'Время запроса к Bot API', ('method',)
+)
+api_flood = Counter(
+    'bot_api_flood_total', 'Ответы 429 от Bot API', ('method',)
+)
+api_errors = Counter(
+    'bot_api_errors_total', 'Ошибки запросов к Bot API', ('method', 'error')
+)
+api_connections = Counter(
+    'bot_api_connections_total', 'Соединения с Bot API: created - новые, reused - из пула', ('event',)
+)
+api_pool_wait = Histogram(
+    'bot_api_pool_wait_seconds', 'Ожидание свободного соединения в пуле', buckets=DB_BUCKETS
+)
+api_lane_wait = Histogram(
+    'bot_api_lane_wait_seconds', 'Ожидание запроса в полосе приоритета', ('lane',)
+)
+db_latency = Histogram(
+    'bot_db_query_duration_seconds', 'Время работы функций database.py', ('function',), buckets=DB_BUCKETS
+)
+handler_latency = Histogram(
+    'bot_handler_duration_seconds', 'Время работы хендлеров', ('handler',)
+)
+catchup_posts = Counter(
+    'bot_catchup_posts_total', 'Посты, разобранные в догоняющем режиме', ('outcome',)
+)
+fsm_states = Gauge(
+    'bot_fsm_states', 'Пользователи в состояниях FSM', ('state',)
+)
+
+# Заполняются монитором перед выдачей
+loop_lag = Gauge('bot_event_loop_lag_seconds', 'Максимальная задержка цикла событий за минуту')
+asyncio_tasks = Gauge('bot_asyncio_tasks', 'Живые задачи asyncio')
+api_in_flight = Gauge('bot_api_in_flight', 'Запросы к Bot API в полёте')
+db_connections = Gauge('bot_db_connections_open', 'Открытые соединения с БД')
+scheduler_pending = Gauge('bot_scheduler_pending', 'Посты в очереди планировщика')
+scheduler_overdue = Gauge('bot_scheduler_overdue', 'Просроченные посты в очереди')
+
+
+def post_type(media_type, album) -> str:
+    """album / photo / video / document / text"""
+    if album:
+        return 'album'
+    if media_type in ('photo', 'video', 'document'):
+        return media_type
+    return 'text'
+
+
+def record_publish(kind: str, source: str, ok: bool):
+    (posts_published if ok else posts_failed).inc(kind, source)
+
+
+class ApiMetrics(BaseRequestMiddleware):
+    """Время запросов к Bot API, 429 и ошибки по методам"""
+
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter:
+            api_flood.inc(name)
+            raise
+        except Exception as e:
+            api_errors.inc(name, type(e).__name__)
+            raise
+        finally:
+            api_latency.observe(time.perf_counter() - started, name)
+
+
+class HandlerMetrics(BaseMiddleware):
+    """Время хендлеров (inner middleware диспетчера)"""
+
+    async def __call__(self, handler, event, data):
+        callback = data['handler'].callback
+        name = f"{callback.__module__.rsplit('.', 1)[-1]}.{callback.__name__}"
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            handler_latency.observe(time.perf_counter() - started, name)
+
+
+def watch_storage(storage):
+    """Считать состояния FSM из MemoryStorage при выдаче метрик"""
+    def collect():
+        states = _Counter(
+            record.state for record in getattr(storage, 'storage', {}).values() if record.state
+        )
+        return {(state,): count for state, count in states.items()}
+    fsm_states.collect = collect
+
+
+def install(bot: Bot, dp: Dispatcher):
+    """Подключить метрики к сессии бота, диспетчеру и database.py"""
+    bot.session.middleware(ApiMetrics())
+    dp.message.middleware(HandlerMetrics())
+    dp.callback_query.middleware(HandlerMetrics())
+    watch_storage(dp.storage)
+    db.query_observer = lambda function, seconds: db_latency.observe(seconds, function)
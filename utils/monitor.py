@@ -0,0 +1,229 @@
+"""
+Монитор работы бота.
+
+Все хендлеры, планировщик и сборщик статистики живут в одном цикле событий,
+поэтому одна блокирующая операция тормозит всех сразу. Монитор меряет
+задержку цикла, живые задачи, запросы к Bot API в полёте, открытые
+соединения с БД и очередь планировщика, шлёт алерты в ADMIN_IDS и отдаёт
+снимок по HTTP: GET /health (JSON, 503 - если есть превышения порогов)
+и GET /metrics (формат Prometheus, см. utils/metrics.py).
+"""
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+import database as db
+from config import (
+    ADMIN_IDS, MONITOR_HOST, MONITOR_PORT, MONITOR_INTERVAL,
+    MONITOR_ALERT_COOLDOWN, MONITOR_THRESHOLDS
+)
+from utils import metrics
+from utils.clock import get_moscow_now
+from utils.lanes import set_lane, NOTIFY
+from utils.scheduler import parse_db_time
+
+logger = logging.getLogger(__name__)
+
+# Период замера задержки цикла, сек; окно - последняя минута
+LAG_INTERVAL = 0.5
+LAG_WINDOW = 120
+TOP_TASKS = 20
+
+ALERT_TEXTS = {
+    'loop_lag': "задержка цикла событий {value:.2f} с",
+    'tasks': "живых задач asyncio: {value}",
+    'api_in_flight': "запросов к Bot API в полёте: {value}",
+    'db_connections': "открытых соединений с БД: {value}",
+    'overdue_age': "просроченный пост ждёт {value:.0f} с",
+}
+
+
+class InFlightRequests(BaseRequestMiddleware):
+    """Запросы к Bot API, на которые ещё не пришёл ответ"""
+
+    def __init__(self):
+        self.by_method = Counter()
+        self.peak = 0
+
+    @property
+    def total(self) -> int:
+        return sum(self.by_method.values())
+
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        self.by_method[name] += 1
+        self.peak = max(self.peak, self.total)
+        try:
+            return await make_request(bot, method)
+        finally:
+            self.by_method[name] -= 1
+            if not self.by_method[name]:
+                del self.by_method[name]
+
+
+def task_name(task: asyncio.Task) -> str:
+    """Имя задачи по её корутине (Task-123 ничего не говорит)"""
+    coro = task.get_coro()
+    return getattr(coro, '__qualname__', None) or task.get_name()
+
+
+class RuntimeMonitor:
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self.api_requests = InFlightRequests()
+        self.started_at = time.time()
+        self._lags = deque(maxlen=LAG_WINDOW)
+        self._alerted_at = {}
+        self._tasks = []
+        self._runner = None
+
+    # ============ ЗАМЕРЫ ============
+
+    async def _measure_lag(self):
+        # Реальное время, а не utils.clock: меряем сам цикл событий
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(LAG_INTERVAL)
+            self._lags.append(max(0.0, loop.time() - started - LAG_INTERVAL))
+
+    def loop_lag(self) -> dict:
+        lags = sorted(self._lags)
+        if not lags:
+            return {'last': 0.0, 'max': 0.0, 'p99': 0.0}
+        return {
+            'last': round(self._lags[-1] * 1000, 1),
+            'max': round(lags[-1] * 1000, 1),
+            'p99': round(lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000, 1),
+        }
+
+    @staticmethod
+    def tasks() -> dict:
+        names = Counter(task_name(task) for task in asyncio.all_tasks())
+        return {
+            'total': sum(names.values()),
+            'by_name': dict(names.most_common(TOP_TASKS)),
+        }
+
+    @staticmethod
+    async def scheduler_queue() -> dict:
+        now = get_moscow_now()
+        pending, overdue, oldest = await db.get_queue_depth(now)
+        oldest_age = (now - parse_db_time(oldest)).total_seconds() if oldest else 0
+        return {'pending': pending, 'overdue': overdue, 'oldest_overdue_s': round(oldest_age)}
+
+    async def snapshot(self) -> dict:
+        """Текущее состояние и список превышенных порогов"""
+        lag = self.loop_lag()
+        tasks = self.tasks()
+        try:
+            queue = await self.scheduler_queue()
+        except Exception as e:
+            logger.error(f"Monitor queue check failed: {e}")
+            queue = None
+
+        values = {
+            'loop_lag': lag['max'] / 1000,
+            'tasks': tasks['total'],
+            'api_in_flight': self.api_requests.total,
+            'db_connections': db.connection_stats['open'],
+            'overdue_age': queue['oldest_overdue_s'] if queue else 0,
+        }
+        alerts = [key for key, value in values.items() if value > MONITOR_THRESHOLDS[key]]
+
+        return {
+            'status': 'degraded' if alerts else 'ok',
+            'alerts': alerts,
+            'values': values,
+            'uptime_s': round(time.time() - self.started_at),
+            'loop_lag_ms': lag,
+            'tasks': tasks,
+            'api': {
+                'in_flight': self.api_requests.total,
+                'peak': self.api_requests.peak,
+                'by_method': dict(self.api_requests.by_method),
+                'queued': self.bot.session.lanes.queued() if hasattr(self.bot.session, 'lanes') else {},
+            },
+            'db': dict(db.connection_stats),
+            'scheduler': queue,
+        }
+
+    # ============ АЛЕРТЫ ============
+
+    async def _check(self):
+        set_lane(NOTIFY)
+        while True:
+            await asyncio.sleep(MONITOR_INTERVAL)
+            try:
+                snapshot = await self.snapshot()
+                for key in snapshot['alerts']:
+                    await self._alert(key, snapshot['values'][key])
+            except Exception as e:
+                logger.error(f"Monitor error: {e}")
+
+    async def _alert(self, key: str, value):
+        now = time.monotonic()
+        if now - self._alerted_at.get(key, -MONITOR_ALERT_COOLDOWN) < MONITOR_ALERT_COOLDOWN:
+            return
+        self._alerted_at[key] = now
+
+        text = ALERT_TEXTS[key].format(value=value)
+        logger.warning(f"Monitor alert: {text}")
+        for admin_id in ADMIN_IDS:
+            try:
+                await self.bot.send_message(
+                    admin_id, f"⚠️ <b>Монитор:</b> {text} (порог {MONITOR_THRESHOLDS[key]})"
+                )
+            except Exception as e:
+                logger.warning(f"Alert to {admin_id} failed: {e}")
+
+    # ============ HTTP ============
+
+    async def _health(self, request: web.Request) -> web.Response:
+        snapshot = await self.snapshot()
+        return web.json_response(snapshot, status=503 if snapshot['alerts'] else 200)
+
+    async def _metrics(self, request: web.Request) -> web.Response:
+        snapshot = await self.snapshot()
+        values = snapshot['values']
+        metrics.loop_lag.set(values['loop_lag'])
+        metrics.asyncio_tasks.set(values['tasks'])
+        metrics.api_in_flight.set(values['api_in_flight'])
+        metrics.db_connections.set(values['db_connections'])
+        if snapshot['scheduler']:
+            metrics.scheduler_pending.set(snapshot['scheduler']['pending'])
+            metrics.scheduler_overdue.set(snapshot['scheduler']['overdue'])
+        return web.Response(text=metrics.render(), content_type='text/plain', charset='utf-8')
+
+    async def start(self):
+        self.bot.session.middleware(self.api_requests)
+        self._tasks = [
+            asyncio.create_task(self._measure_lag()),
+            asyncio.create_task(self._check()),
+        ]
+
+        if MONITOR_PORT:
+            app = web.Application()
+            app.router.add_get('/health', self._health)
+            app.router.add_get('/metrics', self._metrics)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, MONITOR_HOST, MONITOR_PORT).start()
+            logger.info(f"Monitor listening on http://{MONITOR_HOST}:{MONITOR_PORT}/health")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        if self._runner:
+            await self._runner.cleanup()
+
+
+async def start_monitor(bot: Bot) -> RuntimeMonitor:
+    monitor = RuntimeMonitor(bot)
+    await monitor.start()
+    return monitor
@@ -0,0 +1,170 @@
+"""
+Уведомления авторам о публикации.
+
+Вместо сообщения на каждый пост события копятся NOTIFY_WINDOW секунд
+и уходят одной сводкой на пользователя: каналы и ссылки на посты.
+Сводки отправляет один фоновый воркер с паузой NOTIFY_GAP между
+сообщениями, в полосе notify (utils/lanes.py) и только когда
+планировщик не публикует (hold) - каналы важнее уведомлений.
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from html import escape
+
+from aiogram import Bot
+
+import database as db
+from config import NOTIFY_WINDOW, NOTIFY_GAP
+from utils import clock
+from utils.lanes import set_lane, NOTIFY
+
+logger = logging.getLogger(__name__)
+
+# Сколько постов и ошибок перечислять в одной сводке
+DIGEST_LIMIT = 20
+
+
+class Notifier:
+    def __init__(self, bot: Bot, window: float = NOTIFY_WINDOW, gap: float = NOTIFY_GAP):
+        self.bot = bot
+        self.window = window
+        self.gap = gap
+        self._events = {}
+        self._pending = asyncio.Event()
+        self._busy = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task = None
+
+    def add(self, user_id: int, event: tuple):
+        """event: ('published', channel_id, message_id) или ('failed', channel_id, ошибка)"""
+        self._events.setdefault(user_id, []).append(event)
+        self._pending.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    @asynccontextmanager
+    async def hold(self):
+        """Не слать сводки, пока идёт публикация"""
+        self._busy += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._busy -= 1
+            if not self._busy:
+                self._idle.set()
+
+    @staticmethod
+    async def _wait(event: asyncio.Event):
+        # Через часы, а не event.wait(): иначе VirtualClock считает воркер работающим
+        while not await clock.wait(event, 3600):
+            pass
+
+    async def _run(self):
+        set_lane(NOTIFY)
+        while True:
+            await self._wait(self._pending)
+            # Окно считается от первого события: всё, что пришло за него, - в одну сводку
+            await clock.sleep(self.window)
+            await self._wait(self._idle)
+
+            events, self._events = self._events, {}
+            self._pending.clear()
+            for user_id, user_events in events.items():
+                await self._wait(self._idle)
+                try:
+                    await self.send_digest(user_id, user_events)
+                except Exception as e:
+                    logger.warning(f"Digest to {user_id} failed: {e}")
+                if self.gap:
+                    await clock.sleep(self.gap)
+
+    async def send_digest(self, user_id: int, events: list):
+        channels = {}
+        for _, channel_id, _ in events:
+            if channel_id not in channels:
+                channels[channel_id] = await db.get_channel_by_id(channel_id)
+        await self.bot.send_message(
+            chat_id=user_id,
+            text=format_digest(events, channels),
+            parse_mode="HTML",
+            disable_web_page_preview=True
+        )
+
+
+def _channel_name(channel_id: int, channel) -> str:
+    if channel:
+        return escape(channel['channel_title'] or channel['channel_username'] or str(channel_id))
+    return str(channel_id)
+
+
+def _post_link(channel, message_id) -> str:
+    username = channel['channel_username'] if channel else None
+    if username and message_id:
+        return f"<a href=\"https://t.me/{username.lstrip('@')}/{message_id}\">пост</a>"
+    return "пост"
+
+
+def format_digest(events: list, channels: dict) -> str:
+    published = [e for e in events if e[0] == 'published']
+    failed = [e for e in events if e[0] == 'failed']
+    lines = []
+
+    if len(published) == 1 and not failed:
+        _, channel_id, message_id = published[0]
+        channel = channels.get(channel_id)
+        return (
+            "✅ Отложенный пост опубликован!\n"
+            f"📢 {_channel_name(channel_id, channel)} — {_post_link(channel, message_id)}"
+        )
+
+    if published:
+        lines.append(f"✅ <b>Опубликовано отложенных постов: {len(published)}</b>")
+        by_channel = {}
+        for _, channel_id, message_id in published[:DIGEST_LIMIT]:
+            by_channel.setdefault(channel_id, []).append(message_id)
+        for channel_id, message_ids in by_channel.items():
+            channel = channels.get(channel_id)
+            links = ", ".join(_post_link(channel, message_id) for message_id in message_ids)
+            lines.append(f"📢 {_channel_name(channel_id, channel)}: {links}")
+        if len(published) > DIGEST_LIMIT:
+            lines.append(f"…и ещё {len(published) - DIGEST_LIMIT}")
+
+    if failed:
+        if lines:
+            lines.append("")
+        lines.append(f"❌ <b>Ошибки публикации: {len(failed)}</b> — /failed")
+        for _, channel_id, error in failed[:DIGEST_LIMIT]:
+            # Первой строки ошибки Telegram достаточно, подробности - в /failed
+            error = escape(error.split("\n")[0][:200], quote=False)
+            lines.append(f"📢 {_channel_name(channel_id, channels.get(channel_id))}: {error}")
+        if len(failed) > DIGEST_LIMIT:
+            lines.append(f"…и ещё {len(failed) - DIGEST_LIMIT}")
+
+    return "\n".join(lines)
+
+
+_notifier = None
+
+
+def get_notifier(bot: Bot) -> Notifier:
+    global _notifier
+    if _notifier is None or _notifier.bot is not bot:
+        _notifier = Notifier(bot)
+    return _notifier
+
+
+def notify_published(bot: Bot, user_id: int, channel_id: int, message_id: int = None):
+    get_notifier(bot).add(user_id, ('published', channel_id, message_id))
+
+
+def notify_failed(bot: Bot, user_id: int, channel_id: int, error: str):
+    get_notifier(bot).add(user_id, ('failed', channel_id, error))
+
+
+@asynccontextmanager
+async def hold_notifications(bot: Bot):
+    async with get_notifier(bot).hold():
+        yield
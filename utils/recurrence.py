@@ -0,0 +1,257 @@
+"""
+Правила повтора отложенных постов.
+
+В БД правило хранится каноничной строкой в scheduled_posts.recurrence
+вместе с часовым поясом автора (recurrence_tz):
+
+    every 90m / every 6h / every 2d  - интервал (дни - по местному времени)
+    cron M H DOM MON DOW              - как в crontab: 30 9 * * 1-5
+
+Ввод пользователя («каждые 6 ч», «ежедневно 09:30», «пн,ср,пт 10:00»,
+«будни 9:00», «cron 0 9 * * *») приводит к этой строке parse_rule.
+
+Следующий запуск считается по одному, от времени текущего: правило
+не разворачивается на будущее, в очереди всегда лежит один пост серии.
+Время в БД московское, а правило - в поясе автора, поэтому переход
+на летнее время учитывается: несуществующее время сдвигается вперёд,
+повторяющееся срабатывает один раз (первое).
+"""
+import re
+from datetime import datetime, timedelta, time
+
+import pytz
+
+from utils.clock import MOSCOW_TZ
+
+# Реже, чем раз в столько минут, повтор не разрешаем
+MIN_INTERVAL_MINUTES = 5
+
+# Насколько далеко искать следующий запуск cron (29 февраля в понедельник и т.п.)
+CRON_HORIZON_DAYS = 366 * 8
+
+UNITS = {
+    'm': 1, 'мин': 1, 'минут': 1, 'минуты': 1, 'минуту': 1,
+    'h': 60, 'ч': 60, 'час': 60, 'часа': 60, 'часов': 60,
+    'd': 1440, 'д': 1440, 'дн': 1440, 'дня': 1440, 'дней': 1440, 'день': 1440,
+}
+
+WEEKDAYS = {
+    'пн': 1, 'вт': 2, 'ср': 3, 'чт': 4, 'пт': 5, 'сб': 6, 'вс': 0,
+    'mon': 1, 'tue': 2, 'wed': 3, 'thu': 4, 'fri': 5, 'sat': 6, 'sun': 0,
+}
+WEEKDAY_NAMES = ['вс', 'пн', 'вт', 'ср', 'чт', 'пт', 'сб']
+DAY_GROUPS = {
+    'ежедневно': '*', 'каждый день': '*', 'daily': '*',
+    'будни': '1-5', 'по будням': '1-5', 'weekdays': '1-5',
+    'выходные': '0,6', 'по выходным': '0,6', 'weekends': '0,6',
+}
+
+CRON_FIELDS = (('минуты', 0, 59), ('часы', 0, 23), ('дни месяца', 1, 31), ('месяцы', 1, 12), ('дни недели', 0, 7))
+
+EXAMPLES = (
+    "<code>каждые 6 ч</code> (или мин, дн)\n"
+    "<code>ежедневно 09:30</code>\n"
+    "<code>пн,ср,пт 10:00</code>, <code>будни 9:00</code>, <code>выходные 12:00</code>\n"
+    "<code>cron 0 9 * * 1-5</code>"
+)
+
+
+# ============ РАЗБОР ============
+
+def parse_rule(text: str) -> str:
+    """Ввод пользователя -> каноничное правило. ValueError с понятным текстом, если не разобрали"""
+    text = " ".join(text.lower().split())
+
+    if text.startswith('cron '):
+        rule = 'cron ' + text[5:]
+        # Заодно проверяем, что правило вообще срабатывает (не 31 февраля)
+        _next_cron(rule, datetime(2000, 1, 1))
+        return rule
+
+    match = re.fullmatch(r'(?:каждые|каждый|каждую|every)\s*(\d+)?\s*([a-zа-я]+)', text)
+    if match:
+        count, unit = int(match.group(1) or 1), match.group(2)
+        if unit not in UNITS:
+            raise ValueError(f"Непонятная единица: {unit}")
+        minutes = count * UNITS[unit]
+        if minutes < MIN_INTERVAL_MINUTES:
+            raise ValueError(f"Интервал не меньше {MIN_INTERVAL_MINUTES} мин")
+        if minutes % 1440 == 0:
+            return f"every {minutes // 1440}d"
+        if minutes % 60 == 0:
+            return f"every {minutes // 60}h"
+        return f"every {minutes}m"
+
+    match = re.fullmatch(r'(.+?)\s+(?:в\s+)?(\d{1,2})[:. ](\d{2})', text)
+    if not match:
+        raise ValueError("Не понял правило")
+    days, hour, minute = match.group(1), int(match.group(2)), int(match.group(3))
+    if hour > 23 or minute > 59:
+        raise ValueError("Время - ЧЧ:ММ")
+
+    if days in DAY_GROUPS:
+        dow = DAY_GROUPS[days]
+    else:
+        numbers = set()
+        for day in re.split(r'[,\s]+', days):
+            if day not in WEEKDAYS:
+                raise ValueError(f"Непонятный день: {day}")
+            numbers.add(WEEKDAYS[day])
+        # Воскресенье (0) - в конец, как в неделе
+        dow = ",".join(str(day) for day in sorted(numbers, key=lambda day: day or 7))
+    return f"cron {minute} {hour} * * {dow}"
+
+
+def _parse_field(value: str, name: str, low: int, high: int) -> set:
+    result = set()
+    for part in value.split(','):
+        step = None
+        if '/' in part:
+            part, step = part.split('/', 1)
+            step = int(step)
+            if step < 1:
+                raise ValueError(f"Шаг в поле «{name}» должен быть больше нуля")
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = map(int, part.split('-', 1))
+        else:
+            start = end = int(part)
+            # N/S - с N до конца поля с шагом S, как в cron
+            if step:
+                end = high
+        if not low <= start <= end <= high:
+            raise ValueError(f"Поле «{name}»: допустимо {low}-{high}")
+        result.update(range(start, end + 1, step or 1))
+    return result
+
+
+def _parse_cron(rule: str):
+    """(минуты, часы, дни месяца, месяцы, дни недели, DOM ограничен, DOW ограничен)"""
+    fields = rule.split()[1:]
+    if len(fields) != 5:
+        raise ValueError("В cron пять полей: минуты часы дни месяцы дни_недели")
+    try:
+        minutes, hours, days, months, weekdays = (
+            _parse_field(value, *spec) for value, spec in zip(fields, CRON_FIELDS)
+        )
+    except ValueError as e:
+        if str(e).startswith(('Поле', 'Шаг')):
+            raise
+        raise ValueError("Поля cron - числа, *, списки через запятую, диапазоны и шаги")
+    if 7 in weekdays:
+        weekdays = (weekdays - {7}) | {0}
+    return sorted(minutes), sorted(hours), days, months, weekdays, fields[2] != '*', fields[4] != '*'
+
+
+# ============ СЛЕДУЮЩИЙ ЗАПУСК ============
+
+def _to_local(moment: datetime, tz) -> datetime:
+    return MOSCOW_TZ.localize(moment).astimezone(tz).replace(tzinfo=None)
+
+
+def _to_moscow(local: datetime, tz) -> datetime:
+    """Местное время автора -> московское (наивное, как в БД) с учётом перевода часов"""
+    try:
+        aware = tz.localize(local, is_dst=None)
+    except pytz.AmbiguousTimeError:
+        # Час повторяется (осенью) - берём первый раз
+        aware = tz.localize(local, is_dst=True)
+    except pytz.NonExistentTimeError:
+        # Часа нет (весной) - normalize сдвигает вперёд на длину перевода
+        aware = tz.normalize(tz.localize(local, is_dst=False))
+    return aware.astimezone(MOSCOW_TZ).replace(tzinfo=None)
+
+
+def _next_cron(rule: str, after: datetime) -> datetime:
+    """Первое местное время строго после after, подходящее под cron"""
+    minutes, hours, days, months, weekdays, dom_set, dow_set = _parse_cron(rule)
+    after = after.replace(second=0, microsecond=0)
+    day = after.date()
+    for _ in range(CRON_HORIZON_DAYS):
+        if day.month in months:
+            dom_ok = day.day in days
+            dow_ok = (day.weekday() + 1) % 7 in weekdays
+            # Как в cron: если заданы оба поля, достаточно любого
+            if (dom_ok or dow_ok) if dom_set and dow_set else (dom_ok and dow_ok):
+                for hour in hours:
+                    for minute in minutes:
+                        candidate = datetime.combine(day, time(hour, minute))
+                        if candidate > after:
+                            return candidate
+        day += timedelta(days=1)
+    raise ValueError("Правило не срабатывает в ближайшие годы")
+
+
+def next_fire(rule: str, tz_name: str, previous: datetime, now: datetime) -> datetime:
+    """
+    Следующий запуск серии (московское время) после поста previous.
+    Пропущенные, пока бот лежал, запуски не догоняются: результат всегда позже now.
+    В повторяющийся осенний час 01:30 уже прошло (в первый раз) - следующее завтра:
+
+    >>> next_fire('cron 30 1 * * *', 'America/New_York', datetime(2024, 11, 3, 8, 30), datetime(2024, 11, 3, 9, 10))
+    datetime.datetime(2024, 11, 4, 9, 30)
+    """
+    tz = pytz.timezone(tz_name or 'Europe/Moscow')
+    kind, spec = rule.split(' ', 1)
+
+    if kind == 'every':
+        count, unit = int(spec[:-1]), spec[-1]
+        if unit == 'd':
+            # Дни - по местным часам: 09:00 остаётся 09:00 после перевода часов
+            local = _to_local(previous, tz)
+            local_now = _to_local(now, tz)
+            skip = max((local_now - local).days // count, 0)
+            candidate = local + timedelta(days=count * (skip + 1))
+            while _to_moscow(candidate, tz) <= now:
+                candidate += timedelta(days=count)
+            return _to_moscow(candidate, tz)
+        step = timedelta(minutes=count * (60 if unit == 'h' else 1))
+        # Московское время без перевода часов - интервал считается прямо в нём
+        skip = max(int((now - previous) / step), 0)
+        candidate = previous + step * (skip + 1)
+        return candidate if candidate > now else candidate + step
+
+    after = max(previous, now)
+    candidate = _next_cron(rule, _to_local(after, tz))
+    # Повторяющийся час берётся в первый раз, а тот мог уже пройти
+    while _to_moscow(candidate, tz) <= after:
+        candidate = _next_cron(rule, candidate)
+    return _to_moscow(candidate, tz)
+
+
+def user_timezone(settings) -> str:
+    """Пояс для правил пользователя из users_settings (по умолчанию московский)"""
+    name = settings['timezone'] if settings else None
+    return name if name in pytz.all_timezones_set else 'Europe/Moscow'
+
+
+# ============ ОПИСАНИЕ ============
+
+def _describe_weekdays(value: str) -> str:
+    for group, dow in (('по будням', '1-5'), ('по выходным', '0,6')):
+        if value == dow:
+            return group
+    try:
+        numbers = _parse_field(value, 'дни недели', 0, 7)
+    except ValueError:
+        return value
+    return ", ".join(WEEKDAY_NAMES[day % 7] for day in sorted(numbers, key=lambda day: day % 7 or 7))
+
+
+def describe(rule: str) -> str:
+    """Правило по-человечески: «каждые 6 ч», «пн, ср в 09:30»"""
+    if not rule:
+        return ""
+    kind, spec = rule.split(' ', 1)
+    if kind == 'every':
+        names = {'m': 'мин', 'h': 'ч', 'd': 'дн'}
+        return f"каждые {spec[:-1]} {names[spec[-1]]}"
+
+    minute, hour, dom, month, dow = spec.split()
+    if minute.isdigit() and hour.isdigit() and dom == '*' and month == '*':
+        at = f"{int(hour):02d}:{int(minute):02d}"
+        if dow == '*':
+            return f"ежедневно в {at}"
+        return f"{_describe_weekdays(dow)} в {at}"
+    return rule
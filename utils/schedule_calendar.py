@@ -0,0 +1,217 @@
+"""
+Календарь постов: сетка месяца и недели с числом постов по дням.
+
+Сетка строится одним сгруппированным запросом по индексу календаря
+(db.get_user_calendar), без загрузки самих постов. Готовые текст и клавиатура
+кэшируются на пользователя; database.py сообщает о записях в расписание
+(schedule_observers), и кэш этого пользователя сбрасывается целиком.
+"""
+import calendar
+from collections import Counter, OrderedDict
+from datetime import date, datetime, timedelta
+from html import escape
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+import database as db
+from keyboards.cache import freeze
+
+# Для скольких пользователей держать готовые сетки
+CACHE_USERS = 500
+
+MONTHS = ['Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь',
+          'Июль', 'Август', 'Сентябрь', 'Октябрь', 'Ноябрь', 'Декабрь']
+WEEKDAYS = ['пн', 'вт', 'ср', 'чт', 'пт', 'сб', 'вс']
+
+NOOP = "cal_noop"
+
+# user_id -> {(вид, начало периода, сегодня): (текст, клавиатура)}, давно не смотревшие - первыми
+_cache = OrderedDict()
+
+
+def invalidate(user_ids):
+    for user_id in user_ids:
+        _cache.pop(user_id, None)
+
+
+db.schedule_observers.append(invalidate)
+
+
+def _cached(user_id: int, key: tuple):
+    views = _cache.get(user_id)
+    if views is None or key not in views:
+        return None
+    _cache.move_to_end(user_id)
+    return views[key]
+
+
+def _store(user_id: int, key: tuple, view: tuple):
+    _cache.setdefault(user_id, {})[key] = view
+    _cache.move_to_end(user_id)
+    while len(_cache) > CACHE_USERS:
+        _cache.popitem(last=False)
+
+
+def month_key(day: date) -> str:
+    return day.strftime("%Y%m")
+
+
+def day_key(day: date) -> str:
+    return day.strftime("%Y%m%d")
+
+
+def parse_month(value: str) -> date:
+    return datetime.strptime(value, "%Y%m").date()
+
+
+def parse_day(value: str) -> date:
+    return datetime.strptime(value, "%Y%m%d").date()
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def _next_month(day: date) -> date:
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+async def _counts(user_id: int, start: date, end: date):
+    """(постов по дням {date: n}, по каналам {channel_id: n}, названия каналов)"""
+    rows = await db.get_user_calendar(
+        user_id, datetime.combine(start, datetime.min.time()), datetime.combine(end, datetime.min.time())
+    )
+    by_day, by_channel = Counter(), Counter()
+    for day, channel_id, count in rows:
+        by_day[date.fromisoformat(day)] += count
+        by_channel[channel_id] += count
+    return by_day, by_channel, await _channel_names(user_id) if by_channel else {}
+
+
+async def _channel_names(user_id: int) -> dict:
+    return {
+        channel['channel_id']: channel['channel_title'] or channel['channel_username']
+        for channel in await db.get_channels(user_id)
+    }
+
+
+def _channel_lines(by_channel: Counter, names: dict) -> str:
+    return "".join(
+        f"📢 {escape(names.get(channel_id) or str(channel_id))}: {count}\n"
+        for channel_id, count in by_channel.most_common()
+    )
+
+
+def _day_label(day: date, count: int, today: date) -> str:
+    label = f"·{day.day}·" if day == today else str(day.day)
+    return f"{label} ({count})" if count else label
+
+
+# ============ МЕСЯЦ ============
+
+async def month_view(user_id: int, month: date, today: date):
+    """Сетка месяца: (текст, клавиатура)"""
+    month = month.replace(day=1)
+    key = ('month', month, today)
+    view = _cached(user_id, key)
+    if view is None:
+        view = await _build_month(user_id, month, today)
+        _store(user_id, key, view)
+    return view
+
+
+async def _build_month(user_id: int, month: date, today: date):
+    following = _next_month(month)
+    by_day, by_channel, names = await _counts(user_id, month, following)
+    total = sum(by_day.values())
+
+    title = f"{MONTHS[month.month - 1]} {month.year}"
+    text = f"🗓 <b>{title}</b> — постов: {total}\n\n"
+    if total:
+        text += _channel_lines(by_channel, names)
+        text += "\nВ скобках — число постов. Нажмите на день, чтобы увидеть посты."
+    else:
+        text += "В этом месяце постов нет."
+
+    previous = (month - timedelta(days=1)).replace(day=1)
+    buttons = [
+        [
+            InlineKeyboardButton(text="◀️", callback_data=f"cal_m_{month_key(previous)}"),
+            InlineKeyboardButton(text=title, callback_data=NOOP),
+            InlineKeyboardButton(text="▶️", callback_data=f"cal_m_{month_key(following)}"),
+        ],
+        [InlineKeyboardButton(text=name, callback_data=NOOP) for name in WEEKDAYS],
+    ]
+    for week in calendar.monthcalendar(month.year, month.month):
+        row = []
+        for number in week:
+            if not number:
+                row.append(InlineKeyboardButton(text=" ", callback_data=NOOP))
+                continue
+            day = month.replace(day=number)
+            count = by_day.get(day, 0)
+            row.append(InlineKeyboardButton(
+                text=_day_label(day, count, today),
+                callback_data=f"cal_d_{day_key(day)}" if count else NOOP
+            ))
+        buttons.append(row)
+
+    current_week = week_start(today if month <= today < following else month)
+    buttons.append([
+        InlineKeyboardButton(text="📆 Неделя", callback_data=f"cal_w_{day_key(current_week)}"),
+        InlineKeyboardButton(text="📋 Списком", callback_data="sched_back_list"),
+    ])
+    buttons.append([InlineKeyboardButton(text="🏠 Меню", callback_data="back_to_main")])
+    return text, freeze(InlineKeyboardMarkup(inline_keyboard=buttons))
+
+
+# ============ НЕДЕЛЯ ============
+
+async def week_view(user_id: int, monday: date, today: date):
+    """Неделя по дням с разбивкой по каналам: (текст, клавиатура)"""
+    monday = week_start(monday)
+    key = ('week', monday, today)
+    view = _cached(user_id, key)
+    if view is None:
+        view = await _build_week(user_id, monday, today)
+        _store(user_id, key, view)
+    return view
+
+
+async def _build_week(user_id: int, monday: date, today: date):
+    sunday = monday + timedelta(days=6)
+    rows = await db.get_user_calendar(
+        user_id, datetime.combine(monday, datetime.min.time()),
+        datetime.combine(sunday + timedelta(days=1), datetime.min.time())
+    )
+    by_day = {}
+    for day, channel_id, count in rows:
+        by_day.setdefault(date.fromisoformat(day), Counter())[channel_id] += count
+    names = await _channel_names(user_id) if rows else {}
+
+    text = f"📆 <b>Неделя {monday.strftime('%d.%m')} — {sunday.strftime('%d.%m.%Y')}</b>\n\n"
+    buttons = []
+    for offset in range(7):
+        day = monday + timedelta(days=offset)
+        channels = by_day.get(day, Counter())
+        count = sum(channels.values())
+        label = f"{WEEKDAYS[offset]} {day.strftime('%d.%m')}"
+        if day == today:
+            label += " (сегодня)"
+        if count:
+            parts = ", ".join(
+                f"{escape(names.get(channel_id) or str(channel_id))} {n}"
+                for channel_id, n in channels.most_common()
+            )
+            text += f"<b>{label}</b> — {count}: {parts}\n"
+            buttons.append([InlineKeyboardButton(text=f"{label} · {count}", callback_data=f"cal_d_{day_key(day)}")])
+        else:
+            text += f"{label} — нет постов\n"
+
+    buttons.append([
+        InlineKeyboardButton(text="◀️", callback_data=f"cal_w_{day_key(monday - timedelta(days=7))}"),
+        InlineKeyboardButton(text="🗓 Месяц", callback_data=f"cal_m_{month_key(monday)}"),
+        InlineKeyboardButton(text="▶️", callback_data=f"cal_w_{day_key(monday + timedelta(days=7))}"),
+    ])
+    buttons.append([InlineKeyboardButton(text="🏠 Меню", callback_data="back_to_main")])
+    return text, freeze(InlineKeyboardMarkup(inline_keyboard=buttons))
@@ -1,24 +1,44 @@
 import asyncio
 import logging
-from datetime import datetime
-import pytz
-import json
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
 
 from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError
 from aiogram.types import InputMediaPhoto, InputMediaVideo
 
 import database as db
-from keyboards import parse_url_buttons
+from config import (
+    PUBLISH_WORKERS, PUBLISH_CLAIM_TIMEOUT,
+    CATCHUP_AFTER, CATCHUP_RATE, CATCHUP_CHANNEL_INTERVAL
+)
+from perf import json_loads
+from keyboards import stored_buttons_markup
+from utils import clock, metrics, recurrence
+from utils.lanes import set_lane, PUBLISH
+from utils.notifier import notify_published, notify_failed, hold_notifications
+from utils.clock import get_moscow_now
 
 logger = logging.getLogger(__name__)
 
-# Московский часовой пояс
-MOSCOW_TZ = pytz.timezone('Europe/Moscow')
+# Пауза после ошибки и самый долгий сон планировщика, сек
+# (MAX_SLEEP - страховка, если пробуждение потерялось)
+CHECK_INTERVAL = 30
+MAX_SLEEP = 300
+ALIVE_INTERVAL = timedelta(minutes=10)
 
+# Будит планировщик, когда пост добавили или перенесли
+_wakeup = asyncio.Event()
 
-def get_moscow_now():
-    """Получить текущее московское время (без tzinfo для сравнения с БД)"""
-    return datetime.now(MOSCOW_TZ).replace(tzinfo=None)
+# Когда запущен цикл планировщика. Пока он работает, пост уходит в свой срок,
+# поэтому простой - это только посты со временем раньше запуска
+_started_at = None
+
+
+def wake_scheduler():
+    """Пересчитать время сна: в очереди появился более ранний пост"""
+    _wakeup.set()
 
 
 def parse_db_time(time_str) -> datetime:
@@ -30,67 +50,290 @@ def parse_db_time(time_str) -> datetime:
             return datetime.strptime(time_str, fmt)
         except ValueError:
             continue
-    return datetime.now()
+    return get_moscow_now()
+
+
+async def publish_posts(bot: Bot, posts, now: datetime, pacer: "DrainRate" = None,
+                        channel_interval: float = 0, notify: bool = True) -> list:
+    """
+    Опубликовать посты: каналы параллельно (до PUBLISH_WORKERS), посты одного
+    канала - по очереди. Возвращает [(пост, опубликован ли)]
+    """
+    by_channel = {}
+    for post in posts:
+        by_channel.setdefault(post['channel_id'], []).append(post)
+    
+    workers = asyncio.Semaphore(PUBLISH_WORKERS)
+    results = []
+    
+    async def publish_channel(channel_posts):
+        for i, post in enumerate(channel_posts):
+            if i and channel_interval:
+                await clock.sleep(channel_interval)
+            async with workers:
+                if pacer:
+                    await pacer.wait()
+                try:
+                    # Время в БД уже московское
+                    scheduled_time = parse_db_time(post['scheduled_time'])
+                    logger.info("Publishing post %s (scheduled: %s, now: %s MSK)", post['id'], scheduled_time.strftime('%H:%M'), now.strftime('%H:%M'))
+                    results.append((post, await publish_scheduled_post(bot, post, notify=notify)))
+                
+                except Exception as e:
+                    logger.error("Error processing post %s: %s", post['id'], e)
+                    results.append((post, False))
+    
+    await asyncio.gather(*(publish_channel(channel_posts) for channel_posts in by_channel.values()))
+    return results
+
+
+async def process_due_posts(bot: Bot, now: datetime) -> int:
+    """
+    Один проход планировщика: опубликовать посты, время которых наступило к now.
+    Посты, пропущенные, пока бот не работал (время раньше запуска планировщика),
+    разбираются в догоняющем режиме, если самый старый опоздал на CATCHUP_AFTER
+    """
+    await draw_from_queues(now)
+    posts = await db.get_due_posts(now)
+    if not posts:
+        return 0
+    
+    # Уведомления авторам ждут, пока публикуются каналы
+    async with hold_notifications(bot):
+        # Посты отсортированы по времени: пропущенные за простой - в начале
+        missed = missed_while_down(posts)
+        published = 0
+        if missed and (now - parse_db_time(missed[0]['scheduled_time'])).total_seconds() >= CATCHUP_AFTER:
+            published = await catch_up(bot, missed, now)
+            posts = posts[len(missed):]
+        
+        return published + len(await publish_posts(bot, posts, now))
+
+
+def missed_while_down(posts) -> list:
+    """Посты со временем раньше запуска планировщика - их время прошло, пока бот лежал"""
+    if _started_at is None:
+        return []
+    return [post for post in posts if parse_db_time(post['scheduled_time']) < _started_at]
+
+
+async def draw_from_queues(now: datetime) -> int:
+    """
+    Наступившие слоты очередей каналов: головной пост очереди становится
+    обычным отложенным постом на время слота и публикуется в этом же проходе.
+    Слоты, пропущенные больше чем на CATCHUP_AFTER (бот лежал или очередь
+    была пустой), не догоняются - очередь переходит к следующему слоту после now
+    """
+    drawn = 0
+    for queue in await db.get_due_queues(now):
+        slot = parse_db_time(queue['next_slot'])
+        try:
+            next_slot = recurrence.next_fire(queue['slot_rule'], queue['slot_tz'], slot, now)
+        except Exception as e:
+            logger.error("Bad slot rule %r for queue %s: %s", queue['slot_rule'], queue['channel_id'], e)
+            continue
+        
+        stale = (now - slot).total_seconds() >= CATCHUP_AFTER
+        post_id = await db.pop_queue_item(queue['channel_id'], queue['next_slot'], None if stale else slot, next_slot)
+        if stale:
+            logger.info("Queue %s: missed slot %s skipped", queue['channel_id'], slot.strftime('%d.%m %H:%M'))
+        elif post_id:
+            logger.info("Queue %s: post %s drawn for slot %s", queue['channel_id'], post_id, slot.strftime('%H:%M'))
+            drawn += 1
+    return drawn
+
+
+# ============ ДОГОНЯЮЩИЙ РЕЖИМ ============
+
+class DrainRate:
+    """Общий темп публикаций в догоняющем режиме (по часам планировщика)"""
+
+    def __init__(self, rate: float):
+        self.interval = timedelta(seconds=1 / rate)
+        self._next = None
+
+    async def wait(self):
+        now = get_moscow_now()
+        slot = max(now, self._next or now)
+        self._next = slot + self.interval
+        if slot > now:
+            await clock.sleep((slot - now).total_seconds())
+
+
+def next_same_time(scheduled: datetime, now: datetime) -> datetime:
+    """То же время суток в ближайший день после now"""
+    return scheduled + timedelta(days=(now - scheduled).days + 1)
+
+
+def next_in_series(post, now: datetime):
+    """Время следующего поста серии после post или None, если пост не повторяется"""
+    if not post['recurrence']:
+        return None
+    try:
+        return recurrence.next_fire(
+            post['recurrence'], post['recurrence_tz'], parse_db_time(post['scheduled_time']), now
+        )
+    except Exception as e:
+        logger.error("Bad recurrence %r for post %s: %s", post['recurrence'], post['id'], e)
+        return None
+
+
+async def catch_up(bot: Bot, posts, now: datetime) -> int:
+    """
+    Разбор бэклога после простоя: самые просроченные первыми, с темпом
+    CATCHUP_RATE постов в секунду и паузой CATCHUP_CHANNEL_INTERVAL внутри
+    канала. Посты, опоздавшие больше личного лимита пользователя, пропускаются
+    (в /failed) или переносятся на то же время следующего дня. Серия
+    повторяющегося поста продолжается со следующего запуска после now, пропущенные
+    не догоняются. Вместо уведомления на каждый пост - одна сводка пользователю
+    """
+    oldest = parse_db_time(posts[0]['scheduled_time'])
+    logger.warning(
+        "Catch-up: %s overdue posts, oldest %.0f min late", len(posts), (now - oldest).total_seconds() / 60
+    )
+    
+    settings = {}
+    for user_id in {post['user_id'] for post in posts}:
+        settings[user_id] = await db.get_user_settings(user_id)
+    
+    to_publish, skipped, retimed = [], [], []
+    for post in posts:
+        user_settings = settings[post['user_id']]
+        limit = user_settings['catchup_limit'] if user_settings else None
+        scheduled = parse_db_time(post['scheduled_time'])
+        if not limit or now - scheduled <= timedelta(minutes=limit):
+            to_publish.append(post)
+        elif user_settings['catchup_action'] == 'retime':
+            retimed.append((post, next_in_series(post, now) or next_same_time(scheduled, now)))
+        else:
+            skipped.append(post)
+    
+    if skipped:
+        series = [(next_time, post['id']) for post in skipped if (next_time := next_in_series(post, now))]
+        if series:
+            await db.advance_recurring_posts(series)
+        await db.fail_posts(
+            [post['id'] for post in skipped], 'Overdue', "Просрочен больше лимита догоняющего режима", now
+        )
+    if retimed:
+        await db.retime_posts([(new_time, post['id']) for post, new_time in retimed])
+    
+    results = await publish_posts(
+        bot, to_publish, now,
+        pacer=DrainRate(CATCHUP_RATE), channel_interval=CATCHUP_CHANNEL_INTERVAL, notify=False
+    )
+    
+    report = {}
+    
+    def count(post, outcome):
+        report.setdefault(post['user_id'], Counter())[outcome] += 1
+        metrics.catchup_posts.inc(outcome)
+    
+    for post, ok in results:
+        count(post, 'published' if ok else 'failed')
+    for post in skipped:
+        count(post, 'skipped')
+    for post, _ in retimed:
+        count(post, 'retimed')
+    
+    logger.warning("Catch-up done: %s", dict(sum(report.values(), Counter())))
+    for user_id, outcomes in report.items():
+        await notify_catch_up(bot, user_id, outcomes)
+    
+    return len(results)
+
+
+async def notify_catch_up(bot: Bot, user_id: int, outcomes: Counter):
+    lines = ["📬 <b>Бот снова в работе</b>\n", "Отложенные посты, время которых прошло во время простоя:"]
+    if outcomes['published']:
+        lines.append(f"✅ Опубликовано: {outcomes['published']}")
+    if outcomes['failed']:
+        lines.append(f"❌ Ошибки: {outcomes['failed']} — /failed")
+    if outcomes['skipped']:
+        lines.append(f"⏭ Пропущено (опоздали больше лимита): {outcomes['skipped']} — /failed")
+    if outcomes['retimed']:
+        lines.append(f"🕐 Перенесено на следующий день: {outcomes['retimed']}")
+    try:
+        await bot.send_message(chat_id=user_id, text="\n".join(lines), parse_mode="HTML")
+    except Exception as e:
+        logger.warning("Catch-up summary to %s failed: %s", user_id, e)
+
+
+async def seconds_until_next_post() -> float:
+    """Сколько спать до ближайшего поста (от 1 секунды до MAX_SLEEP)"""
+    next_time = await db.get_next_scheduled_time()
+    if next_time is None:
+        return MAX_SLEEP
+    delay = (parse_db_time(next_time) - get_moscow_now()).total_seconds()
+    return min(max(delay, 1), MAX_SLEEP)
+
+
+async def reconcile_in_doubt_posts(now: datetime) -> int:
+    """Посты, застрявшие в отправке дольше PUBLISH_CLAIM_TIMEOUT, - в неопубликованные (/failed)"""
+    count = await db.fail_in_doubt_posts(now - timedelta(seconds=PUBLISH_CLAIM_TIMEOUT), now)
+    if count:
+        logger.warning("%s posts in doubt moved to failed", count)
+    return count
 
 
 async def check_scheduled_posts(bot: Bot):
     """Проверка и публикация постов"""
     
+    global _started_at
+    _started_at = get_moscow_now()
     logger.info("Scheduler loop started")
+    set_lane(PUBLISH)
+    last_alive = None
     
     while True:
         try:
             # Получаем МОСКОВСКОЕ время
             now = get_moscow_now()
             
-            # Логируем каждые 10 минут
-            if now.minute % 10 == 0 and now.second < 30:
-                logger.info(f"Scheduler alive. Moscow time: {now.strftime('%H:%M:%S')}")
-            
-            posts = await db.get_pending_posts()
+            # Логируем каждые 10 минут и разбираем прерванные публикации
+            # (первый раз - при запуске, после возможного падения)
+            if last_alive is None or now - last_alive >= ALIVE_INTERVAL:
+                logger.info("Scheduler alive. Moscow time: %s", now.strftime('%H:%M:%S'))
+                last_alive = now
+                await reconcile_in_doubt_posts(now)
             
-            for post in posts:
-                try:
-                    # Время в БД уже московское
-                    scheduled_time = parse_db_time(post['scheduled_time'])
-                    
-                    logger.debug(f"Post {post['id']}: scheduled={scheduled_time}, now={now}")
-                    
-                    if scheduled_time <= now:
-                        logger.info(f"Publishing post {post['id']} (scheduled: {scheduled_time.strftime('%H:%M')}, now: {now.strftime('%H:%M')} MSK)")
-                        await publish_scheduled_post(bot, post)
-                    else:
-                        diff = scheduled_time - now
-                        mins = int(diff.total_seconds() / 60)
-                        if mins <= 5:
-                            logger.info(f"Post {post['id']} in {mins} min (at {scheduled_time.strftime('%H:%M')} MSK)")
-                
-                except Exception as e:
-                    logger.error(f"Error processing post {post['id']}: {e}")
-                    continue
+            await process_due_posts(bot, now)
+            delay = await seconds_until_next_post()
         
         except Exception as e:
-            logger.error(f"Scheduler error: {e}")
+            logger.error("Scheduler error: %s", e)
+            delay = CHECK_INTERVAL
         
-        await asyncio.sleep(30)
+        logger.debug("Scheduler sleeps %.0fs", delay)
+        await clock.wait(_wakeup, delay)
+        _wakeup.clear()
 
 
-async def publish_scheduled_post(bot: Bot, post):
-    """Публикация поста"""
+async def publish_scheduled_post(bot: Bot, post, notify: bool = True) -> bool:
+    """
+    Публикация поста по схеме outbox: пост занимается в БД до отправки,
+    а published и message_id пишутся одной транзакцией после неё.
+    Если процесс упадёт между ними, пост останется «под сомнением»
+    и не уйдёт в канал второй раз
+    """
+    token = uuid.uuid4().hex
+    now = get_moscow_now()
+    if not await db.claim_scheduled_post(post['id'], token, now, next_in_series(post, now)):
+        logger.info("Post %s is already being published, skipping", post['id'])
+        return False
+    
     try:
         settings = await db.get_user_settings(post['user_id'])
         parse_mode = settings['formatting'] if settings else 'HTML'
         disable_notification = not settings['notifications'] if settings else True
         
-        keyboard = None
-        if post['buttons']:
-            keyboard = parse_url_buttons(post['buttons'])
+        keyboard = stored_buttons_markup(post['buttons'], post['buttons_compiled'])
         
         # Парсим альбом из JSON
         album = None
         if post['album']:
             try:
-                album = json.loads(post['album'])
+                album = json_loads(post['album'])
             except:
                 album = None
         
@@ -121,13 +364,17 @@ async def publish_scheduled_post(bot: Bot, post):
             msg = messages[0]
             
             # Если есть кнопки - отправляем их отдельным сообщением
+            # (альбом уже в канале, поэтому ошибка здесь не повод для повтора)
             if keyboard:
-                await bot.send_message(
-                    chat_id=post['channel_id'],
-                    text="⬆️",
-                    reply_markup=keyboard,
-                    disable_notification=disable_notification
-                )
+                try:
+                    await bot.send_message(
+                        chat_id=post['channel_id'],
+                        text="⬆️",
+                        reply_markup=keyboard,
+                        disable_notification=disable_notification
+                    )
+                except Exception as e:
+                    logger.error("Buttons for album post %s not sent: %s", post['id'], e)
         
         # Обычная публикация (одно медиа или текст)
         elif post['media_type'] == 'photo' and post['media_file_id']:
@@ -166,40 +413,53 @@ async def publish_scheduled_post(bot: Bot, post):
                 disable_notification=disable_notification
             )
         
-        await db.update_scheduled_post_status(post['id'], 'published')
-        
-        if msg:
-            await db.add_post_stats(post['channel_id'], msg.message_id)
-        
-        logger.info(f"✅ Post {post['id']} published!")
-        
-        try:
-            await bot.send_message(chat_id=post['user_id'], text="✅ Отложенный пост опубликован!")
-        except:
-            pass
-        
-        if post['delete_after'] and msg:
-            asyncio.create_task(delete_post_later(bot, post['channel_id'], msg.message_id, post['delete_after']))
+    except Exception as e:
+        logger.error("❌ Publish error for post %s: %s", post['id'], e)
+        metrics.record_publish(metrics.post_type(post['media_type'], post['album']), 'scheduled', False)
+        if isinstance(e, TelegramNetworkError):
+            # Таймаут или обрыв: пост мог уйти в канал, повтор в один тап его задублирует
+            error_class, error = db.IN_DOUBT, db.IN_DOUBT_ERROR
+        else:
+            error_class, error = type(e).__name__, str(e)[:500]
+        await db.record_publish_failure(post['id'], error_class, error, get_moscow_now())
+        if notify:
+            notify_failed(bot, post['user_id'], post['channel_id'], error)
+        return False
     
+    # Пост уже в канале: дальше только запись результата, без повторной отправки
+    try:
+        recorded = await db.complete_scheduled_post(
+            post['id'], token, post['channel_id'], msg.message_id if msg else None
+        )
     except Exception as e:
-        logger.error(f"❌ Publish error for post {post['id']}: {e}")
-        await db.update_scheduled_post_status(post['id'], 'error')
-        try:
-            await bot.send_message(chat_id=post['user_id'], text=f"❌ Ошибка публикации:\n{e}")
-        except:
-            pass
+        logger.error("Post %s sent but not recorded, left in doubt: %s", post['id'], e)
+        return True
+    if not recorded:
+        logger.warning("Post %s sent but its claim was lost", post['id'])
+    
+    metrics.record_publish(metrics.post_type(post['media_type'], album), 'scheduled', True)
+    lag = (get_moscow_now() - parse_db_time(post['scheduled_time'])).total_seconds()
+    metrics.publish_lag.observe(max(lag, 0))
+    logger.info("✅ Post %s published!", post['id'])
+    
+    if notify:
+        notify_published(bot, post['user_id'], post['channel_id'], msg.message_id if msg else None)
+    
+    if post['delete_after'] and msg:
+        asyncio.create_task(delete_post_later(bot, post['channel_id'], msg.message_id, post['delete_after']))
+    return True
 
 
 async def delete_post_later(bot: Bot, channel_id: int, message_id: int, delay: int):
-    await asyncio.sleep(delay)
+    await clock.sleep(delay)
     try:
         await bot.delete_message(chat_id=channel_id, message_id=message_id)
-        logger.info(f"Deleted message {message_id}")
+        logger.info("Deleted message %s", message_id)
     except Exception as e:
-        logger.error(f"Delete error: {e}")
+        logger.error("Delete error: %s", e)
 
 
 def start_scheduler(bot: Bot):
     asyncio.create_task(check_scheduled_posts(bot))
     now = get_moscow_now()
-    logger.info(f"Scheduler started (Moscow time: {now.strftime('%H:%M:%S')})")
+    logger.info("Scheduler started (Moscow time: %s)", now.strftime('%H:%M:%S'))
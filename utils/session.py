@@ -0,0 +1,108 @@
+from typing import Optional
+
+from aiohttp import ClientSession, FormData, TraceConfig
+from aiohttp.hdrs import USER_AGENT
+from aiohttp.http import SERVER_SOFTWARE
+
+from aiogram import Bot, __version__
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.methods import TelegramMethod
+
+from config import API_POOL_SIZE, API_KEEPALIVE, API_DNS_TTL, API_TIMEOUT, API_TIMEOUTS
+from keyboards.cache import FrozenMarkup
+from perf import json_dumps, json_loads
+from utils import metrics
+from utils.lanes import LaneScheduler, current_lane
+
+
+def _connection_trace() -> TraceConfig:
+    """Новые и переиспользованные соединения, ожидание свободного места в пуле"""
+    trace = TraceConfig()
+
+    async def created(session, context, params):
+        metrics.api_connections.inc('created')
+
+    async def reused(session, context, params):
+        metrics.api_connections.inc('reused')
+
+    async def queued(session, context, params):
+        context.queued_at = session.loop.time()
+
+    async def dequeued(session, context, params):
+        metrics.api_pool_wait.observe(session.loop.time() - context.queued_at)
+
+    trace.on_connection_create_end.append(created)
+    trace.on_connection_reuseconn.append(reused)
+    trace.on_connection_queued_start.append(queued)
+    trace.on_connection_queued_end.append(dequeued)
+    return trace
+
+
+class BotSession(AiohttpSession):
+    """
+    Сессия бота: замороженные клавиатуры уходят готовым JSON без повторной
+    сериализации, остальной JSON идёт через perf (orjson в профиле PERF_PROFILE).
+
+    Пул соединений рассчитан на PUBLISH_WORKERS параллельных публикаций,
+    соединения держатся keep-alive, DNS кэшируется, у долгих (медиа)
+    и быстрых (ответы на кнопки) методов свои таймауты.
+
+    Перед отправкой сообщения запрос ждёт своей очереди в полосе приоритета
+    (utils/lanes.py); остальные методы лимит не расходуют.
+    """
+
+    def __init__(self, limit: int = API_POOL_SIZE, keepalive: float = API_KEEPALIVE,
+                 dns_ttl: int = API_DNS_TTL, timeouts: Optional[dict] = None,
+                 lanes: Optional[LaneScheduler] = None, **kwargs):
+        kwargs.setdefault('json_loads', json_loads)
+        kwargs.setdefault('json_dumps', json_dumps)
+        kwargs.setdefault('timeout', API_TIMEOUT)
+        super().__init__(limit=limit, **kwargs)
+        self.timeouts = API_TIMEOUTS if timeouts is None else timeouts
+        self.lanes = LaneScheduler() if lanes is None else lanes
+        if 'limit' in self._connector_init:
+            # Без прокси - обычный TCPConnector
+            self._connector_init.update(keepalive_timeout=keepalive, ttl_dns_cache=dns_ttl)
+
+    async def create_session(self) -> ClientSession:
+        # Как в AiohttpSession, плюс трассировка соединений для метрик
+        if self._should_reset_connector:
+            await self.close()
+
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(
+                connector=self._connector_type(**self._connector_init),
+                headers={USER_AGENT: f"{SERVER_SOFTWARE} aiogram/{__version__}"},
+                trace_configs=[_connection_trace()],
+            )
+            self._should_reset_connector = False
+
+        return self._session
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None):
+        if timeout is None:
+            timeout = self.timeouts.get(method.__api_method__)
+        await self.lanes.acquire(current_lane.get(), method.__api_method__)
+        return await super().make_request(bot, method, timeout)
+
+    def build_form_data(self, bot: Bot, method: TelegramMethod) -> FormData:
+        frozen = {key: value for key, value in method if isinstance(value, FrozenMarkup)}
+        if not frozen:
+            return super().build_form_data(bot, method)
+
+        form = FormData(quote_fields=False)
+        files = {}
+        for key, value in method.model_dump(warnings=False, exclude=set(frozen)).items():
+            value = self.prepare_value(value, bot=bot, files=files)
+            if not value:
+                continue
+            form.add_field(key, value)
+        for key, value in frozen.items():
+            form.add_field(key, value.serialized)
+        for key, value in files.items():
+            form.add_field(
+                key,
+                value.read(bot),
+                filename=value.filename or key,
+            )
+        return form
@@ -0,0 +1,150 @@
+"""
+Проверка времени поста по расписанию канала.
+
+Посты одного канала стоят не ближе MIN_POST_GAP минут друг к другу, а пост
+с таймером удаления занимает канал до удаления. Поэтому каждый ожидающий
+пост p закрывает для нового поста (с таймером удаления d) интервал
+
+    (p - max(gap, d), p + max(gap, удаление p))
+
+Соседи берутся из индекса канала (channel_id, status, scheduled_time) только
+в окне SEARCH_HORIZON вокруг нужного времени, так что проверка не зависит
+от того, сколько всего постов стоит в канале. Ближайшее свободное время -
+граница слитых интервалов, округлённая до минуты.
+"""
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+import database as db
+from config import MIN_POST_GAP
+from utils.scheduler import parse_db_time
+
+# Насколько далеко от нужного времени искать свободное
+SEARCH_HORIZON = timedelta(days=2)
+
+
+# Причины конфликта: слишком близко к посту, пост ещё не удалён, пост выйдет до удаления нового
+GAP, ITS_WINDOW, OWN_WINDOW = 'gap', 'its_window', 'own_window'
+
+
+class SlotConflict(NamedTuple):
+    post_time: datetime  # время поста, с которым конфликт
+    reason: str
+    deletes_at: Optional[datetime]  # когда удалится тот пост (для ITS_WINDOW)
+    suggestion: Optional[datetime]  # ближайшее свободное время или None, если не нашли
+
+
+def _blocked(posts, gap: timedelta, delete_after: int):
+    """Запрещённые интервалы (начало, конец, время поста, таймер удаления поста) по порядку начала"""
+    before = max(gap, timedelta(seconds=delete_after or 0))
+    intervals = []
+    for _, scheduled_time, post_delete in posts:
+        moment = parse_db_time(scheduled_time)
+        after = max(gap, timedelta(seconds=post_delete or 0))
+        intervals.append((moment - before, moment + after, moment, post_delete))
+    intervals.sort(key=lambda item: item[0])
+    return intervals
+
+
+def _merge(intervals) -> list:
+    merged = []
+    for start, end, *_ in intervals:
+        # Открытые интервалы: общая граница - свободная точка, такие не сливаем
+        if merged and start < merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _is_free(moment: datetime, merged) -> bool:
+    return not any(start < moment < end for start, end in merged)
+
+
+def _free_later(moment: datetime, merged) -> datetime:
+    for start, end in merged:
+        if start < moment < end:
+            moment = _ceil_minute(end)
+    return moment
+
+
+def _free_earlier(moment: datetime, merged) -> datetime:
+    for start, end in reversed(merged):
+        if start < moment < end:
+            moment = _floor_minute(start)
+    return moment
+
+
+def _floor_minute(moment: datetime) -> datetime:
+    return moment.replace(second=0, microsecond=0)
+
+
+def _ceil_minute(moment: datetime) -> datetime:
+    floor = _floor_minute(moment)
+    return floor if floor == moment else floor + timedelta(minutes=1)
+
+
+async def check_slot(channel_id: int, when: datetime, now: datetime, delete_after: int = None,
+                     post_id: int = None, gap_minutes: int = MIN_POST_GAP) -> Optional[SlotConflict]:
+    """
+    None, если время when свободно в канале, иначе конфликт с ближайшим
+    мешающим постом и предложением. post_id - переносимый пост (сам себе не мешает)
+    """
+    gap = timedelta(minutes=gap_minutes)
+    if not gap and not delete_after:
+        return None
+
+    posts = await db.get_channel_schedule(
+        channel_id, when - SEARCH_HORIZON - gap, when + SEARCH_HORIZON + gap + timedelta(seconds=delete_after or 0),
+        exclude_id=post_id
+    )
+    intervals = _blocked(posts, gap, delete_after)
+    clashing = [item for item in intervals if item[0] < when < item[1]]
+    if not clashing:
+        return None
+
+    _, _, post_time, post_delete = min(clashing, key=lambda item: abs(item[2] - when))
+    deletes_at = None
+    if abs(when - post_time) < gap:
+        reason = GAP
+    elif post_time < when:
+        reason, deletes_at = ITS_WINDOW, post_time + timedelta(seconds=post_delete)
+    else:
+        reason = OWN_WINDOW
+
+    merged = _merge(intervals)
+    candidates = [_free_later(when, merged)]
+    earlier = _free_earlier(when, merged)
+    if earlier > now:
+        candidates.append(earlier)
+    candidates = [
+        moment for moment in candidates
+        if abs(moment - when) <= SEARCH_HORIZON and _is_free(moment, merged)
+    ]
+    # При равном расстоянии - более позднее
+    suggestion = min(candidates, key=lambda moment: (abs(moment - when), moment < when), default=None)
+    return SlotConflict(post_time, reason, deletes_at, suggestion)
+
+
+def describe_conflict(conflict: SlotConflict, gap_minutes: int = MIN_POST_GAP) -> str:
+    """Предупреждение для пользователя (HTML)"""
+    post_time = conflict.post_time.strftime('%d.%m %H:%M')
+    if conflict.reason == ITS_WINDOW:
+        reason = f"пост в {post_time} висит до удаления в {conflict.deletes_at.strftime('%d.%m %H:%M')}"
+    elif conflict.reason == OWN_WINDOW:
+        reason = f"в {post_time} выйдет другой пост, а этот ещё не будет удалён"
+    else:
+        reason = f"пост в {post_time}, между постами канала нужно не меньше {gap_minutes} мин"
+    text = f"⚠️ <b>Время занято:</b> {reason}"
+    if conflict.suggestion:
+        text += f"\n\n🕐 Ближайшее свободное время: <b>{conflict.suggestion.strftime('%d.%m в %H:%M')}</b> МСК"
+    return text
+
+
+def encode_time(moment: datetime) -> str:
+    """Время для callback_data"""
+    return moment.strftime("%Y%m%d%H%M")
+
+
+def decode_time(value: str) -> datetime:
+    return datetime.strptime(value, "%Y%m%d%H%M")